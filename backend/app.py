@@ -1,10 +1,32 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
-from werkzeug.utils import secure_filename
+import queue
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
 import logging
+from PIL import Image
 from utils.ai_models import AIModelManager
+from utils.inference_backend import InferenceConfig
 from utils.image_processor import ImageProcessor
+from utils.face_detector import create_face_detector
+from utils.analysis_context import AnalysisContext
+from utils.preprocessing import ImageTooLargeError
+from utils.analysis_pipeline import AnalysisPipeline
+from utils.stage_executor import StageExecutor
+from utils.stage_planner import StagePlan, plan_stages
+from utils.result_cache import ResultCache, hash_image_bytes, hash_image_source
+from utils.embedding_store import EmbeddingStore
+from utils.vector_index import VectorIndex
+from utils.job_queue import JobQueue, JobStore, QueueFullError
+from utils.single_flight import SingleFlight
+from utils.admission import LEVEL_NORMAL, LEVEL_SHED, AdmissionController, OverloadedError
+from utils.metrics import REGISTRY, REQUESTS, REQUEST_SECONDS, profile_request, track
 
 # Configuração da aplicação
 app = Flask(__name__)
@@ -14,6 +36,91 @@ CORS(app)
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+# Cópias dos uploads lidos depois que a view retorna (SSE, lote): em memória até 1MB, depois em disco
+UPLOAD_SPOOL_MEMORY = 1024 * 1024
+
+# Limite de pixels verificado pelo cabeçalho, antes de decodificar (proteção contra "bombas" de descompressão)
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 64_000_000))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Cache de resultados (LRU em memória + camada opcional em disco)
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 256))
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 3600))  # segundos (0 = sem expiração)
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR')  # ex.: uploads/cache
+RESULT_CACHE_DISK_ENTRIES = int(os.environ.get('RESULT_CACHE_DISK_ENTRIES', 5000))
+
+# Embeddings (ViT e BLIP) por hash da imagem; a legenda reaproveita a saída do codificador
+EMBEDDING_STORE_SIZE = int(os.environ.get('EMBEDDING_STORE_SIZE', 1024))  # 0 = desativado
+EMBEDDING_ENCODER_CACHE_SIZE = int(os.environ.get('EMBEDDING_ENCODER_CACHE_SIZE', 32))
+EMBEDDING_STORE_DIR = os.environ.get('EMBEDDING_STORE_DIR')  # ex.: uploads/embeddings
+
+# Índice de similaridade (pHash + embedding do ViT) das imagens analisadas
+VECTOR_INDEX_DIR = os.environ.get('VECTOR_INDEX_DIR', os.path.join(UPLOAD_FOLDER, 'index'))  # vazio = desativado
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0))  # cosseno mínimo (0 = desativado)
+NEAR_DUPLICATE_MAX_HAMMING = int(os.environ.get('NEAR_DUPLICATE_MAX_HAMMING', 10))  # bits de pHash
+# Etapas semânticas reaproveitadas de uma quase duplicata; faces, qualidade e paleta
+# dependem dos pixels exatos e são recalculadas (OpenCV, sem modelos)
+NEAR_DUPLICATE_STAGES = ('classification', 'description', 'sentiment')
+SIMILAR_MAX_RESULTS = 50
+
+# Fila de jobs assíncronos (/api/jobs), persistida em SQLite
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # threads por processo
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 64))  # acima disso, 429
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 86400))  # resultados guardados por 24h
+JOB_RETRY_AFTER_SECONDS = 5
+
+# Micro-batching da classificação (tamanho <= 1 desativa)
+CLASSIFICATION_BATCH_SIZE = int(os.environ.get('CLASSIFICATION_BATCH_SIZE', 8))
+CLASSIFICATION_BATCH_WAIT_MS = float(os.environ.get('CLASSIFICATION_BATCH_WAIT_MS', 10))
+
+# Micro-batching das legendas BLIP (tamanho <= 1 desativa)
+CAPTION_BATCH_SIZE = int(os.environ.get('CAPTION_BATCH_SIZE', 4))
+CAPTION_BATCH_WAIT_MS = float(os.environ.get('CAPTION_BATCH_WAIT_MS', 20))
+
+# Endpoint de análise em lote
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 500))
+BATCH_MAX_CONTENT_LENGTH = int(os.environ.get('BATCH_MAX_CONTENT_LENGTH', 256 * 1024 * 1024))  # 256MB
+BATCH_CHUNK_SIZE = int(os.environ.get('BATCH_CHUNK_SIZE', 8))  # imagens por forward pass
+
+# Modelos: carregados sob demanda, com orçamento de RAM e descarga por ociosidade
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get('MODEL_MEMORY_BUDGET_MB', 0))  # 0 = sem limite
+MODEL_IDLE_TTL = int(os.environ.get('MODEL_IDLE_TTL', 0))  # segundos (0 = nunca descarrega)
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', 'False').lower() == 'true'
+
+# Backend de inferência: precisão (fp32, int8, bf16) e grafo (eager, compile, torchscript)
+INFERENCE_PRECISION = os.environ.get('INFERENCE_PRECISION', 'fp32')
+INFERENCE_GRAPH = os.environ.get('INFERENCE_GRAPH', 'eager')
+
+# Runtime: 'torch' (padrão) ou 'onnx' (modelos exportados por `python -m tools.export_onnx`)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch').lower()
+ONNX_MODEL_DIR = os.environ.get('ONNX_MODEL_DIR', os.path.join('models', 'onnx'))
+ONNX_INTRA_OP_THREADS = int(os.environ.get('ONNX_INTRA_OP_THREADS', 0))  # 0 = padrão do onnxruntime
+ONNX_INTER_OP_THREADS = int(os.environ.get('ONNX_INTER_OP_THREADS', 1))
+
+# Lado máximo da imagem de trabalho (JPEG é reduzido já na decodificação; 0 = resolução total)
+PREPROCESS_MAX_DIM = int(os.environ.get('PREPROCESS_MAX_DIM', 2048))
+
+# Detector de faces: 'haar' (padrão) ou 'dnn' (SSD res10 do OpenCV, pesos em FACE_DNN_MODEL_DIR)
+FACE_DETECTOR = os.environ.get('FACE_DETECTOR', 'haar').lower()
+FACE_DNN_MODEL_DIR = os.environ.get('FACE_DNN_MODEL_DIR', os.path.join('models', 'face_detector'))
+FACE_DNN_CONFIDENCE = float(os.environ.get('FACE_DNN_CONFIDENCE', 0.5))
+# Menor face procurada (pixels ou fração do lado menor da imagem original); define a resolução de trabalho
+FACE_MIN_SIZE = int(os.environ.get('FACE_MIN_SIZE', 24))
+FACE_MIN_SIZE_RATIO = float(os.environ.get('FACE_MIN_SIZE_RATIO', 0.03))
+FACE_SCALE_FACTOR = float(os.environ.get('FACE_SCALE_FACTOR', 1.1))
+FACE_MIN_NEIGHBORS = int(os.environ.get('FACE_MIN_NEIGHBORS', 4))
+
+# Threads para as etapas do OpenCV executadas em paralelo com a inferência
+STAGE_WORKERS = int(os.environ.get('STAGE_WORKERS', 4))
+
+# Controle de admissão sob carga (0 = desativado): legenda encurtada, depois pulada, depois 503
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 0))  # análises simultâneas
+ADMISSION_SHORT_CAPTION_MS = float(os.environ.get('ADMISSION_SHORT_CAPTION_MS', 0))  # latência média da legenda
+ADMISSION_SKIP_CAPTION_MS = float(os.environ.get('ADMISSION_SKIP_CAPTION_MS', 0))
+ADMISSION_SHORT_CAPTION_LENGTH = int(os.environ.get('ADMISSION_SHORT_CAPTION_LENGTH', 20))  # tokens
+ADMISSION_RETRY_AFTER_SECONDS = int(os.environ.get('ADMISSION_RETRY_AFTER_SECONDS', 5))
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
@@ -22,24 +129,466 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Inicializar componentes
-ai_manager = AIModelManager()
-image_processor = ImageProcessor()
+if INFERENCE_BACKEND == 'onnx':
+    # onnxruntime só é importado quando o backend ONNX é escolhido
+    from utils.onnx_backend import OnnxModelManager
+    ai_manager = OnnxModelManager(
+        ONNX_MODEL_DIR,
+        intra_op_threads=ONNX_INTRA_OP_THREADS,
+        inter_op_threads=ONNX_INTER_OP_THREADS,
+        memory_budget_mb=MODEL_MEMORY_BUDGET_MB,
+        idle_ttl_seconds=MODEL_IDLE_TTL
+    )
+elif INFERENCE_BACKEND == 'torch':
+    ai_manager = AIModelManager(
+        MODEL_MEMORY_BUDGET_MB,
+        MODEL_IDLE_TTL,
+        InferenceConfig(INFERENCE_PRECISION, INFERENCE_GRAPH)
+    )
+else:
+    raise ValueError(f"Backend de inferência não suportado: {INFERENCE_BACKEND} (opções: torch, onnx)")
+ai_manager.enable_batching('classification', CLASSIFICATION_BATCH_SIZE, CLASSIFICATION_BATCH_WAIT_MS)
+ai_manager.enable_batching('caption', CAPTION_BATCH_SIZE, CAPTION_BATCH_WAIT_MS)
+if EMBEDDING_STORE_SIZE > 0 or EMBEDDING_STORE_DIR:
+    ai_manager.enable_embedding_store(EmbeddingStore(
+        max_entries=EMBEDDING_STORE_SIZE,
+        max_encoder_entries=EMBEDDING_ENCODER_CACHE_SIZE,
+        disk_dir=EMBEDDING_STORE_DIR
+    ))
+image_processor = ImageProcessor(create_face_detector(
+    FACE_DETECTOR,
+    FACE_DNN_MODEL_DIR,
+    scale_factor=FACE_SCALE_FACTOR,
+    min_neighbors=FACE_MIN_NEIGHBORS,
+    confidence_threshold=FACE_DNN_CONFIDENCE,
+    min_face_size=FACE_MIN_SIZE,
+    min_face_ratio=FACE_MIN_SIZE_RATIO
+))
+result_cache = ResultCache(
+    max_entries=RESULT_CACHE_SIZE,
+    ttl_seconds=RESULT_CACHE_TTL,
+    disk_dir=RESULT_CACHE_DIR,
+    max_disk_entries=RESULT_CACHE_DISK_ENTRIES
+)
+vector_index = VectorIndex(VECTOR_INDEX_DIR) if VECTOR_INDEX_DIR else None
+pipeline = AnalysisPipeline(ai_manager, image_processor, StageExecutor(STAGE_WORKERS))
+# Uploads idênticos simultâneos (mesmo hash e etapas) aguardam a mesma análise
+in_flight = SingleFlight()
+coalesced_requests = REGISTRY.counter(
+    'analyzer_coalesced_requests_total', 'Requisições que aguardaram uma análise idêntica já em andamento'
+)
+admission_controller = AdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    short_caption_ms=ADMISSION_SHORT_CAPTION_MS,
+    skip_caption_ms=ADMISSION_SKIP_CAPTION_MS,
+    short_caption_length=ADMISSION_SHORT_CAPTION_LENGTH,
+    retry_after_seconds=ADMISSION_RETRY_AFTER_SECONDS
+)
+admission_decisions = REGISTRY.counter(
+    'analyzer_admission_decisions_total', 'Decisões do controle de admissão por nível de degradação', ('level',)
+)
+peak_memory = REGISTRY.histogram(
+    'analyzer_request_peak_memory_bytes', 'Pico estimado de memória por análise (upload em memória + buffers)',
+    buckets=tuple(mb * 1024 * 1024 for mb in (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+IMAGE_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def has_stage_errors(results):
+    """Indica se alguma etapa falhou (resultados com erro não são cacheados)"""
+    return any(isinstance(value, dict) and 'error' in value for value in results.values())
+
+def cache_key(image_hash, plan):
+    """Chave do cache: o hash sozinho para a análise completa, hash + etapas para as parciais"""
+    return image_hash if plan.is_full else f"{image_hash}-{plan.key}"
+
+def get_cached_result(image_hash, plan):
+    """Busca um resultado em cache; análises parciais podem vir de uma completa"""
+    if not plan.is_full:
+        full = result_cache.get(image_hash)
+        if full is not None and all(stage in full for stage in plan.stages):
+            return {stage: full[stage] for stage in plan.stages}
+    return result_cache.get(cache_key(image_hash, plan))
+
+def store_result(image_hash, plan, results):
+    if not has_stage_errors(results):
+        result_cache.set(cache_key(image_hash, plan), results)
+
+def index_image(image_hash, context):
+    """Adiciona a imagem analisada ao índice de similaridade (pHash + embedding do ViT, se houver)"""
+    if vector_index is None or context.preprocessed is None:
+        return
+    try:
+        vector_index.add(image_hash, context.preprocessed.phash, context.embeddings().get('classification'))
+    except Exception as e:
+        logger.error(f"Erro ao indexar imagem: {e}")
+
+def find_near_duplicate(context, plan):
+    """(chave, similaridade, etapas semânticas) de uma imagem quase idêntica já analisada, ou None
+
+    O pHash seleciona os candidatos sem inferência; só então o ViT confirma
+    pela similaridade dos embeddings (a classificação fica memorizada no
+    contexto e é reaproveitada se a análise seguir normalmente). Planos que
+    não usam o ViT não passam pela verificação. Só as etapas de
+    NEAR_DUPLICATE_STAGES do plano vêm do resultado da original.
+    """
+    if vector_index is None or NEAR_DUPLICATE_THRESHOLD <= 0 or context.preprocessed is None:
+        return None
+    if 'classification' not in plan.models:
+        return None
+    
+    reusable = StagePlan([stage for stage in plan.stages if stage in NEAR_DUPLICATE_STAGES])
+    candidates = {}
+    for key, _ in vector_index.near_duplicates(
+            context.preprocessed.phash, NEAR_DUPLICATE_MAX_HAMMING, exclude=context.image_hash)[:5]:
+        cached = get_cached_result(key, reusable)
+        if cached is not None:
+            candidates[key] = cached
+    if not candidates:
+        return None
+    
+    context.classification()
+    vector = context.embeddings().get('classification')
+    if vector is None:
+        return None
+    
+    similarities = vector_index.similarities(candidates, vector)
+    if not similarities:
+        return None
+    key = max(similarities, key=similarities.get)
+    if similarities[key] < NEAR_DUPLICATE_THRESHOLD:
+        return None
+    return key, similarities[key], candidates[key]
+
+def get_requested_plan():
+    """Plano de etapas a partir do parâmetro `stages` (formulário ou query string)"""
+    return plan_stages(request.form.getlist('stages') or request.args.getlist('stages'))
+
+def get_requested_profile():
+    """Parâmetro opcional `profile`: inclui o tempo de cada etapa interna na resposta"""
+    return request.values.get('profile', '').lower() in ('1', 'true', 'yes')
+
+def get_requested_original_size():
+    """Parâmetros opcionais `original_width`/`original_height`: dimensões do arquivo
+    antes da redução feita no navegador (None quando ausentes)
+
+    Levanta ValueError para valores inválidos.
+    """
+    width = request.values.get('original_width')
+    height = request.values.get('original_height')
+    if not width and not height:
+        return None
+    try:
+        size = int(width), int(height)
+    except (TypeError, ValueError):
+        raise ValueError('original_width e original_height devem ser inteiros')
+    if min(size) <= 0:
+        raise ValueError('original_width e original_height devem ser positivos')
+    return size
+
+def with_original_size(stage, result, original_size):
+    """Resultado da etapa com a resolução do arquivo original
+
+    A qualidade é medida sobre a imagem enviada; quando o navegador a reduziu,
+    `resolution` e `aspect_ratio` passam a refletir o arquivo do usuário.
+    """
+    if original_size is None or stage != 'quality' or not isinstance(result, dict) or 'error' in result:
+        return result
+    width, height = original_size
+    return {**result, 'resolution': f"{width}x{height}", 'aspect_ratio': round(width / height, 2)}
+
+def admit_analysis():
+    """Decisão do controle de admissão para uma análise (OverloadedError acima do limite)
+
+    A decisão admitida deve ser devolvida com `admission_controller.release`.
+    """
+    try:
+        admission = admission_controller.acquire()
+    except OverloadedError:
+        admission_decisions.inc(level=LEVEL_SHED)
+        raise
+    admission_decisions.inc(level=admission.level)
+    return admission
+
+def overloaded_response(error):
+    """Resposta 503 com Retry-After para uma requisição recusada por sobrecarga"""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def degraded_stages(plan, admission):
+    """Etapas do plano afetadas pela degradação (legenda encurtada ou pulada)"""
+    if admission is None or not admission.degraded:
+        return []
+    return [stage for stage in ('description', 'sentiment') if plan.includes(stage)]
+
+def build_response(results, image_hash, context=None, near_duplicate=None, degraded=None):
+    """Monta a resposta com contadores de inferência, tempos por etapa e status do cache"""
+    if context is None:
+        inference = {'forward_passes': {}, 'total_forward_passes': 0}
+        timings = {}
+        preprocessing = {}
+    else:
+        inference = context.get_stats()
+        timings = context.timings
+        preprocessing = context.get_preprocessing_report()
+    return {
+        **results,
+        'inference': inference,
+        'timings': timings,
+        'preprocessing': preprocessing,
+        'degraded': degraded or [],
+        'cache': {
+            'hit': context is None or near_duplicate is not None,
+            'key': image_hash,
+            **(near_duplicate or {})
+        }
+    }
+
+class ImageLoadError(ValueError):
+    """Imagem enviada que não pôde ser decodificada (resposta 400)"""
+
+def emit_stages(on_stage, results):
+    """Repassa a `on_stage` os resultados que não passaram pelo pipeline (cache)"""
+    if on_stage is None:
+        return
+    for name, result in results.items():
+        on_stage(name, result, 0.0)
+
+def analyze_upload(source, plan, profile=False, on_stage=None, original_size=None, admission=None):
+    """Análise completa de uma imagem enviada: cache, pré-processamento e pipeline
+
+    `source` são os bytes da imagem ou o stream do upload (lido em blocos
+    para o hash e decodificado direto, sem cópia para a memória).
+    Compartilhada por /api/analyze e pela fila de jobs; retorna o corpo da
+    resposta. Com `profile`, a resposta inclui o tempo de cada etapa interna
+    (decodificação, pré-processamento e forward passes dos modelos).
+    `on_stage(nome, resultado, ms)` recebe cada etapa assim que termina.
+    `original_size` (largura, altura) substitui a resolução reportada quando
+    o navegador enviou uma versão reduzida da imagem. `admission` (controle
+    de admissão) encurta ou pula a legenda sob carga; as etapas afetadas
+    vêm em `degraded` e o resultado não é cacheado.
+    """
+    if on_stage is not None and original_size is not None:
+        stage_callback = lambda name, result, ms: on_stage(name, with_original_size(name, result, original_size), ms)
+    else:
+        stage_callback = on_stage
+    with profile_request(profile) as request_profile:
+        response = run_analysis(source, plan, stage_callback, admission)
+    if 'quality' in response:
+        response['quality'] = with_original_size('quality', response['quality'], original_size)
+    if request_profile is not None:
+        response['profile'] = request_profile.report()
+    return response
+
+def run_analysis(source, plan, on_stage=None, admission=None):
+    """Corpo de analyze_upload: cache, coalescência de uploads idênticos e análise"""
+    # Consultar cache pelo hash do conteúdo
+    with track('hash'):
+        image_hash = hash_image_source(source)
+    cached = get_cached_result(image_hash, plan)
+    if cached is not None:
+        logger.info(f"⚡ Resultado em cache: {image_hash[:12]}")
+        emit_stages(on_stage, cached)
+        return build_response(cached, image_hash)
+    
+    # A mesma imagem com as mesmas etapas e o mesmo nível de admissão já em
+    # análise: aguardar o resultado dela (um resultado degradado não serve a
+    # uma requisição normal, nem uma análise completa espera por ele)
+    level = admission.level if admission is not None else LEVEL_NORMAL
+    response, shared = in_flight.do(
+        (cache_key(image_hash, plan), level),
+        lambda: analyze_new_image(source, image_hash, plan, on_stage, admission)
+    )
+    # Cópia rasa: cada requisição ajusta as próprias chaves da resposta (perfil, qualidade)
+    if not shared:
+        return {**response}
+    
+    coalesced_requests.inc()
+    logger.info(f"🔗 Requisição coalescida com a análise em andamento de {image_hash[:12]}")
+    emit_stages(on_stage, {stage: response[stage] for stage in plan.stages if stage in response})
+    return {**response, 'cache': {**response['cache'], 'coalesced': True}}
+
+def analyze_new_image(source, image_hash, plan, on_stage=None, admission=None):
+    """Pré-processamento, quase duplicatas e pipeline de uma imagem fora do cache"""
+    # Outra análise idêntica pode ter terminado entre a consulta ao cache e a coalescência
+    cached = get_cached_result(image_hash, plan)
+    if cached is not None:
+        emit_stages(on_stage, cached)
+        return build_response(cached, image_hash)
+    
+    # Processar imagem
+    try:
+        preprocessed = image_processor.preprocess_bytes(source, PREPROCESS_MAX_DIM, MAX_IMAGE_PIXELS)
+    except ImageTooLargeError:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao carregar imagem: {e}")
+        raise ImageLoadError('Erro ao carregar imagem')
+    if preprocessed is None:
+        raise ImageLoadError('Erro ao processar imagem')
+    
+    context = AnalysisContext.from_preprocessed(ai_manager, preprocessed, image_hash)
+    if admission is not None:
+        context.caption_max_length = admission.caption_max_length
+        context.skip_caption = admission.skip_caption
+    
+    # Cópia quase idêntica (recompressão, redimensionamento): etapas semânticas da original
+    reused = {}
+    duplicate_info = None
+    near_duplicate = find_near_duplicate(context, plan)
+    if near_duplicate is not None:
+        key, similarity, reused = near_duplicate
+        logger.info(f"⚡ Quase duplicata de {key[:12]} (similaridade {similarity:.3f})")
+        emit_stages(on_stage, reused)
+        duplicate_info = {'near_duplicate_of': key, 'similarity': round(similarity, 4)}
+    
+    # Executar as demais análises (cada modelo roda no máximo uma vez por requisição)
+    remaining = StagePlan([stage for stage in plan.stages if stage not in reused]) if reused else plan
+    stage_results = pipeline.analyze(context, remaining, on_stage) if remaining.stages else {}
+    results = {stage: reused[stage] if stage in reused else stage_results[stage] for stage in plan.stages}
+    degraded = degraded_stages(remaining, admission)
+    if not degraded:
+        # Resultados degradados não entram no cache: a próxima requisição recebe a análise completa
+        store_result(image_hash, plan, results)
+    if 'caption' in context.forward_passes and 'description' in context.timings:
+        admission_controller.observe_caption(context.timings['description'])
+    index_image(image_hash, context)
+    peak_memory.observe(context.get_preprocessing_report()['estimated_peak_bytes'])
+    
+    logger.info(f"🔢 Forward passes nesta requisição: {context.get_stats()['forward_passes']}")
+    
+    return build_response(results, image_hash, context, duplicate_info, degraded)
+
+def process_job(image_bytes, stages):
+    """Executa um job da fila (mesma resposta de /api/analyze)"""
+    return analyze_upload(image_bytes, plan_stages(stages))
+
+# As threads de trabalho iniciam no primeiro uso ou em `job_queue.start()`
+# (no gunicorn, em cada worker após o fork)
+job_queue = JobQueue(
+    JobStore(JOB_DB_PATH),
+    process_job,
+    workers=JOB_WORKERS,
+    max_pending=JOB_MAX_PENDING,
+    retention_seconds=JOB_RETENTION_SECONDS
+)
+
+# Valores lidos a cada coleta de /metrics
+REGISTRY.gauge(
+    'analyzer_batch_queue_depth', 'Imagens aguardando o próximo lote de inferência',
+    lambda: {(name,): scheduler.get_stats()['queue_depth'] for name, scheduler in ai_manager.schedulers.items()},
+    ('task',)
+)
+REGISTRY.gauge(
+    'analyzer_models_resident', 'Modelos carregados na memória',
+    lambda: {(name,): 1 for name in ai_manager.registry.get_info()['resident']},
+    ('model',)
+)
+REGISTRY.gauge(
+    'analyzer_result_cache_entries', 'Resultados no cache em memória',
+    lambda: result_cache.get_stats()['entries']
+)
+REGISTRY.gauge(
+    'analyzer_analyses_in_flight', 'Análises em andamento que podem receber requisições idênticas',
+    lambda: in_flight.get_stats()['in_flight']
+)
+REGISTRY.gauge(
+    'analyzer_admission_caption_latency_ms', 'Média móvel da latência da legenda usada pelo controle de admissão',
+    lambda: admission_controller.get_stats()['caption_latency_ms']
+)
+REGISTRY.gauge(
+    'analyzer_jobs', 'Jobs na fila assíncrona por status',
+    lambda: {(status,): job_queue.store.count(status) for status in ('queued', 'running')},
+    ('status',)
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Contagem e latência de cada requisição para /metrics"""
+    endpoint = request.endpoint or 'unknown'
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+def spool_upload(file):
+    """Copia o upload para um buffer do próprio endpoint
+
+    O Werkzeug fecha os arquivos da requisição quando a view retorna; a
+    thread do SSE e o gerador do lote leem depois disso (inclusive se o
+    cliente desconectar), então recebem esta cópia. Quem chama a fecha.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY)
+    shutil.copyfileobj(file.stream, buffer)
+    buffer.seek(0)
+    return buffer
+
+def iter_batch_images(uploads, archive):
+    """Gera (nome, bytes ou stream, erro) para cada imagem enviada ao endpoint de lote
+
+    `uploads` são pares (nome, buffer) das imagens, com buffer None para
+    formatos não suportados; `archive` é o par (nome, buffer) do zip/tar ou None.
+    """
+    for filename, buffer in uploads:
+        if buffer is None:
+            yield filename, None, 'Formato de arquivo não suportado'
+        else:
+            yield filename, buffer, None
+    
+    if archive is None:
+        return
+    
+    archive_name, archive_buffer = archive
+    if archive_name.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_buffer) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not allowed_file(info.filename):
+                    continue
+                if info.file_size > MAX_FILE_SIZE:
+                    yield info.filename, None, 'Arquivo muito grande. Máximo 16MB.'
+                    continue
+                yield info.filename, zf.read(info), None
+    else:
+        with tarfile.open(fileobj=archive_buffer, mode='r:*') as tf:
+            for member in tf:
+                if not member.isfile() or not allowed_file(member.name):
+                    continue
+                if member.size > MAX_FILE_SIZE:
+                    yield member.name, None, 'Arquivo muito grande. Máximo 16MB.'
+                    continue
+                yield member.name, tf.extractfile(member).read(), None
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Verificação de saúde da API"""
     return jsonify({
         'status': 'healthy',
-        'models_loaded': ai_manager.get_model_status()
+        'models_loaded': ai_manager.get_model_status(),
+        'cache': result_cache.get_stats(),
+        'similarity_index': vector_index.get_stats() if vector_index is not None else None,
+        'jobs': job_queue.get_stats(),
+        'coalescing': in_flight.get_stats(),
+        'admission': admission_controller.get_stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas do processo no formato de texto do Prometheus"""
+    return Response(REGISTRY.render(), content_type=REGISTRY.CONTENT_TYPE)
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_image():
     """Endpoint principal para análise de imagens"""
@@ -56,65 +605,333 @@ def analyze_image():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Formato de arquivo não suportado'}), 400
         
-        # Processar imagem
+        # Etapas solicitadas (todas por padrão) e dimensões originais, se reduzida no navegador
         try:
-            image = image_processor.load_image_from_file(file)
-            if image is None:
-                return jsonify({'error': 'Erro ao processar imagem'}), 400
-            
-        except Exception as e:
-            logger.error(f"Erro ao carregar imagem: {e}")
-            return jsonify({'error': 'Erro ao carregar imagem'}), 400
-        
-        # Executar análises
-        results = {}
+            plan = get_requested_plan()
+            original_size = get_requested_original_size()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Classificação de imagem
         try:
-            classification = ai_manager.classify_image(image)
-            results['classification'] = classification
-        except Exception as e:
-            logger.error(f"Erro na classificação: {e}")
-            results['classification'] = {'error': 'Erro na classificação'}
+            admission = admit_analysis()
+        except OverloadedError as e:
+            return overloaded_response(e)
         
-        # Geração de descrição
         try:
-            description = ai_manager.generate_caption(image)
-            results['description'] = description
-        except Exception as e:
-            logger.error(f"Erro na geração de descrição: {e}")
-            results['description'] = 'Não foi possível gerar descrição'
+            return jsonify(analyze_upload(file.stream, plan, get_requested_profile(),
+                                          original_size=original_size, admission=admission))
+        except ImageTooLargeError as e:
+            return jsonify({'error': str(e)}), 413
+        except ImageLoadError as e:
+            return jsonify({'error': str(e)}), 400
+        finally:
+            admission_controller.release(admission)
         
-        # Detecção de faces
+    except Exception as e:
+        logger.error(f"Erro geral na análise: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_image_stream():
+    """Variante de /api/analyze com Server-Sent Events: um evento `stage` por
+    etapa assim que ela termina, depois `done` com a resposta completa"""
+    if 'image' not in request.files:
+        return jsonify({'error': 'Nenhuma imagem fornecida'}), 400
+    
+    file = request.files['image']
+    
+    if file.filename == '':
+        return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+    
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Formato de arquivo não suportado'}), 400
+    
+    try:
+        plan = get_requested_plan()
+        original_size = get_requested_original_size()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    profile = get_requested_profile()
+    
+    # Recusa antes de abrir o stream, para que o 503 seja o status HTTP
+    try:
+        admission = admit_analysis()
+    except OverloadedError as e:
+        return overloaded_response(e)
+    
+    # A análise roda depois que a view retorna, quando o Werkzeug já fechou o upload
+    source = spool_upload(file)
+    
+    # As etapas terminam em threads do pipeline; a fila as traz para a resposta
+    events = queue.Queue()
+    
+    def on_stage(name, result, ms):
+        events.put(('stage', {'stage': name, 'result': result, 'ms': round(ms, 2)}))
+    
+    def worker():
         try:
-            face_analysis = image_processor.detect_faces(image)
-            results['faces'] = face_analysis
+            events.put(('done', analyze_upload(source, plan, profile, on_stage, original_size, admission)))
+        except ImageTooLargeError as e:
+            events.put(('error', {'error': str(e), 'status': 413}))
+        except ImageLoadError as e:
+            events.put(('error', {'error': str(e), 'status': 400}))
         except Exception as e:
-            logger.error(f"Erro na detecção de faces: {e}")
-            results['faces'] = {'count': 0, 'error': 'Erro na detecção'}
+            logger.error(f"Erro geral na análise (stream): {e}")
+            events.put(('error', {'error': 'Erro interno do servidor', 'status': 500}))
+        finally:
+            source.close()
+            admission_controller.release(admission)
+            events.put(None)
+    
+    def event(name, payload):
+        return f"event: {name}\ndata: {app.json.dumps(payload)}\n\n"
+    
+    def generate():
+        while True:
+            item = events.get()
+            if item is None:
+                break
+            yield event(*item)
+    
+    # A análise começa já, e a vaga de admissão é liberada mesmo que o cliente não leia o stream
+    threading.Thread(target=worker, name='analyze-stream', daemon=True).start()
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Enfileira uma análise e retorna o id do job imediatamente (202)
+
+    A imagem fica no banco de jobs até ser processada, então o upload é
+    limitado a MAX_FILE_SIZE (16MB) também na leitura: no máximo
+    MAX_FILE_SIZE + 1 bytes são lidos, e acima disso a resposta é 413.
+    """
+    if 'image' not in request.files or request.files['image'].filename == '':
+        return jsonify({'error': 'Nenhuma imagem fornecida'}), 400
+    
+    file = request.files['image']
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Formato de arquivo não suportado'}), 400
+    
+    try:
+        plan = get_requested_plan()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        image_bytes = file.stream.read(MAX_FILE_SIZE + 1)
+        if len(image_bytes) > MAX_FILE_SIZE:
+            return jsonify({'error': 'Arquivo muito grande. Máximo 16MB.'}), 413
+        stages = ','.join(plan.stages)
+        
+        # Resultado em cache: o job já nasce concluído
+        image_hash = hash_image_bytes(image_bytes)
+        cached = get_cached_result(image_hash, plan)
+        if cached is not None:
+            job_id = job_queue.submit(None, file.filename, stages, build_response(cached, image_hash))
+        else:
+            job_id = job_queue.submit(image_bytes, file.filename, stages)
+        
+    except QueueFullError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(JOB_RETRY_AFTER_SECONDS)
+        return response, 429
+    except Exception as e:
+        logger.error(f"Erro ao criar job: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+    
+    status_url = f"/api/jobs/{job_id}"
+    response = jsonify({'job_id': job_id, 'status': 'done' if cached is not None else 'queued', 'status_url': status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status de um job; inclui `result` (mesmo formato de /api/analyze) quando concluído"""
+    try:
+        job = job_queue.get(job_id)
+    except Exception as e:
+        logger.error(f"Erro ao consultar job: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+    
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job)
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Análise em lote: várias imagens (campo 'images') ou um arquivo zip/tar
+    (campo 'archive'), com um resultado NDJSON por imagem assim que termina"""
+    # Limites próprios do lote (o limite de 16MB vale por imagem)
+    request.max_content_length = BATCH_MAX_CONTENT_LENGTH
+    request.max_form_parts = BATCH_MAX_IMAGES + 16
+    
+    files = [f for f in request.files.getlist('images') if f.filename]
+    archive = request.files.get('archive')
+    if archive is not None and not archive.filename:
+        archive = None
+    
+    if not files and archive is None:
+        return jsonify({'error': 'Nenhuma imagem fornecida'}), 400
+    
+    if archive is not None and not archive.filename.lower().endswith(ARCHIVE_EXTENSIONS):
+        return jsonify({'error': 'Formato de arquivo compactado não suportado'}), 400
+    
+    try:
+        plan = get_requested_plan()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # O gerador roda depois que a view retorna, quando o Werkzeug já fechou os uploads
+    uploads = [(f.filename, spool_upload(f) if allowed_file(f.filename) else None) for f in files]
+    if archive is not None:
+        archive = (archive.filename, spool_upload(archive))
+    
+    def generate():
+        summary = {'total': 0, 'analyzed': 0, 'cached': 0, 'errors': 0}
+        pending = []
+        
+        def line(payload):
+            return app.json.dumps(payload) + '\n'
+        
+        def flush():
+            chunk = list(pending)
+            pending.clear()
+            done = 0
+            try:
+                for (index, filename, image_hash, _), (context, results) in zip(
+                        chunk, pipeline.analyze_batch([entry[3] for entry in chunk], plan)):
+                    store_result(image_hash, plan, results)
+                    index_image(image_hash, context)
+                    summary['analyzed'] += 1
+                    done += 1
+                    yield line({'index': index, 'filename': filename,
+                                **build_response(results, image_hash, context)})
+            except Exception as e:
+                # Falha no bloco: as imagens restantes recebem uma linha de erro e o lote continua
+                logger.error(f"Erro ao analisar bloco do lote: {e}")
+                for index, filename, _, _ in chunk[done:]:
+                    summary['errors'] += 1
+                    yield line({'index': index, 'filename': filename, 'error': 'Erro ao analisar imagem'})
         
-        # Análise de qualidade
         try:
-            quality_metrics = image_processor.analyze_quality(image)
-            results['quality'] = quality_metrics
+            for index, (filename, image_source, error) in enumerate(iter_batch_images(uploads, archive)):
+                summary['total'] += 1
+                
+                if index >= BATCH_MAX_IMAGES:
+                    summary['errors'] += 1
+                    yield line({'index': index, 'filename': filename,
+                                'error': f'Limite de {BATCH_MAX_IMAGES} imagens por lote excedido'})
+                    break
+                
+                if error is not None:
+                    summary['errors'] += 1
+                    yield line({'index': index, 'filename': filename, 'error': error})
+                    continue
+                
+                image_hash = hash_image_source(image_source)
+                cached = get_cached_result(image_hash, plan)
+                if cached is not None:
+                    summary['cached'] += 1
+                    yield line({'index': index, 'filename': filename,
+                                **build_response(cached, image_hash)})
+                    continue
+                
+                try:
+                    preprocessed = image_processor.preprocess_bytes(image_source, PREPROCESS_MAX_DIM, MAX_IMAGE_PIXELS)
+                except ImageTooLargeError as e:
+                    preprocessed = None
+                    error = str(e)
+                if preprocessed is None:
+                    summary['errors'] += 1
+                    yield line({'index': index, 'filename': filename, 'error': error or 'Erro ao processar imagem'})
+                    continue
+                
+                pending.append((index, filename, image_hash,
+                                AnalysisContext.from_preprocessed(ai_manager, preprocessed, image_hash)))
+                if len(pending) >= BATCH_CHUNK_SIZE:
+                    yield from flush()
+            
+            yield from flush()
+            
         except Exception as e:
-            logger.error(f"Erro na análise de qualidade: {e}")
-            results['quality'] = {'error': 'Erro na análise'}
+            logger.error(f"Erro na análise em lote: {e}")
+            summary['errors'] += 1
+            yield line({'error': 'Erro ao ler imagens do lote'})
+        finally:
+            for _, buffer in uploads + ([archive] if archive is not None else []):
+                if buffer is not None:
+                    buffer.close()
         
-        # Análise de sentimento visual
+        yield line({'done': True, **summary})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/similar', methods=['POST'])
+def find_similar():
+    """Imagens já analisadas mais parecidas com a enviada (embedding do ViT + pHash)"""
+    if vector_index is None:
+        return jsonify({'error': 'Índice de similaridade desativado'}), 503
+    
+    if 'image' not in request.files or request.files['image'].filename == '':
+        return jsonify({'error': 'Nenhuma imagem fornecida'}), 400
+    
+    file = request.files['image']
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Formato de arquivo não suportado'}), 400
+    
+    try:
+        k = int(request.form.get('k') or request.args.get('k') or 5)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro k inválido'}), 400
+    k = max(1, min(k, SIMILAR_MAX_RESULTS))
+    
+    try:
+        image_hash = hash_image_source(file.stream)
         try:
-            sentiment = ai_manager.analyze_sentiment(image)
-            results['sentiment'] = sentiment
-        except Exception as e:
-            logger.error(f"Erro na análise de sentimento: {e}")
-            results['sentiment'] = 'Neutro'
+            preprocessed = image_processor.preprocess_bytes(file.stream, PREPROCESS_MAX_DIM, MAX_IMAGE_PIXELS)
+        except ImageTooLargeError as e:
+            return jsonify({'error': str(e)}), 413
+        if preprocessed is None:
+            return jsonify({'error': 'Erro ao processar imagem'}), 400
+        
+        # Embedding guardado de uma análise anterior ou um forward pass do ViT
+        context = AnalysisContext.from_preprocessed(ai_manager, preprocessed, image_hash)
+        vector = context.embeddings().get('classification')
+        if vector is None:
+            context.classification()
+            vector = context.embeddings().get('classification')
         
-        return jsonify(results)
+        return jsonify({
+            'key': image_hash,
+            'indexed': image_hash in vector_index,
+            'neighbors': vector_index.search(preprocessed.phash, vector, k, exclude=image_hash),
+            'inference': context.get_stats()
+        })
         
     except Exception as e:
-        logger.error(f"Erro geral na análise: {e}")
+        logger.error(f"Erro na busca por similares: {e}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@app.route('/api/embeddings/<image_hash>', methods=['GET'])
+def get_embeddings(image_hash):
+    """Embeddings guardados de uma imagem já analisada (hash SHA-256 retornado em `cache.key`)"""
+    if not IMAGE_HASH_PATTERN.match(image_hash):
+        return jsonify({'error': 'Hash de imagem inválido'}), 400
+    
+    embeddings = ai_manager.get_embeddings(image_hash)
+    if not embeddings:
+        return jsonify({'error': 'Embeddings não encontrados'}), 404
+    
+    return jsonify({
+        'key': image_hash,
+        'dtype': 'float16',
+        'embeddings': {
+            name: {'dim': int(vector.shape[0]), 'values': vector.astype(float).tolist()}
+            for name, vector in embeddings.items()
+        }
+    })
+
 @app.route('/api/models', methods=['GET'])
 def get_model_info():
     """Informações sobre os modelos carregados"""
@@ -132,15 +949,19 @@ def not_found(error):
 def internal_error(error):
     return jsonify({'error': 'Erro interno do servidor'}), 500
 
-if __name__ == '__main__':
-    logger.info("🚀 Iniciando servidor...")
+# Pré-carregamento opcional (vale também sob servidores WSGI); sem ele, cada
+# modelo é carregado no primeiro uso
+if PRELOAD_MODELS:
     logger.info("📥 Carregando modelos de IA...")
-    
     try:
-        ai_manager.initialize_models()
+        ai_manager.initialize_models(['classification', 'caption'])
         logger.info("✅ Modelos carregados com sucesso!")
     except Exception as e:
         logger.error(f"❌ Erro ao carregar modelos: {e}")
+
+if __name__ == '__main__':
+    logger.info("🚀 Iniciando servidor...")
+    job_queue.start()
     
     app.run(
         host='0.0.0.0',
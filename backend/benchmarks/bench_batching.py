@@ -0,0 +1,85 @@
+"""Benchmark: vazão da classificação ViT versus janela de micro-batching.
+
+Executar a partir de `backend/`:
+
+    python -m benchmarks.bench_batching --clients 16 --requests 64 --windows 0 2 5 10 20
+
+Usa os pesos reais do ViT se estiverem no cache local do Hugging Face; caso
+contrário, um ViT pequeno inicializado aleatoriamente (mesmo custo relativo
+de lote, sem downloads).
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.ai_models import AIModelManager
+from benchmarks.fixtures import install_models, synthetic_images
+
+logger = logging.getLogger(__name__)
+
+def run_window(manager, images, clients, window_ms, max_batch_size):
+    """Dispara `len(images)` classificações com `clients` threads concorrentes"""
+    manager.enable_batching('classification', max_batch_size if window_ms > 0 else 1, window_ms)
+
+    latencies = []
+    def classify(image):
+        start = time.perf_counter()
+        manager.classify_image(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(classify, images))
+    elapsed = time.perf_counter() - start
+
+    scheduler = manager.schedulers.get('classification')
+    return {
+        'window_ms': window_ms,
+        'max_batch_size': max_batch_size if window_ms > 0 else 1,
+        'images_per_second': round(len(images) / elapsed, 2),
+        'p50_latency_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_latency_ms': round(float(np.percentile(latencies, 95)), 2),
+        'scheduler': scheduler.get_stats() if scheduler else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 2, 5, 10, 20])
+    parser.add_argument('--output', help='Arquivo JSON para salvar os resultados')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    manager = AIModelManager()
+    weights = install_models(manager, ['classification'])['classification']
+    images = synthetic_images(args.requests)
+
+    # Aquecimento (alocações e kernels)
+    manager.classify_images(images[:2])
+
+    results = []
+    print(f"Pesos: {weights} | clientes: {args.clients} | requisições: {args.requests}")
+    print(f"{'janela (ms)':>12} {'img/s':>8} {'p50 (ms)':>10} {'p95 (ms)':>10} {'lote médio':>11}")
+    for window_ms in args.windows:
+        result = run_window(manager, images, args.clients, window_ms, args.max_batch_size)
+        results.append(result)
+        avg_batch = result['scheduler']['avg_batch_size'] if result['scheduler'] else 1
+        print(f"{window_ms:>12g} {result['images_per_second']:>8} "
+              f"{result['p50_latency_ms']:>10} {result['p95_latency_ms']:>10} {avg_batch:>11}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'weights': weights, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
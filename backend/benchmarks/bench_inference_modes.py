@@ -0,0 +1,160 @@
+"""Benchmark: latência, RSS e desvio de acurácia de cada backend de inferência.
+
+Executar a partir de `backend/`:
+
+    python -m benchmarks.bench_inference_modes --modes fp32 int8 bf16 fp32+compile fp32+torchscript
+
+Cada modo roda em um subprocesso separado (RSS sem interferência dos outros
+modos) sobre o mesmo conjunto fixo de imagens sintéticas. As saídas são
+comparadas com as do fp32: concordância do top-1, diferença média da
+confiança do top-1 e proporção de legendas idênticas. Com
+`--min-top1-agreement` o comando falha se algum modo desviar demais.
+
+Sem os pesos reais no cache local, os modelos substitutos (aleatórios, com
+semente fixa) têm saídas quase uniformes: o desvio é exibido, mas marcado
+como não significativo, e `--min-top1-agreement` não é aplicado.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import psutil
+
+from utils.ai_models import AIModelManager
+from utils.inference_backend import InferenceConfig
+from benchmarks.fixtures import install_models, synthetic_images
+
+RESULT_MARKER = 'BENCH_RESULT '
+
+def parse_mode(mode):
+    """'int8+torchscript' -> InferenceConfig('int8', 'torchscript')"""
+    precision, _, graph = mode.partition('+')
+    return InferenceConfig(precision, graph or 'eager')
+
+def run_worker(mode, images_count, seed):
+    """Executa um modo e imprime o resultado em JSON (chamado no subprocesso)"""
+    logging.basicConfig(level=logging.WARNING)
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+
+    manager = AIModelManager(inference_config=parse_mode(mode))
+    start = time.perf_counter()
+    weights = install_models(manager)
+    load_seconds = time.perf_counter() - start
+    images = synthetic_images(images_count, seed=seed)
+
+    # Aquecimento (compilação/rastreamento acontecem na primeira chamada)
+    manager.classify_image(images[0])
+    manager.generate_caption(images[0])
+
+    classifications, captions = [], []
+    classify_ms, caption_ms = [], []
+    for image in images:
+        start = time.perf_counter()
+        classifications.append(manager.classify_image(image))
+        classify_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        captions.append(manager.generate_caption(image))
+        caption_ms.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        'mode': mode,
+        'weights': weights,
+        'load_seconds': round(load_seconds, 2),
+        'classify_ms_p50': round(float(np.percentile(classify_ms, 50)), 2),
+        'caption_ms_p50': round(float(np.percentile(caption_ms, 50)), 2),
+        'rss_mb': round(process.memory_info().rss / (1024 * 1024), 1),
+        'rss_models_mb': round((process.memory_info().rss - rss_before) / (1024 * 1024), 1),
+        'outputs': {
+            'top1': [c.get('class') for c in classifications],
+            'top1_confidence': [c.get('confidence') for c in classifications],
+            'captions': captions
+        }
+    }
+    print(RESULT_MARKER + json.dumps(result))
+
+def compare_outputs(reference, candidate):
+    """Desvio de um modo em relação às saídas fp32"""
+    ref, out = reference['outputs'], candidate['outputs']
+    total = len(ref['top1'])
+    agreement = sum(a == b for a, b in zip(ref['top1'], out['top1'])) / total
+    confidence_diff = np.mean([
+        abs((a or 0.0) - (b or 0.0)) for a, b in zip(ref['top1_confidence'], out['top1_confidence'])
+    ])
+    caption_match = sum(a == b for a, b in zip(ref['captions'], out['captions'])) / total
+    return {
+        'top1_agreement': round(agreement, 3),
+        'mean_top1_confidence_diff': round(float(confidence_diff), 4),
+        'caption_exact_match': round(caption_match, 3)
+    }
+
+def run_mode(mode, images_count, seed):
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_inference_modes', '--worker', mode,
+         '--images', str(images_count), '--seed', str(seed)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {'mode': mode, 'error': completed.stderr.strip().splitlines()[-1:] or ['sem saída']}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['fp32', 'int8', 'bf16', 'fp32+compile', 'fp32+torchscript'])
+    parser.add_argument('--images', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-top1-agreement', type=float, default=None)
+    parser.add_argument('--output', help='Arquivo JSON para salvar os resultados')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.images, args.seed)
+        return
+
+    modes = ['fp32'] + [mode for mode in args.modes if mode != 'fp32']
+    results = [run_mode(mode, args.images, args.seed) for mode in modes]
+    reference = results[0]
+    if 'error' in reference:
+        sys.exit(f"Falha no modo de referência fp32: {reference['error']}")
+
+    # Com pesos aleatórios o top-1 vem de um softmax quase uniforme: o desvio não mede acurácia
+    random_weights = 'random-tiny' in reference['weights'].values()
+    failed = []
+    print(f"{'modo':>18} {'ViT p50 (ms)':>13} {'BLIP p50 (ms)':>14} {'RSS (MB)':>9} {'top-1 =':>8} {'Δconf':>7} {'legenda =':>10}")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['mode']:>18} erro: {result['error']}")
+            continue
+        result['drift'] = {**compare_outputs(reference, result), 'meaningful': not random_weights}
+        drift = result['drift']
+        print(f"{result['mode']:>18} {result['classify_ms_p50']:>13} {result['caption_ms_p50']:>14} "
+              f"{result['rss_mb']:>9} {drift['top1_agreement']:>8} "
+              f"{drift['mean_top1_confidence_diff']:>7} {drift['caption_exact_match']:>10}")
+        if (args.min_top1_agreement is not None and drift['meaningful']
+                and drift['top1_agreement'] < args.min_top1_agreement):
+            failed.append(result['mode'])
+
+    if random_weights:
+        print("⚠️ Pesos aleatórios (random-tiny): desvio não significativo"
+              f"{', --min-top1-agreement ignorado' if args.min_top1_agreement is not None else ''}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if failed:
+        sys.exit(f"Desvio acima do limite nos modos: {', '.join(failed)}")
+
+if __name__ == '__main__':
+    main()
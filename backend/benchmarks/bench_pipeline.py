@@ -0,0 +1,292 @@
+"""Benchmark: cada método do ImageProcessor e do AIModelManager e /api/analyze de ponta a ponta.
+
+Executar a partir de `backend/`:
+
+    python -m benchmarks.bench_pipeline --resolutions 320x240 640x480 1920x1080 3840x2160 --output pipeline.json
+
+Mede cada método isoladamente sobre imagens sintéticas em várias resoluções
+e dispara `/api/analyze` pelo test client do Flask com vários níveis de
+concorrência (caches desligados e um payload único por requisição, para que
+a coalescência de uploads idênticos não junte requisições: toda requisição
+passa pelo pipeline).
+Com `--baseline`, compara as medianas com um JSON anterior e falha se
+alguma piorar mais que `--max-regression`.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+
+from utils.ai_models import AIModelManager
+from utils.analysis_context import AnalysisContext
+from utils.image_processor import ImageProcessor
+from benchmarks.fixtures import install_models, synthetic_images
+
+logger = logging.getLogger(__name__)
+
+def parse_resolution(value):
+    try:
+        width, height = (int(side) for side in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Resolução inválida: {value} (use LARGURAxALTURA)")
+    return width, height
+
+def encode_jpeg(image, quality=90):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+def summarize(latencies_ms):
+    return {
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 3),
+        'mean_ms': round(float(np.mean(latencies_ms)), 3),
+        'min_ms': round(float(np.min(latencies_ms)), 3),
+        'runs': len(latencies_ms)
+    }
+
+def time_call(fn, repeats, warmup):
+    """Executa `fn` `warmup` vezes sem medir e `repeats` vezes medindo"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)
+
+def primed_context(manager, preprocessed, classification, caption):
+    """Contexto com as saídas dos modelos já prontas (mede só a lógica do método)"""
+    context = AnalysisContext.from_preprocessed(manager, preprocessed)
+    context.prime('classification', classification)
+    context.prime('caption', caption)
+    return context
+
+def bench_image_processor(processor, payload, max_dim, repeats, warmup):
+    """Cada etapa do ImageProcessor como o pipeline a chama (sobre os buffers pré-processados)"""
+    preprocessed = processor.preprocess_bytes(payload, max_dim)
+    image = preprocessed.image
+    methods = {
+        'load_image_from_bytes': lambda: processor.load_image_from_bytes(payload),
+        'preprocess_bytes': lambda: processor.preprocess_bytes(payload, max_dim),
+        'detect_faces': lambda: processor.detect_faces(
+            image, preprocessed.gray, preprocessed.scale_to_original, preprocessed.rgb),
+        'detect_faces_batch': lambda: processor.detect_faces_batch(
+            [(image, preprocessed.gray, preprocessed.rgb, preprocessed.scale_to_original)] * 4),
+        'analyze_quality': lambda: processor.analyze_quality(image, preprocessed.gray, preprocessed.original_size),
+        'extract_palette': lambda: processor.extract_palette(image, preprocessed.rgb),
+        'resize_image': lambda: processor.resize_image(image)
+    }
+    return {name: time_call(fn, repeats, warmup) for name, fn in methods.items()}
+
+def bench_ai_manager(manager, processor, payloads, max_dim, repeats, warmup):
+    """Cada método do AIModelManager isolado (sem micro-batching entre chamadas)"""
+    preprocessed = [processor.preprocess_bytes(payload, max_dim) for payload in payloads]
+    contexts = [AnalysisContext.from_preprocessed(manager, item) for item in preprocessed]
+    classify_inputs = [context.model_image('classification') for context in contexts]
+    caption_inputs = [context.model_image('caption') for context in contexts]
+    first = preprocessed[0]
+
+    classification = manager.classify_image(classify_inputs[0])
+    caption = manager.generate_caption(caption_inputs[0])
+    methods = {
+        'classify_image': lambda: manager.classify_image(classify_inputs[0]),
+        'classify_images': lambda: manager.classify_images(classify_inputs),
+        'generate_caption': lambda: manager.generate_caption(caption_inputs[0]),
+        'generate_captions': lambda: manager.generate_captions(caption_inputs),
+        'analyze_sentiment': lambda: manager.analyze_sentiment(
+            first.image, context=primed_context(manager, first, classification, caption)),
+        '_analyze_color_sentiment': lambda: manager._analyze_color_sentiment(first.image, first.rgb),
+        '_analyze_brightness_sentiment': lambda: manager._analyze_brightness_sentiment(first.image, first.gray)
+    }
+    results = {name: time_call(fn, repeats, warmup) for name, fn in methods.items()}
+    results['classify_images']['batch_size'] = len(classify_inputs)
+    results['generate_captions']['batch_size'] = len(caption_inputs)
+    return results
+
+def load_app(tmp_dir):
+    """Importa o app do Flask com caches desligados e estado em diretório temporário"""
+    os.environ.update({
+        'RESULT_CACHE_SIZE': '0',
+        'RESULT_CACHE_DIR': '',
+        'EMBEDDING_STORE_SIZE': '0',
+        'EMBEDDING_STORE_DIR': '',
+        'VECTOR_INDEX_DIR': '',
+        'NEAR_DUPLICATE_THRESHOLD': '0',
+        'JOB_DB_PATH': os.path.join(tmp_dir, 'jobs.sqlite3')
+    })
+    import app as app_module
+    return app_module
+
+def unique_payload(payload, index):
+    """JPEG com bytes extras após o marcador de fim: mesmos pixels, hash diferente"""
+    return payload + index.to_bytes(8, 'big')
+
+def bench_endpoint(flask_app, payloads, concurrency, requests, stages):
+    """`requests` chamadas a /api/analyze com `concurrency` threads, cada uma com o seu test client"""
+    latencies = []
+    errors = []
+
+    def client_loop(index):
+        client = flask_app.test_client()
+        for i in range(index, requests, concurrency):
+            # Payload único: sem isso o SingleFlight coalesceria requisições simultâneas idênticas
+            data = {'image': (io.BytesIO(unique_payload(payloads[i % len(payloads)], i)), 'bench.jpg')}
+            if stages:
+                data['stages'] = stages
+            start = time.perf_counter()
+            response = client.post('/api/analyze', data=data, content_type='multipart/form-data')
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code == 200:
+                latencies.append(elapsed)
+            else:
+                errors.append(response.status_code)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client_loop, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 2),
+        **(summarize(latencies) if latencies else {})
+    }
+
+def compare(baseline, current, max_regression):
+    """[(métrica, p50 anterior, p50 atual, razão)] das medianas que pioraram além do limite"""
+    def medians(results):
+        values = {}
+        for group in ('image_processor', 'ai_manager'):
+            for resolution, methods in results.get(group, {}).items():
+                for method, stats in methods.items():
+                    values[f"{group}/{resolution}/{method}"] = stats['p50_ms']
+        for run in results.get('endpoint', []):
+            if 'p50_ms' in run:
+                values[f"endpoint/c{run['concurrency']}"] = run['p50_ms']
+        return values
+
+    old, new = medians(baseline), medians(current)
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        if old[name] > 0 and new[name] / old[name] > 1 + max_regression:
+            regressions.append((name, old[name], new[name], round(new[name] / old[name], 2)))
+    return regressions
+
+def print_methods(title, results):
+    print(f"\n{title}")
+    print(f"{'resolução':>11} {'método':<32} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for resolution, methods in results.items():
+        for name, stats in methods.items():
+            print(f"{resolution:>11} {name:<32} {stats['p50_ms']:>10} {stats['p95_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--resolutions', type=parse_resolution, nargs='+',
+                        default=[(320, 240), (640, 480), (1920, 1080), (3840, 2160)])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=4, help='Imagens em classify_images/generate_captions')
+    parser.add_argument('--max-dim', type=int, default=2048, help='Como PREPROCESS_MAX_DIM')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--requests', type=int, default=32, help='Requisições por nível de concorrência')
+    parser.add_argument('--stages', default='', help='Etapas por requisição (padrão: todas)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-endpoint', action='store_true')
+    parser.add_argument('--output', help='Arquivo JSON para salvar os resultados')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Piora máxima aceita na mediana em relação ao baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    processor = ImageProcessor()
+    manager = AIModelManager()
+    weights = install_models(manager)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'torch_threads': torch.get_num_threads()
+        },
+        'weights': weights,
+        'config': {
+            'repeats': args.repeats,
+            'warmup': args.warmup,
+            'batch_size': args.batch_size,
+            'max_dim': args.max_dim,
+            'stages': args.stages or 'all',
+            'seed': args.seed
+        },
+        'image_processor': {},
+        'ai_manager': {},
+        'endpoint': []
+    }
+
+    payloads_by_resolution = {}
+    for width, height in args.resolutions:
+        resolution = f"{width}x{height}"
+        payloads = [encode_jpeg(image) for image in synthetic_images(args.batch_size, (width, height), args.seed)]
+        payloads_by_resolution[resolution] = payloads
+        results['image_processor'][resolution] = bench_image_processor(
+            processor, payloads[0], args.max_dim, args.repeats, args.warmup)
+        results['ai_manager'][resolution] = bench_ai_manager(
+            manager, processor, payloads, args.max_dim, args.repeats, args.warmup)
+
+    print(f"Pesos: {weights} | repetições: {args.repeats} | threads do torch: {torch.get_num_threads()}")
+    print_methods('ImageProcessor', results['image_processor'])
+    print_methods('AIModelManager', results['ai_manager'])
+
+    if not args.skip_endpoint:
+        with tempfile.TemporaryDirectory(prefix='bench-pipeline-') as tmp_dir:
+            app_module = load_app(tmp_dir)
+            install_models(app_module.ai_manager)
+            payloads = [payload for payloads in payloads_by_resolution.values() for payload in payloads]
+
+            # Aquecimento (alocações, kernels e threads dos micro-batches)
+            bench_endpoint(app_module.app, payloads, 1, min(2, len(payloads)), args.stages)
+
+            print(f"\n/api/analyze ({len(payloads)} imagens em {len(payloads_by_resolution)} resoluções)")
+            print(f"{'concorrência':>12} {'req/s':>8} {'p50 (ms)':>10} {'p95 (ms)':>10} {'erros':>6}")
+            for concurrency in args.concurrency:
+                run = bench_endpoint(app_module.app, payloads, concurrency, args.requests, args.stages)
+                results['endpoint'].append(run)
+                print(f"{concurrency:>12} {run['requests_per_second']:>8} {run.get('p50_ms', '-'):>10} "
+                      f"{run.get('p95_ms', '-'):>10} {run['errors']:>6}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('weights') != weights:
+            print(f"\n⚠️ Baseline com outros pesos ({baseline.get('weights')}); comparação pouco significativa")
+        regressions = compare(baseline, results, args.max_regression)
+        if regressions:
+            print(f"\nRegressões acima de {args.max_regression:.0%}:")
+            for name, old, new, ratio in regressions:
+                print(f"  {name}: {old} ms -> {new} ms ({ratio}x)")
+            sys.exit(f"{len(regressions)} medianas pioraram além do limite")
+        print(f"\nSem regressões acima de {args.max_regression:.0%} em relação a {args.baseline}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Teste de carga: requisições/s e memória do gunicorn versus número de workers.
+
+Executar a partir de `backend/` (Linux/macOS, requer gunicorn):
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --clients 16 --duration 30
+
+Para cada valor de `--workers` sobe `gunicorn -c gunicorn.conf.py` com os
+modelos carregados antes do fork (benchmarks.serving_app), dispara
+`--clients` clientes concorrentes contra `/api/analyze` durante `--duration`
+segundos e mede vazão, latência e memória. O PSS soma a memória de cada
+processo dividindo as páginas compartilhadas entre eles: com os pesos
+compartilhados ele cresce bem menos que N vezes o de um worker.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import psutil
+import requests
+
+from benchmarks.fixtures import synthetic_images
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def encode_images(count, seed=0):
+    """Imagens JPEG sintéticas (conteúdos distintos)"""
+    payloads = []
+    for image in synthetic_images(count, seed=seed):
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=90)
+        payloads.append(buffer.getvalue())
+    return payloads
+
+def start_server(workers, port, threads):
+    env = {
+        **os.environ,
+        'PORT': str(port),
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_THREADS': str(threads),
+        'GUNICORN_LOG_LEVEL': 'warning',
+        # Sem caches: toda requisição passa pelo pipeline completo
+        'RESULT_CACHE_SIZE': '0',
+        'EMBEDDING_STORE_SIZE': '0',
+        'VECTOR_INDEX_DIR': '',
+        'WSGI_PRELOAD_MODELS': 'false'
+    }
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         '--access-logfile', '/dev/null', 'benchmarks.serving_app:app'],
+        cwd=BACKEND_DIR, env=env
+    )
+
+def wait_ready(base_url, server, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn terminou com código {server.returncode}")
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("gunicorn não respondeu a tempo")
+
+def memory_usage(server):
+    """RSS e PSS (MB) somados do mestre e dos workers"""
+    processes = [psutil.Process(server.pid)]
+    processes += processes[0].children(recursive=True)
+    rss = pss = 0
+    for process in processes:
+        try:
+            info = process.memory_full_info()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        rss += info.rss
+        pss += getattr(info, 'pss', info.uss)
+    return round(rss / (1024 * 1024), 1), round(pss / (1024 * 1024), 1), len(processes)
+
+def run_load(base_url, payloads, clients, duration, stages):
+    """Clientes em laço fechado durante `duration` segundos"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        session = requests.Session()
+        sent = index
+        while time.perf_counter() < stop_at:
+            payload = payloads[sent % len(payloads)]
+            sent += clients
+            start = time.perf_counter()
+            try:
+                response = session.post(
+                    f"{base_url}/api/analyze",
+                    files={'image': ('bench.jpg', payload, 'image/jpeg')},
+                    data={'stages': stages} if stages else None,
+                    timeout=300
+                )
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with lock:
+                (latencies if ok else errors).append(elapsed_ms)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 2),
+        'p50_latency_ms': round(float(np.percentile(latencies, 50)), 1) if latencies else None,
+        'p95_latency_ms': round(float(np.percentile(latencies, 95)), 1) if latencies else None
+    }
+
+def bench_workers(workers, args, payloads):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(workers, port, args.threads)
+    try:
+        wait_ready(base_url, server, args.startup_timeout)
+
+        # Aquecimento: cada worker faz ao menos uma análise
+        run_load(base_url, payloads, workers * 2, args.warmup, args.stages)
+        result = run_load(base_url, payloads, args.clients, args.duration, args.stages)
+        rss_mb, pss_mb, processes = memory_usage(server)
+        return {'workers': workers, **result, 'rss_mb': rss_mb, 'pss_mb': pss_mb, 'processes': processes}
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4, help='Threads por worker (gthread)')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--warmup', type=float, default=5.0)
+    parser.add_argument('--images', type=int, default=32)
+    parser.add_argument('--stages', default='', help='Etapas por requisição (padrão: todas)')
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--output', help='Arquivo JSON para salvar os resultados')
+    args = parser.parse_args()
+
+    payloads = encode_images(args.images)
+    results = []
+    print(f"clientes: {args.clients} | duração: {args.duration:g}s | threads/worker: {args.threads}")
+    print(f"{'workers':>8} {'req/s':>8} {'p50 (ms)':>10} {'p95 (ms)':>10} {'erros':>6} {'RSS (MB)':>9} {'PSS (MB)':>9}")
+    for workers in args.workers:
+        result = bench_workers(workers, args, payloads)
+        results.append(result)
+        print(f"{workers:>8} {result['requests_per_second']:>8} {result['p50_latency_ms']!s:>10} "
+              f"{result['p95_latency_ms']!s:>10} {result['errors']:>6} {result['rss_mb']:>9} {result['pss_mb']:>9}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
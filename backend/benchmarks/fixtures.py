@@ -0,0 +1,129 @@
+"""Modelos e imagens para os benchmarks, funcionando offline.
+
+Usa os pesos reais do ViT/BLIP quando já estão no cache local do Hugging
+Face; caso contrário, cria versões pequenas inicializadas aleatoriamente
+(mesma arquitetura e mesma API, sem downloads). A inicialização usa uma
+semente fixa, então processos diferentes recebem os mesmos pesos.
+"""
+import os
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+from transformers import (
+    BertTokenizer, BlipConfig, BlipForConditionalGeneration, BlipImageProcessor, BlipProcessor,
+    ViTConfig, ViTForImageClassification, ViTImageProcessor
+)
+
+from utils.ai_models import CLASSIFICATION_MODEL_ID, CAPTION_MODEL_ID
+
+# Vocabulário mínimo do tokenizador BLIP substituto
+TINY_VOCAB = [
+    '[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', '[DEC]',
+    'a', 'an', 'the', 'of', 'with', 'in', 'on', 'and', 'is', 'at',
+    'photo', 'picture', 'image', 'man', 'woman', 'person', 'people', 'child',
+    'dog', 'cat', 'bird', 'car', 'tree', 'house', 'street', 'beach', 'sky',
+    'red', 'green', 'blue', 'white', 'black', 'small', 'large',
+    'sitting', 'standing', 'walking', 'smiling', 'holding', 'table', 'field'
+]
+
+# Semente da inicialização dos modelos substitutos
+TINY_MODEL_SEED = 0
+
+def tiny_classifier():
+    """ViT pequeno com 1000 classes (mesma saída do google/vit-base-patch16-224)"""
+    config = ViTConfig(
+        image_size=224, patch_size=16, hidden_size=192,
+        num_hidden_layers=4, num_attention_heads=3,
+        intermediate_size=768, num_labels=1000
+    )
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(TINY_MODEL_SEED)
+        model = ViTForImageClassification(config)
+    return model.eval(), ViTImageProcessor()
+
+def tiny_captioner():
+    """BLIP pequeno com tokenizador BERT de vocabulário reduzido"""
+    vocab_dir = tempfile.mkdtemp(prefix='tiny-blip-')
+    vocab_file = os.path.join(vocab_dir, 'vocab.txt')
+    with open(vocab_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(TINY_VOCAB) + '\n')
+
+    tokenizer = BertTokenizer(vocab_file)
+    config = BlipConfig(
+        text_config={
+            'vocab_size': len(TINY_VOCAB),
+            'hidden_size': 64,
+            'num_hidden_layers': 2,
+            'num_attention_heads': 2,
+            'intermediate_size': 128,
+            'max_position_embeddings': 64,
+            'pad_token_id': TINY_VOCAB.index('[PAD]'),
+            'bos_token_id': TINY_VOCAB.index('[DEC]'),
+            'sep_token_id': TINY_VOCAB.index('[SEP]')
+        },
+        vision_config={
+            'hidden_size': 64,
+            'intermediate_size': 128,
+            'num_hidden_layers': 2,
+            'num_attention_heads': 2,
+            'image_size': 384,
+            'patch_size': 32
+        }
+    )
+    processor = BlipProcessor(image_processor=BlipImageProcessor(), tokenizer=tokenizer)
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(TINY_MODEL_SEED)
+        model = BlipForConditionalGeneration(config)
+    return model.eval(), processor
+
+def load_classifier():
+    """(modelo, processador, origem) do classificador: pesos locais ou substituto"""
+    try:
+        processor = ViTImageProcessor.from_pretrained(CLASSIFICATION_MODEL_ID, local_files_only=True)
+        model = ViTForImageClassification.from_pretrained(CLASSIFICATION_MODEL_ID, local_files_only=True)
+        return model.eval(), processor, 'pretrained'
+    except Exception:
+        return (*tiny_classifier(), 'random-tiny')
+
+def load_captioner():
+    """(modelo, processador, origem) do BLIP: pesos locais ou substituto"""
+    try:
+        processor = BlipProcessor.from_pretrained(CAPTION_MODEL_ID, local_files_only=True)
+        model = BlipForConditionalGeneration.from_pretrained(CAPTION_MODEL_ID, local_files_only=True)
+        return model.eval(), processor, 'pretrained'
+    except Exception:
+        return (*tiny_captioner(), 'random-tiny')
+
+def install_models(manager, tasks=('classification', 'caption')):
+    """Registra os modelos no AIModelManager (aplicando o backend configurado)"""
+    loaders = {'classification': load_classifier, 'caption': load_captioner}
+    weights = {}
+    for task in tasks:
+        model, processor, weights[task] = loaders[task]()
+        manager.register_model(task, model, processor)
+    return weights
+
+def synthetic_images(count, size=(640, 480), seed=0):
+    """Imagens determinísticas: gradiente + formas + ruído (mesma semente, mesmas imagens)"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    images = []
+    for _ in range(count):
+        x = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+        y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+        base = rng.uniform(0, 255, 3).astype(np.float32)
+        gradient = base * (0.5 + 0.5 * x) * (0.5 + 0.5 * y)
+        noise = rng.normal(0, 12, (height, width, 3))
+        pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+
+        image = Image.fromarray(pixels)
+        draw = ImageDraw.Draw(image)
+        for _ in range(4):
+            x0, y0 = rng.integers(0, width - 1), rng.integers(0, height - 1)
+            x1, y1 = x0 + rng.integers(10, width // 3), y0 + rng.integers(10, height // 3)
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+        images.append(image)
+    return images
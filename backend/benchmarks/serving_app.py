@@ -0,0 +1,12 @@
+"""App WSGI usado pelo teste de carga do gunicorn (benchmarks.bench_workers).
+
+É o app de produção (wsgi.py) com os modelos dos fixtures, registrados no
+processo mestre antes do fork, como acontece com `WSGI_PRELOAD_MODELS`.
+"""
+import gc
+
+from wsgi import app, ai_manager
+from benchmarks.fixtures import install_models
+
+install_models(ai_manager)
+gc.freeze()
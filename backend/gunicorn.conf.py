@@ -0,0 +1,28 @@
+"""Configuração do gunicorn para produção (executar a partir de `backend/`).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Cada worker atende várias requisições em threads (gthread), o que mantém o
+micro-batching entre requisições concorrentes dentro do mesmo processo.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Importa o app (e carrega os modelos) no mestre, antes do fork
+preload_app = True
+
+# Legendas do BLIP em CPU podem levar alguns segundos por lote
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.after_fork(server.cfg.workers)
@@ -0,0 +1,42 @@
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture(scope='session')
+def app_module():
+    """Módulo `app` sem cache, com banco de jobs temporário e modelos pequenos (sem downloads)"""
+    tmp_dir = tempfile.mkdtemp(prefix='analyzer-tests-')
+    os.environ['JOB_DB_PATH'] = os.path.join(tmp_dir, 'jobs.sqlite3')
+    os.environ['VECTOR_INDEX_DIR'] = ''
+    os.environ['RESULT_CACHE_SIZE'] = '0'
+    os.environ['EMBEDDING_STORE_SIZE'] = '0'
+    os.chdir(BACKEND_DIR)
+
+    import app
+    from benchmarks.fixtures import install_models
+    install_models(app.ai_manager)
+    return app
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+@pytest.fixture
+def jpeg_images():
+    """Gera JPEGs sintéticos distintos (bytes)"""
+    from benchmarks.fixtures import synthetic_images
+
+    def make(count, seed=0):
+        payloads = []
+        for image in synthetic_images(count, size=(320, 240), seed=seed):
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=90)
+            payloads.append(buffer.getvalue())
+        return payloads
+    return make
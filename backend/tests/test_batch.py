@@ -0,0 +1,33 @@
+import io
+import json
+
+def post_batch(client, payloads):
+    data = {'images': [(io.BytesIO(payload), f'image-{i}.jpg') for i, payload in enumerate(payloads)]}
+    response = client.post('/api/analyze/batch', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_batch_analyzes_each_image(client, jpeg_images):
+    lines = post_batch(client, jpeg_images(3))
+    results, summary = lines[:-1], lines[-1]
+
+    assert summary == {'done': True, 'total': 3, 'analyzed': 3, 'cached': 0, 'errors': 0}
+    assert sorted(result['index'] for result in results) == [0, 1, 2]
+    for result in results:
+        assert 'error' not in result
+        assert result['filename'] == f"image-{result['index']}.jpg"
+        assert result['classification']['top_predictions']
+        assert 'sentiment' in result
+
+def test_batch_reports_chunk_failure_per_image(client, jpeg_images, app_module, monkeypatch):
+    def failing_batch(contexts, plan=None):
+        raise RuntimeError('falha simulada')
+        yield
+
+    monkeypatch.setattr(app_module.pipeline, 'analyze_batch', failing_batch)
+    lines = post_batch(client, jpeg_images(2, seed=1))
+    results, summary = lines[:-1], lines[-1]
+
+    assert summary == {'done': True, 'total': 2, 'analyzed': 0, 'cached': 0, 'errors': 2}
+    assert [result['index'] for result in results] == [0, 1]
+    assert all(result['error'] == 'Erro ao analisar imagem' for result in results)
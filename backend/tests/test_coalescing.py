@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from utils.admission import LEVEL_NORMAL, LEVEL_SKIP_CAPTION, Admission
+from utils.stage_planner import plan_stages
+
+@pytest.fixture
+def blocking_analysis(app_module, monkeypatch):
+    """analyze_new_image que espera `release` antes de analisar; conta as execuções"""
+    release = threading.Event()
+    calls = []
+    analyze_new_image = app_module.analyze_new_image
+
+    def blocked(*args, **kwargs):
+        calls.append(args[4] if len(args) > 4 else kwargs.get('admission'))
+        release.wait(timeout=30)
+        return analyze_new_image(*args, **kwargs)
+
+    monkeypatch.setattr(app_module, 'analyze_new_image', blocked)
+    return release, calls
+
+def run_concurrently(app_module, payload, admissions, release):
+    """Roda run_analysis do mesmo upload para cada admissão, liberando a análise
+    quando todas já chegaram à coalescência"""
+    plan = plan_stages('classification,description,sentiment')
+    results = [None] * len(admissions)
+    stats = app_module.in_flight.stats
+    arrived = stats['executed'] + stats['coalesced'] + len(admissions)
+
+    def run(index):
+        results[index] = app_module.run_analysis(payload, plan, admission=admissions[index])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(admissions))]
+    for thread in threads:
+        thread.start()
+    while stats['executed'] + stats['coalesced'] < arrived:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=60)
+    return results
+
+def test_identical_uploads_at_different_levels_are_not_coalesced(app_module, blocking_analysis, jpeg_images):
+    release, calls = blocking_analysis
+    payload = jpeg_images(1, seed=4)[0]
+    normal, degraded = run_concurrently(app_module, payload,
+                                        [Admission(LEVEL_NORMAL), Admission(LEVEL_SKIP_CAPTION)], release)
+
+    assert len(calls) == 2
+    assert not normal['cache'].get('coalesced') and not degraded['cache'].get('coalesced')
+    assert normal['degraded'] == []
+    assert degraded['degraded'] == ['description', 'sentiment']
+
+def test_identical_uploads_at_the_same_level_are_coalesced(app_module, blocking_analysis, jpeg_images):
+    release, calls = blocking_analysis
+    payload = jpeg_images(1, seed=5)[0]
+    first, second = run_concurrently(app_module, payload,
+                                     [Admission(LEVEL_NORMAL), Admission(LEVEL_NORMAL)], release)
+
+    assert len(calls) == 1
+    assert [bool(r['cache'].get('coalesced')) for r in (first, second)].count(True) == 1
@@ -0,0 +1,44 @@
+import time
+
+from utils.job_queue import JobQueue, JobStore
+
+class FlakyStore(JobStore):
+    """JobStore cuja gravação de resultados falha nas primeiras `failures` chamadas"""
+
+    def __init__(self, path, failures):
+        super().__init__(path)
+        self.failures = failures
+
+    def finish(self, job_id, result=None, error=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError('database is locked')
+        super().finish(job_id, result=result, error=error)
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condição não atingida'
+        time.sleep(0.05)
+
+def make_queue(tmp_path, failures):
+    store = FlakyStore(str(tmp_path / 'jobs.sqlite3'), failures)
+    return JobQueue(store, lambda payload, stages: {'size': len(payload)}, workers=1)
+
+def test_unwritable_result_is_recorded_as_failure(tmp_path):
+    queue = make_queue(tmp_path, failures=1)
+    job_id = queue.submit(b'abc', 'image.jpg', 'classification')
+    wait_until(lambda: queue.get(job_id)['status'] == 'failed')
+
+    assert 'database is locked' in queue.get(job_id)['error']
+    assert queue.get_stats()['failed'] == 1
+
+def test_worker_survives_store_finish_failures(tmp_path):
+    queue = make_queue(tmp_path, failures=2)
+    stuck = queue.submit(b'abc', 'stuck.jpg', 'classification')
+    wait_until(lambda: queue.store.failures == 0)
+    time.sleep(0.2)
+
+    # Nem o resultado nem a falha foram gravados: o job fica 'running', mas a thread continua viva
+    assert all(thread.is_alive() for thread in queue._threads)
+    assert queue.get(stuck)['status'] == 'running'
@@ -0,0 +1,28 @@
+import io
+import time
+
+def post_job(client, payload):
+    return client.post('/api/jobs', data={'image': (io.BytesIO(payload), 'image.jpg')},
+                       content_type='multipart/form-data')
+
+def test_job_runs_to_completion(client, jpeg_images):
+    response = post_job(client, jpeg_images(1, seed=6)[0])
+    assert response.status_code == 202
+
+    deadline = time.monotonic() + 30
+    while True:
+        job = client.get(response.get_json()['status_url']).get_json()
+        if job['status'] in ('done', 'failed') or time.monotonic() > deadline:
+            break
+        time.sleep(0.1)
+    assert job['status'] == 'done'
+    assert job['result']['classification']['top_predictions']
+
+def test_job_upload_above_file_limit_is_rejected(client, app_module, jpeg_images, monkeypatch):
+    payload = jpeg_images(1, seed=7)[0]
+    monkeypatch.setattr(app_module, 'MAX_FILE_SIZE', len(payload) - 1)
+    submitted = app_module.job_queue.get_stats()['submitted']
+
+    response = post_job(client, payload)
+    assert response.status_code == 413
+    assert app_module.job_queue.get_stats()['submitted'] == submitted
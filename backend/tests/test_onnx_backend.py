@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+
+from transformers import BlipForConditionalGeneration, BlipProcessor
+
+from benchmarks.fixtures import synthetic_images, tiny_captioner
+from tools import export_onnx
+from utils.ai_models import AIModelManager
+from utils.onnx_backend import OnnxModelManager
+
+@pytest.fixture(scope='module')
+def exported_captioner(tmp_path_factory):
+    """BLIP pequeno exportado (codificador + decodificador com cache) e o modelo torch de origem"""
+    model, processor = tiny_captioner()
+    output_dir = str(tmp_path_factory.mktemp('onnx'))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(BlipProcessor, 'from_pretrained', classmethod(lambda cls, *args, **kwargs: processor))
+        mp.setattr(BlipForConditionalGeneration, 'from_pretrained', classmethod(lambda cls, *args, **kwargs: model))
+        export_onnx.export_captioner(output_dir)
+    return output_dir, model, processor
+
+def test_cached_decoder_matches_torch(exported_captioner):
+    output_dir, model, processor = exported_captioner
+    images = synthetic_images(3, size=(320, 240), seed=3)
+
+    torch_manager = AIModelManager()
+    torch_manager.register_model('caption', model, processor)
+    onnx_manager = OnnxModelManager(output_dir)
+
+    onnx_model, _ = onnx_manager._get_model('caption')
+    assert onnx_model.past_names
+    assert onnx_manager.generate_captions(images, max_length=12) == torch_manager.generate_captions(images, max_length=12)
@@ -0,0 +1,36 @@
+import pytest
+
+from utils.sentiment_rules import SentimentRules
+
+@pytest.mark.parametrize('class_name, description, expected', [
+    # Indicador mais longo vence: 'head down', não 'down'
+    ('suit', 'a man with his head down',
+     (0.0, -0.6, ['Postura negativa detectada: head down'])),
+    ('golden retriever', 'a happy dog',
+     (0.7, 0.8, ['Objeto muito positivo: golden retriever', 'Postura positiva detectada: happy'])),
+    # Classe 'active': o boost depende da alegria na legenda
+    ('jersey', 'a man in a jersey with his arms up',
+     (0.5, 0.8, ['Atividade positiva com jersey', 'Postura positiva detectada: arms up'])),
+    ('jersey', 'a man in a jersey standing on a field',
+     (0.1, 0.0, ['Roupa casual/esportiva: jersey'])),
+    ('jersey', 'a sad man in a jersey',
+     (0.1, -0.6, ['Roupa casual/esportiva: jersey', 'Postura negativa detectada: sad'])),
+    ('suit', 'a woman smiling and crying',
+     (0.0, 0.2, ['Postura positiva detectada: smiling', 'Postura negativa detectada: crying'])),
+])
+def test_score(class_name, description, expected):
+    classification_boost, description_boost, notes = SentimentRules().score(class_name, description)
+    expected_classification, expected_description, expected_notes = expected
+
+    assert classification_boost == pytest.approx(expected_classification)
+    assert description_boost == pytest.approx(expected_description)
+    assert notes == expected_notes
+
+def test_precomputed_labels_match_on_demand_rules():
+    rules = SentimentRules()
+    rules.precompute({0: 'Golden retriever', 1: 'jersey, T-shirt', 2: 'umbrella'})
+
+    assert rules.class_rule('golden retriever') == ('very_positive', 'golden retriever')
+    assert rules.class_rule('jersey, t-shirt') == ('active', 'jersey')
+    assert rules.class_rule('umbrella') is None
+    assert rules.class_rule('park bench') == ('positive', 'park')
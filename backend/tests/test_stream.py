@@ -0,0 +1,20 @@
+import io
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], fields['data']))
+    return events
+
+def test_stream_reads_upload_after_view_returns(client, jpeg_images):
+    payload = jpeg_images(1, seed=2)[0]
+    response = client.post('/api/analyze/stream', data={'image': (io.BytesIO(payload), 'image.jpg')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+
+    events = parse_events(response.get_data(as_text=True))
+    names = [name for name, _ in events]
+    assert names[-1] == 'done'
+    assert 'error' not in names
+    assert 'stage' in names
@@ -0,0 +1,198 @@
+"""Exporta o classificador ViT e o BLIP (codificador de visão + decodificador de texto) para ONNX.
+
+Executar a partir de `backend/`:
+
+    python -m tools.export_onnx --output models/onnx
+
+Gera `classification/model.onnx`, `caption/vision_encoder.onnx` e
+`caption/text_decoder.onnx`, junto com as configurações e os processadores,
+prontos para `INFERENCE_BACKEND=onnx`. Com `--verify` compara as saídas do
+onnxruntime com as do torch em uma imagem sintética. Requer as dependências
+opcionais de `requirements-onnx.txt`.
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+from transformers import (
+    BlipForConditionalGeneration, BlipProcessor,
+    ViTForImageClassification, ViTImageProcessor
+)
+
+from utils.ai_models import CLASSIFICATION_MODEL_ID, CAPTION_MODEL_ID
+from utils.onnx_backend import CLASSIFIER_FILE, VISION_ENCODER_FILE, TEXT_DECODER_FILE
+
+logger = logging.getLogger(__name__)
+
+OPSET_VERSION = 17
+# Exportador TorchScript (padrão até o torch 2.8): o cache vazio do primeiro passo do decodificador tem dimensão 0
+
+class ClassifierWithEmbedding(torch.nn.Module):
+    """pixel_values -> (logits, pooled): o CLS normalizado alimenta o EmbeddingStore"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        sequence_output = self.model.vit(pixel_values=pixel_values, return_dict=False)[0]
+        pooled = sequence_output[:, 0, :]
+        return self.model.classifier(pooled), pooled
+
+class VisionEncoder(torch.nn.Module):
+    """pixel_values -> image_embeds (última camada do codificador de visão do BLIP)"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.vision_model = model.vision_model
+
+    def forward(self, pixel_values):
+        return self.vision_model(pixel_values=pixel_values, return_dict=False)[0]
+
+class TextDecoder(torch.nn.Module):
+    """(input_ids, attention_mask, image_embeds, past_key_i, past_value_i...) -> (logits, present_key_i, present_value_i...)
+
+    Com o cache de chaves/valores da autoatenção cada passo da decodificação
+    recebe só o último token; o primeiro passo usa um cache vazio (comprimento 0).
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.text_decoder = model.text_decoder
+
+    def forward(self, input_ids, attention_mask, encoder_hidden_states, *past):
+        past_key_values = tuple(past[i:i + 2] for i in range(0, len(past), 2))
+        logits, present = self.text_decoder(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            encoder_hidden_states=encoder_hidden_states,
+            past_key_values=past_key_values,
+            use_cache=True,
+            return_dict=False
+        )[:2]
+        return (logits, *[tensor for layer in present for tensor in layer])
+
+def decoder_cache_names(num_layers):
+    """Nomes das entradas (past_*) e saídas (present_*) do cache do decodificador, por camada"""
+    past = [f'{kind}_{layer}' for layer in range(num_layers) for kind in ('past_key', 'past_value')]
+    return past, [name.replace('past_', 'present_') for name in past]
+
+def export_classifier(output_dir):
+    model_dir = os.path.join(output_dir, 'classification')
+    os.makedirs(model_dir, exist_ok=True)
+
+    processor = ViTImageProcessor.from_pretrained(CLASSIFICATION_MODEL_ID)
+    model = ViTForImageClassification.from_pretrained(CLASSIFICATION_MODEL_ID).eval()
+    size = model.config.image_size
+
+    logger.info("📊 Exportando classificador ViT...")
+    with torch.no_grad():
+        torch.onnx.export(
+            ClassifierWithEmbedding(model),
+            (torch.zeros(1, 3, size, size),),
+            os.path.join(output_dir, CLASSIFIER_FILE),
+            input_names=['pixel_values'],
+            output_names=['logits', 'pooled'],
+            dynamic_axes={'pixel_values': {0: 'batch'}, 'logits': {0: 'batch'}, 'pooled': {0: 'batch'}},
+            opset_version=OPSET_VERSION,
+            dynamo=False
+        )
+    processor.save_pretrained(model_dir)
+    model.config.save_pretrained(model_dir)
+    return model, processor
+
+def export_captioner(output_dir):
+    model_dir = os.path.join(output_dir, 'caption')
+    os.makedirs(model_dir, exist_ok=True)
+
+    processor = BlipProcessor.from_pretrained(CAPTION_MODEL_ID)
+    model = BlipForConditionalGeneration.from_pretrained(CAPTION_MODEL_ID).eval()
+    size = model.config.vision_config.image_size
+
+    logger.info("📝 Exportando codificador de visão do BLIP...")
+    pixel_values = torch.zeros(1, 3, size, size)
+    with torch.no_grad():
+        torch.onnx.export(
+            VisionEncoder(model),
+            (pixel_values,),
+            os.path.join(output_dir, VISION_ENCODER_FILE),
+            input_names=['pixel_values'],
+            output_names=['image_embeds'],
+            dynamic_axes={'pixel_values': {0: 'batch'}, 'image_embeds': {0: 'batch'}},
+            opset_version=OPSET_VERSION,
+            dynamo=False
+        )
+        image_embeds = VisionEncoder(model)(pixel_values)
+
+    logger.info("📝 Exportando decodificador de texto do BLIP (com cache de chaves/valores)...")
+    text_config = model.config.text_config
+    num_heads = text_config.num_attention_heads
+    past_names, present_names = decoder_cache_names(text_config.num_hidden_layers)
+    # Exemplo de um passo: um token novo sobre um cache de um token
+    input_ids = torch.full((1, 1), text_config.bos_token_id, dtype=torch.long)
+    past = [torch.zeros(1, num_heads, 1, text_config.hidden_size // num_heads) for _ in past_names]
+    dynamic_axes = {
+        'input_ids': {0: 'batch', 1: 'sequence'},
+        'attention_mask': {0: 'batch', 1: 'total_sequence'},
+        'encoder_hidden_states': {0: 'batch'},
+        'logits': {0: 'batch', 1: 'sequence'},
+        **{name: {0: 'batch', 2: 'past_sequence'} for name in past_names},
+        **{name: {0: 'batch', 2: 'total_sequence'} for name in present_names}
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            TextDecoder(model),
+            (input_ids, torch.ones(1, 2, dtype=torch.long), image_embeds, *past),
+            os.path.join(output_dir, TEXT_DECODER_FILE),
+            input_names=['input_ids', 'attention_mask', 'encoder_hidden_states', *past_names],
+            output_names=['logits', *present_names],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET_VERSION,
+            dynamo=False
+        )
+    processor.save_pretrained(model_dir)
+    model.config.save_pretrained(model_dir)
+    return model, processor
+
+def verify(output_dir):
+    """Compara classificação e legenda do backend ONNX com o torch em uma imagem sintética"""
+    from PIL import Image
+    from utils.ai_models import AIModelManager
+    from utils.onnx_backend import OnnxModelManager
+
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8))
+
+    torch_manager = AIModelManager()
+    onnx_manager = OnnxModelManager(output_dir)
+    reference = torch_manager.classify_image(image)
+    candidate = onnx_manager.classify_image(image)
+    print(f"Classe torch: {reference['class']} ({reference['confidence']:.4f})")
+    print(f"Classe ONNX:  {candidate['class']} ({candidate['confidence']:.4f})")
+    print(f"Legenda torch: {torch_manager.generate_caption(image)}")
+    print(f"Legenda ONNX:  {onnx_manager.generate_caption(image)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=os.path.join('models', 'onnx'))
+    parser.add_argument('--only', choices=['classification', 'caption'])
+    parser.add_argument('--verify', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.only in (None, 'classification'):
+        export_classifier(args.output)
+    if args.only in (None, 'caption'):
+        export_captioner(args.output)
+    logger.info(f"✅ Modelos exportados em {args.output}")
+
+    if args.verify:
+        verify(args.output)
+
+if __name__ == '__main__':
+    main()
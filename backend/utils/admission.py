@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Níveis de degradação, do mais leve ao mais severo
+LEVEL_NORMAL = 'normal'
+LEVEL_SHORT_CAPTION = 'short_caption'
+LEVEL_SKIP_CAPTION = 'skip_caption'
+LEVEL_SHED = 'shed'
+
+class OverloadedError(Exception):
+    """Requisição recusada pelo controle de admissão (resposta 503 com Retry-After)"""
+
+    def __init__(self, retry_after):
+        super().__init__('Servidor sobrecarregado, tente novamente em instantes')
+        self.retry_after = retry_after
+
+class Admission:
+    """Decisão do controle de admissão para uma requisição"""
+
+    def __init__(self, level, caption_max_length=None):
+        self.level = level
+        self.caption_max_length = caption_max_length
+
+    @property
+    def skip_caption(self):
+        return self.level == LEVEL_SKIP_CAPTION
+
+    @property
+    def degraded(self):
+        return self.level != LEVEL_NORMAL
+
+class AdmissionController:
+    """Controle de admissão pelas análises em andamento e pela latência recente da legenda.
+
+    A latência da etapa de legenda (inclui a espera na fila do BLIP) entra
+    numa média móvel exponencial que decai com meia-vida `half_life_seconds`
+    sem novas observações, então a legenda volta a ser tentada quando a
+    carga cai. Acima de `short_caption_ms` (ou de metade de `max_in_flight`
+    em andamento) a legenda é encurtada; acima de `skip_caption_ms` (ou de
+    3/4 de `max_in_flight`) ela é pulada e o sentimento usa só a
+    classificação; com `max_in_flight` análises em andamento a requisição é
+    recusada. Limites em 0 ficam desativados.
+    """
+
+    SHORT_CAPTION_LOAD = 0.5
+    SKIP_CAPTION_LOAD = 0.75
+
+    def __init__(self, max_in_flight=0, short_caption_ms=0, skip_caption_ms=0,
+                 short_caption_length=20, retry_after_seconds=5, alpha=0.3, half_life_seconds=10.0):
+        self.max_in_flight = max_in_flight
+        self.short_caption_ms = short_caption_ms
+        self.skip_caption_ms = skip_caption_ms
+        self.short_caption_length = short_caption_length
+        self.retry_after_seconds = retry_after_seconds
+        self.alpha = alpha
+        self.half_life_seconds = half_life_seconds
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._caption_ewma = None
+        self._caption_updated = 0.0
+        self.stats = {level: 0 for level in (LEVEL_NORMAL, LEVEL_SHORT_CAPTION, LEVEL_SKIP_CAPTION, LEVEL_SHED)}
+
+    def acquire(self):
+        """Admite (ou recusa com OverloadedError) uma análise e retorna a decisão"""
+        with self._lock:
+            level = self._level()
+            self.stats[level] += 1
+            if level == LEVEL_SHED:
+                raise OverloadedError(self.retry_after_seconds)
+            self._in_flight += 1
+            in_flight = self._in_flight
+
+        if level != LEVEL_NORMAL:
+            logger.warning(f"🚦 Sobrecarga ({in_flight} em andamento): {level}")
+        if level == LEVEL_SHORT_CAPTION:
+            return Admission(level, self.short_caption_length)
+        return Admission(level)
+
+    def release(self, admission):
+        """Libera a vaga de uma análise admitida"""
+        with self._lock:
+            self._in_flight -= 1
+
+    def observe_caption(self, ms):
+        """Registra a latência (ms) de uma legenda completa"""
+        with self._lock:
+            current = self._caption_latency(time.monotonic())
+            self._caption_ewma = ms if current is None else self.alpha * ms + (1 - self.alpha) * current
+            self._caption_updated = time.monotonic()
+
+    def get_stats(self):
+        """Análises em andamento, latência média da legenda e decisões por nível"""
+        with self._lock:
+            latency = self._caption_latency(time.monotonic())
+            return {
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'caption_latency_ms': round(latency, 1) if latency is not None else None,
+                'level': self._level(),
+                'decisions': dict(self.stats)
+            }
+
+    def _caption_latency(self, now):
+        if self._caption_ewma is None:
+            return None
+        age = now - self._caption_updated
+        return self._caption_ewma * 0.5 ** (age / self.half_life_seconds)
+
+    def _level(self):
+        load = self._in_flight / self.max_in_flight if self.max_in_flight > 0 else 0.0
+        if self.max_in_flight > 0 and self._in_flight >= self.max_in_flight:
+            return LEVEL_SHED
+
+        latency = self._caption_latency(time.monotonic()) or 0.0
+        if load >= self.SKIP_CAPTION_LOAD or 0 < self.skip_caption_ms <= latency:
+            return LEVEL_SKIP_CAPTION
+        if load >= self.SHORT_CAPTION_LOAD or 0 < self.short_caption_ms <= latency:
+            return LEVEL_SHORT_CAPTION
+        return LEVEL_NORMAL
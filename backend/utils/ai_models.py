@@ -1,129 +1,391 @@
 import torch
 from transformers import (
     BlipProcessor, BlipForConditionalGeneration,
-    ViTImageProcessor, ViTForImageClassification,
-    pipeline
+    ViTImageProcessor, ViTForImageClassification
 )
-from PIL import Image
 import logging
-import colorsys
 import numpy as np
-from collections import Counter
+from .analysis_context import AnalysisContext
+from .batch_scheduler import MicroBatchScheduler
+from .color_stats import compute_color_stats
+from .metrics import track
+from .model_registry import ModelRegistry
+from .sentiment_rules import SentimentRules
+from .inference_backend import InferenceConfig, apply_precision, apply_graph, model_dtype
 
 logger = logging.getLogger(__name__)
 
+# Modelos Hugging Face usados por cada tarefa
+CLASSIFICATION_MODEL_ID = 'google/vit-base-patch16-224'
+CAPTION_MODEL_ID = "Salesforce/blip-image-captioning-base"
+
+def _model_bytes(model):
+    """Memória ocupada pelos pesos de um modelo torch (inclui pesos int8 empacotados)"""
+    def tensor_bytes(value):
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(item) for item in value)
+        return 0
+    
+    return sum(tensor_bytes(value) for value in model.state_dict().values())
+
+def _as_float_array(value):
+    """Tensor torch ou array numpy -> array numpy float32 (para o EmbeddingStore)"""
+    if isinstance(value, torch.Tensor):
+        return value.detach().float().cpu().numpy()
+    return np.asarray(value, dtype=np.float32)
+
 class AIModelManager:
-    def __init__(self):
-        self.models = {}
-        self.processors = {}
-        self.pipelines = {}
+    def __init__(self, memory_budget_mb=0, idle_ttl_seconds=0, inference_config=None):
+        self.schedulers = {}
+        self.embedding_store = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"🔥 Usando dispositivo: {self.device}")
+        self.inference_config = inference_config or InferenceConfig()
+        self.input_dtypes = {}
+        self.sentiment_rules = SentimentRules()
+        logger.info(f"🔥 Usando dispositivo: {self.device} (inferência: {self.inference_config.name})")
+        
+        # Modelos carregados sob demanda, no primeiro uso
+        self.registry = ModelRegistry(memory_budget_mb, idle_ttl_seconds)
+        self.registry.register('classification', self._load_classification_model)
+        self.registry.register('caption', self._load_caption_model)
+    
+    def initialize_models(self, names=None):
+        """Carrega antecipadamente os modelos de IA (em paralelo)
+
+        Opcional: sem esta chamada cada modelo é carregado no primeiro uso.
+        """
+        names = names or ['classification', 'caption']
+        errors = self.registry.ensure(names)
+        if errors:
+            logger.error(f"❌ Erro ao carregar modelos: {errors}")
+            raise RuntimeError(f"Falha ao carregar modelos: {', '.join(errors)}")
+        logger.info("✅ Todos os modelos carregados!")
+    
+    def ensure_models(self, names):
+        """Carrega em paralelo os modelos ainda ausentes; retorna {nome: erro}"""
+        return self.registry.ensure(names)
+    
+    def _load_classification_model(self):
+        # Modelo para classificação de imagens
+        logger.info("📊 Carregando modelo de classificação...")
+        processor = ViTImageProcessor.from_pretrained(CLASSIFICATION_MODEL_ID)
+        model = ViTForImageClassification.from_pretrained(CLASSIFICATION_MODEL_ID).to(self.device)
+        return self._prepare_model('classification', model, processor)
+    
+    def _load_caption_model(self):
+        # Modelo para geração de legendas
+        logger.info("📝 Carregando modelo de legendas...")
+        processor = BlipProcessor.from_pretrained(CAPTION_MODEL_ID)
+        model = BlipForConditionalGeneration.from_pretrained(CAPTION_MODEL_ID).to(self.device)
+        return self._prepare_model('caption', model, processor)
+    
+    def _prepare_model(self, task, model, processor):
+        """Aplica o backend de inferência configurado; retorna (modelo, processador, bytes)"""
+        if task == 'classification':
+            self.sentiment_rules.precompute(model.config.id2label)
+        model = apply_precision(model, task, self.inference_config, self.device)
+        self.input_dtypes[task] = model_dtype(model)
+        nbytes = _model_bytes(model)
+        model = apply_graph(model, task, self.inference_config, self.device)
+        return model, processor, nbytes
+    
+    def register_model(self, task, model, processor):
+        """Registra um modelo já instanciado (pesos locais, benchmarks), aplicando o backend configurado"""
+        model, processor, nbytes = self._prepare_model(task, model.to(self.device), processor)
+        self.registry.put(task, model, processor, nbytes)
+    
+    def _to_model_inputs(self, task, inputs):
+        """Move as entradas para o dispositivo e converte pixel_values para o dtype do modelo"""
+        dtype = self.input_dtypes.get(task, torch.float32)
+        return {
+            k: v.to(self.device, dtype=dtype) if k == 'pixel_values' else v.to(self.device)
+            for k, v in inputs.items()
+        }
+    
+    def after_fork(self, num_threads=0):
+        """Prepara um processo filho (worker do gunicorn) que herdou os modelos já carregados
+
+        Recria threads e travas dos schedulers e do registro e, se informado,
+        limita as threads do torch para os workers não disputarem os núcleos.
+        """
+        self.registry.after_fork()
+        for scheduler in self.schedulers.values():
+            scheduler.after_fork()
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+    
+    def _get_model(self, task):
+        """(modelo, processador) de uma tarefa, carregando sob demanda"""
+        return self.registry.get(task)
+    
+    def enable_batching(self, task, max_batch_size=8, max_wait_ms=10):
+        """Ativa o micro-batching de uma tarefa ('classification' ou 'caption') entre requisições concorrentes"""
+        batch_functions = {
+            'classification': self._classify_items,
+            'caption': self._caption_batch
+        }
+        if task not in batch_functions:
+            raise ValueError(f"Tarefa sem suporte a lotes: {task}")
+        
+        if max_batch_size <= 1:
+            self.schedulers.pop(task, None)
+            return
+        self.schedulers[task] = MicroBatchScheduler(
+            task,
+            batch_functions[task],
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms
+        )
+        logger.info(f"📦 Micro-batching de {task}: até {max_batch_size} imagens / {max_wait_ms}ms")
+    
+    def enable_embedding_store(self, store):
+        """Guarda os embeddings do ViT e do BLIP por hash da imagem (EmbeddingStore)
+
+        Com o store ativo, uma nova legenda da mesma imagem reaproveita a saída
+        do codificador de visão e só executa a decodificação.
+        """
+        self.embedding_store = store
+    
+    def get_embeddings(self, embedding_key):
+        """Embeddings guardados de uma imagem ({modelo: vetor float16}) ou None"""
+        if self.embedding_store is None or embedding_key is None:
+            return None
+        return self.embedding_store.get(embedding_key)
     
-    def initialize_models(self):
-        """Carrega todos os modelos de IA"""
+    def classify_image(self, image, embedding_key=None):
+        """Classifica uma imagem
+
+        `embedding_key` (hash da imagem) guarda o embedding do ViT no EmbeddingStore.
+        """
         try:
-            # Modelo para classificação de imagens
-            logger.info("📊 Carregando modelo de classificação...")
-            self.processors['classification'] = ViTImageProcessor.from_pretrained('google/vit-base-patch16-224')
-            self.models['classification'] = ViTForImageClassification.from_pretrained('google/vit-base-patch16-224')
-            
-            # Modelo para geração de legendas
-            logger.info("📝 Carregando modelo de legendas...")
-            self.processors['caption'] = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-            self.models['caption'] = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-            
-            # Pipeline para análise de sentimentos
-            logger.info("😊 Carregando modelo de sentimentos...")
-            self.pipelines['sentiment'] = pipeline(
-                "image-classification",
-                model="j-hartmann/emotion-english-distilroberta-base",
-                device=0 if self.device == "cuda" else -1
-            )
+            if not self._is_available('classification'):
+                return {'error': 'Modelo de classificação não carregado'}
             
-            # Mover modelos para GPU se disponível
-            if self.device == "cuda":
-                for model_name, model in self.models.items():
-                    self.models[model_name] = model.to(self.device)
+            # Com micro-batching ativo, a imagem entra no próximo lote
+            scheduler = self.schedulers.get('classification')
+            if scheduler is not None:
+                return scheduler.run((image, embedding_key))
             
-            logger.info("✅ Todos os modelos carregados!")
+            return self._classify_batch([image], [embedding_key])[0]
             
         except Exception as e:
-            logger.error(f"❌ Erro ao carregar modelos: {e}")
-            raise
+            logger.error(f"Erro na classificação: {e}")
+            return {'error': str(e)}
     
-    def classify_image(self, image):
-        """Classifica uma imagem"""
+    def classify_images(self, images, embedding_keys=None):
+        """Classifica várias imagens em um único forward pass"""
         try:
-            if 'classification' not in self.models:
-                return {'error': 'Modelo de classificação não carregado'}
-            
-            # Preprocessar imagem
-            inputs = self.processors['classification'](image, return_tensors="pt")
-            if self.device == "cuda":
-                inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # Inferência
-            with torch.no_grad():
-                outputs = self.models['classification'](**inputs)
-                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+            if not self._is_available('classification'):
+                return [{'error': 'Modelo de classificação não carregado'} for _ in images]
             
-            # Processar resultados
-            predicted_class_idx = predictions.argmax().item()
-            confidence = predictions[0][predicted_class_idx].item()
+            return self._classify_batch(images, embedding_keys)
             
-            # Obter nome da classe
-            class_name = self.models['classification'].config.id2label[predicted_class_idx]
-            
-            return {
-                'class': class_name,
-                'confidence': confidence,
+        except Exception as e:
+            logger.error(f"Erro na classificação em lote: {e}")
+            return [{'error': str(e)} for _ in images]
+    
+    def _classify_items(self, items):
+        """Lote do micro-batching: itens (imagem, embedding_key)"""
+        return self._classify_batch([image for image, _ in items], [key for _, key in items])
+    
+    def _wants_embeddings(self, embedding_keys):
+        return self.embedding_store is not None and any(key is not None for key in embedding_keys or ())
+    
+    def _store_embeddings(self, name, embedding_keys, vectors):
+        for key, vector in zip(embedding_keys, vectors):
+            if key is not None:
+                self.embedding_store.put(key, name, _as_float_array(vector))
+    
+    def _classify_batch(self, images, embedding_keys=None):
+        """Forward pass do ViT para um lote de imagens (top-5 por imagem)
+
+        Com o EmbeddingStore ativo, o CLS normalizado da última camada (a
+        entrada do classificador) é guardado no mesmo forward pass.
+        """
+        model, processor = self._get_model('classification')
+        want_embeddings = self._wants_embeddings(embedding_keys)
+        
+        # Preprocessar imagens
+        with track('vit_preprocess'):
+            inputs = self._to_model_inputs('classification', processor(images, return_tensors="pt"))
+        
+        # Inferência
+        with track('vit_forward', batch_size=len(images)), torch.no_grad():
+            if want_embeddings:
+                outputs = model(**inputs, output_hidden_states=True)
+            else:
+                outputs = model(**inputs)
+            predictions = torch.nn.functional.softmax(outputs.logits.float(), dim=-1)
+            
+            # Modelos rastreados (TorchScript) não expõem os estados ocultos
+            hidden_states = getattr(outputs, 'hidden_states', None) if want_embeddings else None
+            if hidden_states is not None:
+                pooled = model.vit.layernorm(hidden_states[-1][:, 0])
+                self._store_embeddings('classification', embedding_keys, pooled)
+        
+        # Processar resultados
+        top_confidences, top_indices = predictions.topk(min(5, predictions.shape[-1]), dim=-1)
+        return self._format_classifications(top_confidences.tolist(), top_indices.tolist(), model.config.id2label)
+    
+    def _format_classifications(self, top_confidences, top_indices, id2label):
+        """Monta a resposta de classificação (classe, confiança e top-5) de cada imagem"""
+        results = []
+        for confidences, indices in zip(top_confidences, top_indices):
+            results.append({
+                'class': id2label[indices[0]],
+                'confidence': confidences[0],
                 'top_predictions': [
                     {
-                        'class': self.models['classification'].config.id2label[i],
-                        'confidence': predictions[0][i].item()
+                        'class': id2label[i],
+                        'confidence': confidence
                     }
-                    for i in predictions.argsort(descending=True)[0][:5].tolist()
+                    for i, confidence in zip(indices, confidences)
                 ]
-            }
-            
-        except Exception as e:
-            logger.error(f"Erro na classificação: {e}")
-            return {'error': str(e)}
+            })
+        
+        return results
     
-    def generate_caption(self, image):
-        """Gera uma legenda para a imagem"""
+    def generate_caption(self, image, max_length=50, embedding_key=None):
+        """Gera uma legenda para a imagem
+
+        `embedding_key` (hash da imagem) permite reaproveitar a saída do
+        codificador de visão guardada no EmbeddingStore.
+        """
         try:
-            if 'caption' not in self.models:
+            if not self._is_available('caption'):
                 return 'Modelo de legendas não disponível'
             
-            # Preprocessar
-            inputs = self.processors['caption'](image, return_tensors="pt")
-            if self.device == "cuda":
-                inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # Gerar legenda
-            with torch.no_grad():
-                out = self.models['caption'].generate(**inputs, max_length=50)
+            # Com micro-batching ativo, a imagem entra no próximo lote de decodificação
+            scheduler = self.schedulers.get('caption')
+            if scheduler is not None:
+                return scheduler.run((image, max_length, embedding_key))
             
-            # Decodificar
-            caption = self.processors['caption'].decode(out[0], skip_special_tokens=True)
-            
-            return caption
+            return self._caption_batch([(image, max_length, embedding_key)])[0]
             
         except Exception as e:
             logger.error(f"Erro na geração de legenda: {e}")
             return f'Erro: {str(e)}'
     
-    def analyze_sentiment(self, image):
-        """Analisa o sentimento visual da imagem usando múltiplas técnicas MELHORADAS"""
+    def generate_captions(self, images, max_length=50, embedding_keys=None):
+        """Gera legendas para várias imagens em uma única chamada a generate"""
         try:
-            logger.info("🎭 Iniciando análise de sentimento melhorada...")
+            if not self._is_available('caption'):
+                return ['Modelo de legendas não disponível' for _ in images]
+            
+            embedding_keys = embedding_keys or [None] * len(images)
+            return self._caption_batch([
+                (image, max_length, key) for image, key in zip(images, embedding_keys)
+            ])
+            
+        except Exception as e:
+            logger.error(f"Erro na geração de legendas em lote: {e}")
+            return [f'Erro: {str(e)}' for _ in images]
+    
+    def _caption_batch(self, items):
+        """Decodificação gulosa do BLIP para um lote de (imagem, max_length, embedding_key)
+
+        O codificador de visão roda uma vez para as imagens sem saída em cache;
+        itens com o mesmo max_length compartilham uma única decodificação e a
+        saída de cada imagem é idêntica à do caminho sem lote.
+        """
+        model, processor = self._get_model('caption')
+        encoder_outputs = self._caption_encoder_outputs(model, processor, items)
+        
+        groups = {}
+        for index, (image, max_length, _) in enumerate(items):
+            groups.setdefault(max_length, []).append(index)
+        
+        captions = [None] * len(items)
+        for max_length, indices in groups.items():
+            image_embeds = torch.stack([encoder_outputs[i].to(self.device) for i in indices])
+            
+            # Gerar legendas (sequências mais curtas são completadas com padding)
+            with track('blip_generate', batch_size=len(indices)), torch.no_grad():
+                out = self._generate_from_embeds(model, image_embeds, max_length)
+            
+            # Decodificar
+            decoded = processor.batch_decode(out, skip_special_tokens=True)
+            for i, caption in zip(indices, decoded):
+                captions[i] = caption
+        
+        return captions
+    
+    def _caption_encoder_outputs(self, model, processor, items):
+        """Saída do codificador de visão de cada item, reaproveitando o EmbeddingStore
+
+        Só as imagens sem saída em cache passam pelo codificador (em um único
+        lote); as novas saídas e o CLS de cada uma são guardados no store.
+        """
+        store = self.embedding_store
+        outputs = [None] * len(items)
+        if store is not None:
+            for index, (_, _, key) in enumerate(items):
+                if key is not None:
+                    outputs[index] = store.get_encoder_output(key)
+        
+        missing = [index for index, output in enumerate(outputs) if output is None]
+        if missing:
+            encoded = self._encode_caption_images(model, processor, [items[i][0] for i in missing])
+            for index, hidden_states in zip(missing, encoded):
+                outputs[index] = hidden_states
+                key = items[index][2]
+                if store is not None and key is not None:
+                    store.put_encoder_output(key, hidden_states)
+                    store.put(key, 'caption', _as_float_array(hidden_states[0]))
+        
+        return outputs
+    
+    def _encode_caption_images(self, model, processor, images):
+        """Codificador de visão do BLIP: uma saída (tokens x dim) independente por imagem"""
+        with track('blip_preprocess'):
+            inputs = self._to_model_inputs('caption', processor(images, return_tensors="pt"))
+        with track('blip_encode', batch_size=len(images)), torch.no_grad():
+            image_embeds = model.vision_model(pixel_values=inputs['pixel_values'])[0]
+        return [hidden_states.cpu().clone() for hidden_states in image_embeds]
+    
+    def _generate_from_embeds(self, model, image_embeds, max_length):
+        """Equivalente ao `generate` do BLIP a partir da saída do codificador de visão"""
+        text_config = model.config.text_config
+        input_ids = torch.full(
+            (image_embeds.shape[0], 1), text_config.bos_token_id, dtype=torch.long, device=image_embeds.device
+        )
+        image_attention_mask = torch.ones(image_embeds.shape[:-1], dtype=torch.long, device=image_embeds.device)
+        return model.text_decoder.generate(
+            input_ids=input_ids,
+            eos_token_id=text_config.sep_token_id,
+            pad_token_id=text_config.pad_token_id,
+            encoder_hidden_states=image_embeds,
+            encoder_attention_mask=image_attention_mask,
+            max_length=max_length
+        )
+    
+    def analyze_sentiment(self, image, context=None):
+        """Analisa o sentimento visual da imagem usando múltiplas técnicas MELHORADAS
+
+        Se um AnalysisContext for informado, reaproveita a classificação e a
+        legenda já calculadas na mesma requisição.
+        """
+        try:
+            logger.debug("🎭 Iniciando análise de sentimento melhorada...")
+            
+            if context is None:
+                context = AnalysisContext(self, image)
+            
+            # Reaproveitar os buffers decodificados da requisição, se houver
+            preprocessed = context.preprocessed
             
             # Combinar diferentes análises para determinar sentimento
-            color_sentiment = self._analyze_color_sentiment(image)
-            brightness_sentiment = self._analyze_brightness_sentiment(image)
-            classification_sentiment = self._get_classification_sentiment(image)
+            with track('color'):
+                color_sentiment = self._analyze_color_sentiment(
+                    image, preprocessed.rgb if preprocessed is not None else None
+                )
+            with track('brightness'):
+                brightness_sentiment = self._analyze_brightness_sentiment(
+                    image, preprocessed.gray if preprocessed is not None else None
+                )
+            classification_sentiment = self._get_classification_sentiment(image, context)
             
             # Calcular score final
             sentiment_score = (
@@ -144,7 +406,7 @@ class AIModelManager:
             else:
                 sentiment = "Muito Negativo"
             
-            logger.info(f"✅ Sentimento analisado: {sentiment} (score: {sentiment_score:.3f})")
+            logger.debug(f"✅ Sentimento analisado: {sentiment} (score: {sentiment_score:.3f})")
             
             return {
                 'sentiment': sentiment,
@@ -164,42 +426,27 @@ class AIModelManager:
                 'error': str(e)
             }
     
-    def _analyze_color_sentiment(self, image):
+    def _analyze_color_sentiment(self, image, img_array=None):
         """Analisa sentimento baseado nas cores da imagem"""
         try:
             # Converter para array numpy
-            img_array = np.array(image)
+            if img_array is None:
+                img_array = np.array(image)
             
-            # Redimensionar para análise mais rápida
-            if img_array.shape[0] > 200:
-                step = img_array.shape[0] // 200
-                img_array = img_array[::step, ::step]
-            
-            # Analisar cores dominantes
-            pixels = img_array.reshape(-1, 3)
-            
-            # Calcular médias de cor
-            avg_red = np.mean(pixels[:, 0])
-            avg_green = np.mean(pixels[:, 1])
-            avg_blue = np.mean(pixels[:, 2])
-            
-            # Converter para HSV para análise de saturação
-            hsv_pixels = []
-            for pixel in pixels[::100]:
-                r, g, b = pixel / 255.0
-                h, s, v = colorsys.rgb_to_hsv(r, g, b)
-                hsv_pixels.append([h, s, v])
-            
-            hsv_array = np.array(hsv_pixels)
-            avg_saturation = np.mean(hsv_array[:, 1])
-            avg_value = np.mean(hsv_array[:, 2])
+            # Estatísticas de cor vetorizadas sobre a grade amostrada
+            stats = compute_color_stats(img_array)
+            avg_red = stats['avg_red']
+            avg_green = stats['avg_green']
+            avg_blue = stats['avg_blue']
+            avg_saturation = stats['saturation']
+            avg_value = stats['value']
             
             # Análise de sentimento por cor
             sentiment_score = 0.0
             color_notes = []
             
             # Cores quentes (vermelho, laranja, amarelo) = mais positivo
-            warmth_score = (avg_red - avg_blue) / 255.0
+            warmth_score = stats['warmth']
             if warmth_score > 0.1:
                 sentiment_score += 0.3
                 color_notes.append("Cores quentes (energético)")
@@ -244,11 +491,12 @@ class AIModelManager:
             logger.error(f"Erro na análise de cor: {e}")
             return {'score': 0.0, 'notes': ['Erro na análise'], 'error': str(e)}
     
-    def _analyze_brightness_sentiment(self, image):
+    def _analyze_brightness_sentiment(self, image, img_array=None):
         """Analisa sentimento baseado no brilho e contraste"""
         try:
             # Converter para grayscale
-            img_array = np.array(image.convert('L'))
+            if img_array is None:
+                img_array = np.array(image.convert('L'))
             
             # Métricas de brilho
             brightness = np.mean(img_array)
@@ -289,140 +537,37 @@ class AIModelManager:
             logger.error(f"Erro na análise de brilho: {e}")
             return {'score': 0.0, 'notes': ['Erro na análise'], 'error': str(e)}
     
-    def _get_classification_sentiment(self, image):
+    def _get_classification_sentiment(self, image, context=None):
         """Analisa sentimento baseado na classificação da imagem + DESCRIÇÃO (MELHORADO)"""
         try:
+            if context is None:
+                context = AnalysisContext(self, image)
+            
             # Usar a classificação existente
-            classification = self.classify_image(image)
+            classification = context.classification()
             
             if 'error' in classification:
                 return {'score': 0.0, 'notes': ['Classificação não disponível']}
             
             class_name = classification.get('class', '').lower()
-            sentiment_score = 0.0
-            notes = []
             
-            # Mapeamento de classes para sentimentos
-            very_positive_keywords = [
-                'golden retriever', 'labrador', 'dog', 'puppy',
-                'flower', 'garden', 'beach', 'sunset', 'sunrise',
-                'baby', 'child', 'wedding', 'celebration', 'party',
-                'cake', 'ice cream', 'birthday',
-                'butterfly', 'bird', 'rainbow'
-            ]
-            
-            positive_keywords = [
-                'food', 'fruit', 'nature', 'tree', 'park',
-                'sport', 'football', 'basketball', 'tennis',
-                'music', 'guitar', 'piano',
-                'vacation', 'travel', 'adventure'
-            ]
-            
-            # Detectar pessoas felizes/ativas
-            active_positive_keywords = [
-                'sweatshirt', 'hoodie', 'jersey', 'sportswear',
-                'running', 'exercise', 'fitness', 'yoga',
-                'dance', 'celebration', 'victory', 'polo shirt'
-            ]
-            
-            negative_keywords = [
-                'storm', 'rain', 'dark', 'shadow',
-                'weapon', 'fire', 'smoke', 'accident',
-                'hospital', 'medicine', 'bandage',
-                'funeral', 'cemetery', 'prison'
-            ]
-            
-            neutral_keywords = [
-                'building', 'street', 'car', 'computer',
-                'document', 'book', 'tool', 'furniture',
-                'desk', 'chair', 'table'
-            ]
-            
-            # Combinar com análise de descrição
+            # Combinar com análise de descrição (sem legenda sob carga: só a classificação)
             try:
-                description = self.generate_caption(image).lower()
-                logger.info(f"📝 Descrição para análise: {description}")
+                description = (context.caption() or '').lower()
+                logger.debug(f"📝 Descrição para análise: {description}")
             except:
                 description = ""
             
-            # Verificar se a descrição indica alegria/atividade
-            joy_indicators = [
-                'arms up', 'fists raised', 'celebrating', 'cheering',
-                'jumping', 'dancing', 'smiling', 'laughing',
-                'victory', 'success', 'happy', 'excited',
-                'thumbs up', 'waving', 'pointing up', 'hands up'
-            ]
-            
-            sad_indicators = [
-                'crying', 'sad', 'depressed', 'down', 'head down',
-                'covering face', 'tears', 'grief', 'mourning'
-            ]
-            
-            description_boost = 0.0
-            description_notes = []
-            
-            # Verificar indicadores de alegria
-            for indicator in joy_indicators:
-                if indicator in description:
-                    description_boost += 0.8 
-                    description_notes.append(f"Postura positiva detectada: {indicator}")
-                    break
-            
-            # Verificar indicadores de tristeza
-            for indicator in sad_indicators:
-                if indicator in description:
-                    description_boost -= 0.6
-                    description_notes.append(f"Postura negativa detectada: {indicator}")
-                    break
-            
-            # Verificar keywords na classificação
-            classification_boost = 0.0
-            
-            for keyword in very_positive_keywords:
-                if keyword in class_name:
-                    classification_boost += 0.7
-                    notes.append(f"Objeto muito positivo: {keyword}")
-                    break
-            else:
-                for keyword in positive_keywords:
-                    if keyword in class_name:
-                        classification_boost += 0.4
-                        notes.append(f"Objeto positivo: {keyword}")
-                        break
-                else:
-                    for keyword in active_positive_keywords:
-                        if keyword in class_name:
-                            # Para roupas esportivas, usar a descrição para determinar contexto
-                            if description_boost > 0:
-                                classification_boost += 0.5 
-                                notes.append(f"Atividade positiva com {keyword}")
-                            else:
-                                classification_boost += 0.1  
-                                notes.append(f"Roupa casual/esportiva: {keyword}")
-                            break
-                    else:
-                        for keyword in negative_keywords:
-                            if keyword in class_name:
-                                classification_boost -= 0.4
-                                notes.append(f"Objeto negativo: {keyword}")
-                                break
-                        else:
-                            for keyword in neutral_keywords:
-                                if keyword in class_name:
-                                    classification_boost += 0.1
-                                    notes.append(f"Objeto neutro: {keyword}")
-                                    break
+            # Categoria da classe (tabela pré-calculada) + indicadores de postura na descrição
+            classification_boost, description_boost, notes = self.sentiment_rules.score(class_name, description)
             
             # Combinar scores
             sentiment_score = classification_boost + description_boost
             
-            # Adicionar notas da descrição
-            notes.extend(description_notes)
-            
             if not notes:
                 notes.append(f"Classificação: {class_name}")
             
-            logger.info(f"🎯 Classification boost: {classification_boost}, Description boost: {description_boost}")
+            logger.debug(f"🎯 Classification boost: {classification_boost}, Description boost: {description_boost}")
             
             return {
                 'score': max(-1.0, min(1.0, sentiment_score)),
@@ -437,21 +582,54 @@ class AIModelManager:
             logger.error(f"Erro na análise de classificação: {e}")
             return {'score': 0.0, 'notes': ['Erro na análise'], 'error': str(e)}
     
+    def get_input_size(self, task):
+        """Tamanho (largura, altura) e filtro de redimensionamento da entrada de um modelo
+
+        Permite redimensionar a imagem uma única vez, antes do processador.
+        Retorna None se o modelo não estiver carregado ou não redimensionar.
+        """
+        if not self.registry.is_loaded(task):
+            return None
+        _, processor = self._get_model(task)
+        
+        image_processor = getattr(processor, 'image_processor', processor)
+        size = getattr(image_processor, 'size', None)
+        if not getattr(image_processor, 'do_resize', False) or not isinstance(size, dict):
+            return None
+        if 'height' not in size or 'width' not in size:
+            return None
+        
+        return (size['width'], size['height']), image_processor.resample
+    
+    def _is_available(self, task):
+        """Carrega o modelo sob demanda; False se o carregamento falhar"""
+        if self.registry.is_loaded(task):
+            return True
+        return not self.registry.ensure([task])
+    
     def get_model_status(self):
         """Retorna o status dos modelos"""
         return {
-            'classification': 'classification' in self.models,
-            'caption': 'caption' in self.models,
-            'sentiment': 'sentiment' in self.pipelines,
+            'classification': self.registry.is_loaded('classification'),
+            'caption': self.registry.is_loaded('caption'),
+            # Regras sobre a classificação e a legenda (sem modelo próprio)
+            'sentiment': self.registry.is_loaded('classification') and self.registry.is_loaded('caption'),
             'device': self.device
         }
     
     def get_model_info(self):
         """Informações detalhadas dos modelos"""
+        registry_info = self.registry.get_info()
         return {
-            'loaded_models': list(self.models.keys()),
-            'loaded_pipelines': list(self.pipelines.keys()),
+            'loaded_models': registry_info['resident'],
             'device': self.device,
             'torch_version': torch.__version__,
-            'cuda_available': torch.cuda.is_available()
-        }
\ No newline at end of file
+            'cuda_available': torch.cuda.is_available(),
+            'inference': self.inference_config.to_dict(),
+            'registry': registry_info,
+            'embeddings': self.embedding_store.get_stats() if self.embedding_store is not None else None,
+            'batching': {
+                name: scheduler.get_stats()
+                for name, scheduler in self.schedulers.items()
+            }
+        }
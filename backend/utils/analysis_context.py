@@ -0,0 +1,85 @@
+from collections import Counter
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AnalysisContext:
+    """Contexto de uma requisição de análise.
+
+    Memoriza as saídas dos modelos (classificação e legenda) para que cada
+    modelo rode no máximo uma vez por imagem, mesmo quando várias etapas
+    (classificação, descrição, sentimento) precisam do mesmo resultado. O
+    hash da imagem, quando conhecido, indexa os embeddings no EmbeddingStore.
+    """
+
+    def __init__(self, ai_manager, image, preprocessed=None, image_hash=None):
+        self.ai_manager = ai_manager
+        self.image = image
+        self.preprocessed = preprocessed
+        self.image_hash = image_hash
+        self._memo = {}
+        self.forward_passes = Counter()
+        self.timings = {}
+        # Degradação sob carga (controle de admissão): legenda encurtada ou pulada
+        self.caption_max_length = None
+        self.skip_caption = False
+
+    def classification(self):
+        """Classificação da imagem (executa o ViT apenas uma vez)"""
+        if 'classification' not in self._memo:
+            self.forward_passes['classification'] += 1
+            self._memo['classification'] = self.ai_manager.classify_image(
+                self.model_image('classification'), embedding_key=self.image_hash)
+        return self._memo['classification']
+
+    def caption(self):
+        """Legenda da imagem (executa o BLIP apenas uma vez; None quando pulada sob carga)"""
+        if self.skip_caption:
+            return None
+        if 'caption' not in self._memo:
+            self.forward_passes['caption'] += 1
+            kwargs = {} if self.caption_max_length is None else {'max_length': self.caption_max_length}
+            self._memo['caption'] = self.ai_manager.generate_caption(
+                self.model_image('caption'), embedding_key=self.image_hash, **kwargs)
+        return self._memo['caption']
+
+    def embeddings(self):
+        """Embeddings guardados desta imagem ({modelo: vetor float16}), sem novo forward pass"""
+        return self.ai_manager.get_embeddings(self.image_hash) or {}
+
+    @classmethod
+    def from_preprocessed(cls, ai_manager, preprocessed, image_hash=None):
+        """Contexto a partir de uma imagem decodificada pelo pré-processamento"""
+        return cls(ai_manager, preprocessed.image, preprocessed, image_hash)
+
+    def model_image(self, task):
+        """Imagem já no tamanho de entrada do modelo, redimensionada uma única vez"""
+        if self.preprocessed is None:
+            return self.image
+        input_size = self.ai_manager.get_input_size(task)
+        if input_size is None:
+            return self.image
+        size, resample = input_size
+        return self.preprocessed.resized(size, resample)
+
+    def cached(self, key):
+        """Saída já memorizada (ex.: calculada no lote) ou None"""
+        return self._memo.get(key)
+
+    def prime(self, key, value):
+        """Registra uma saída calculada fora do contexto (ex.: em um lote)"""
+        self.forward_passes[key] += 1
+        self._memo[key] = value
+
+    def get_preprocessing_report(self):
+        """Relatório de memória do pré-processamento (vazio sem PreprocessedImage)"""
+        if self.preprocessed is None:
+            return {}
+        return self.preprocessed.get_report()
+
+    def get_stats(self):
+        """Contadores de inferência desta requisição"""
+        return {
+            'forward_passes': dict(self.forward_passes),
+            'total_forward_passes': sum(self.forward_passes.values())
+        }
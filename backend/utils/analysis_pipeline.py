@@ -0,0 +1,120 @@
+import logging
+from .stage_executor import StageExecutor
+from .stage_planner import STAGES, StagePlan
+
+logger = logging.getLogger(__name__)
+
+class AnalysisPipeline:
+    """Executa as etapas de análise (classificação, descrição, faces,
+    qualidade, sentimento e paleta) sobre um AnalysisContext."""
+
+    def __init__(self, ai_manager, image_processor, stage_executor=None):
+        self.ai_manager = ai_manager
+        self.image_processor = image_processor
+        self.stage_executor = stage_executor or StageExecutor()
+
+    def analyze(self, context, plan=None, on_stage=None):
+        """Executa as etapas do plano para uma imagem e retorna o dicionário de resultados
+
+        Faces e qualidade (OpenCV) rodam no pool de threads enquanto a
+        inferência do torch roda na thread atual; o tempo de cada etapa fica
+        em `context.timings`. Etapas fora do plano não tocam nos seus modelos.
+        `on_stage(nome, resultado, ms)` recebe cada etapa assim que ela termina.
+        """
+        plan = plan or StagePlan(STAGES)
+        image = context.image
+        preprocessed = context.preprocessed
+        run = self.stage_executor.start(on_stage)
+
+        # Carrega em paralelo só os modelos exigidos pelo plano (falhas viram erro na etapa)
+        models = [model for model in plan.models if not (model == 'caption' and context.skip_caption)]
+        if models:
+            self.ai_manager.ensure_models(models)
+
+        # Etapas do OpenCV em paralelo (sobre o plano de cinza compartilhado)
+        if plan.includes('faces'):
+            faces = context.cached('faces')
+            if faces is not None:
+                # Já detectadas no lote (prefetch)
+                detect_faces = lambda: faces
+            elif preprocessed is not None:
+                detect_faces = lambda: self.image_processor.detect_faces(
+                    image, *self._face_buffers(preprocessed))
+            else:
+                detect_faces = lambda: self.image_processor.detect_faces(image)
+            run.submit('faces', detect_faces, {'count': 0, 'error': 'Erro na detecção'})
+        if plan.includes('quality'):
+            if preprocessed is not None:
+                analyze_quality = lambda: self.image_processor.analyze_quality(
+                    image, preprocessed.gray, preprocessed.original_size)
+            else:
+                analyze_quality = lambda: self.image_processor.analyze_quality(image)
+            run.submit('quality', analyze_quality, {'error': 'Erro na análise'})
+        if plan.includes('palette'):
+            rgb = preprocessed.rgb if preprocessed is not None else None
+            run.submit('palette', lambda: self.image_processor.extract_palette(image, rgb),
+                       {'error': 'Erro na extração de paleta'})
+
+        # Inferência dos modelos
+        if plan.includes('classification'):
+            run.run('classification', context.classification, {'error': 'Erro na classificação'})
+        if plan.includes('description'):
+            run.run('description', context.caption, 'Não foi possível gerar descrição')
+        if plan.includes('sentiment'):
+            run.run('sentiment', lambda: self.ai_manager.analyze_sentiment(image, context=context), 'Neutro')
+
+        stage_results = run.results()
+        context.timings = run.get_timings()
+
+        return {name: stage_results[name] for name in plan.stages}
+
+    def _face_buffers(self, preprocessed):
+        """(gray, scale, rgb) para o detector: só o buffer que ele usa é calculado"""
+        detector = self.image_processor.face_detector
+        if detector is not None and detector.name == 'dnn':
+            return None, preprocessed.scale_to_original, preprocessed.rgb
+        return preprocessed.gray, preprocessed.scale_to_original, None
+
+    def prefetch(self, contexts, plan=None):
+        """Roda ViT e BLIP uma única vez para um lote de contextos
+
+        Os resultados ficam memorizados em cada contexto, então `analyze`
+        não executa nenhum forward pass adicional para essas imagens. Só os
+        modelos exigidos pelo plano são invocados; com um detector de faces
+        em lote (DNN), as faces do lote também saem de um único forward.
+        """
+        plan = plan or StagePlan(STAGES)
+        if not contexts:
+            return
+
+        if plan.models:
+            self.ai_manager.ensure_models(plan.models)
+
+        if 'classification' in plan.models:
+            images = [context.model_image('classification') for context in contexts]
+            keys = [context.image_hash for context in contexts]
+            for context, classification in zip(contexts, self.ai_manager.classify_images(images, keys)):
+                context.prime('classification', classification)
+        if 'caption' in plan.models:
+            images = [context.model_image('caption') for context in contexts]
+            keys = [context.image_hash for context in contexts]
+            for context, caption in zip(contexts, self.ai_manager.generate_captions(images, embedding_keys=keys)):
+                context.prime('caption', caption)
+        
+        detector = self.image_processor.face_detector
+        if plan.includes('faces') and detector is not None and detector.supports_batching:
+            items = []
+            for context in contexts:
+                if context.preprocessed is not None:
+                    gray, scale, rgb = self._face_buffers(context.preprocessed)
+                    items.append((context.image, gray, rgb, scale))
+                else:
+                    items.append((context.image, None, None, 1.0))
+            for context, faces in zip(contexts, self.image_processor.detect_faces_batch(items)):
+                context.prime('faces', faces)
+
+    def analyze_batch(self, contexts, plan=None):
+        """Analisa um lote de contextos, gerando (contexto, resultados) à medida que cada um termina"""
+        self.prefetch(contexts, plan)
+        for context in contexts:
+            yield context, self.analyze(context, plan)
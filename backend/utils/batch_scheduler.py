@@ -0,0 +1,143 @@
+from collections import Counter
+from concurrent.futures import Future
+import logging
+import os
+import queue
+import threading
+import time
+from .metrics import current_profiles, profiling
+
+logger = logging.getLogger(__name__)
+
+class MicroBatchScheduler:
+    """Agrupa chamadas concorrentes em um único forward pass em lote.
+
+    Cada chamada a `submit` enfileira um item e recebe um Future. Uma thread
+    de trabalho segura o primeiro item por até `max_wait_ms` (ou até juntar
+    `max_batch_size` itens), executa `batch_fn` uma vez para o lote inteiro
+    e devolve a cada chamador o seu próprio resultado. A thread é criada no
+    primeiro uso e recriada após um fork (workers do gunicorn). O lote roda
+    com os perfis de todas as requisições atendidas (parâmetro `profile`).
+    """
+
+    def __init__(self, name, batch_fn, max_batch_size=8, max_wait_ms=10):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+        self.stats = {
+            'submitted': 0,
+            'batches': 0,
+            'errors': 0,
+            'batch_size_histogram': Counter(),
+            'last_batch_ms': 0.0,
+            'max_batch_ms': 0.0,
+            'total_batch_ms': 0.0
+        }
+
+    def submit(self, item):
+        """Enfileira um item e retorna um Future com o resultado"""
+        future = Future()
+        self._ensure_worker()
+        with self._lock:
+            self.stats['submitted'] += 1
+        self._queue.put((item, future, current_profiles()))
+        return future
+
+    def run(self, item):
+        """Atalho síncrono: enfileira e aguarda o resultado"""
+        return self.submit(item).result()
+
+    def get_stats(self):
+        """Profundidade da fila, histograma de lotes e latência por lote"""
+        with self._lock:
+            batches = self.stats['batches']
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'submitted': self.stats['submitted'],
+                'batches': batches,
+                'errors': self.stats['errors'],
+                'avg_batch_size': round(self.stats['submitted'] / batches, 2) if batches else 0.0,
+                'batch_size_histogram': {
+                    str(size): count
+                    for size, count in sorted(self.stats['batch_size_histogram'].items())
+                },
+                'last_batch_ms': round(self.stats['last_batch_ms'], 2),
+                'avg_batch_ms': round(self.stats['total_batch_ms'] / batches, 2) if batches else 0.0,
+                'max_batch_ms': round(self.stats['max_batch_ms'], 2)
+            }
+
+    def after_fork(self):
+        """Descarta fila, trava e thread herdadas do processo pai"""
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def _ensure_worker(self):
+        if self._pid != os.getpid():
+            self.after_fork()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"batch-{self.name}",
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _collect_batch(self):
+        """Bloqueia até o primeiro item e junta os que chegarem dentro da janela"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._collect_batch()
+            items = [item for item, _, _ in batch]
+            profiles = {profile for _, _, item_profiles in batch for profile in item_profiles}
+
+            start = time.perf_counter()
+            try:
+                with profiling(profiles):
+                    results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name}: lote com {len(items)} itens retornou {len(results)} resultados"
+                    )
+            except Exception as e:
+                logger.error(f"Erro no lote de {self.name}: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['batch_size_histogram'][len(items)] += 1
+                self.stats['last_batch_ms'] = elapsed_ms
+                self.stats['total_batch_ms'] += elapsed_ms
+                self.stats['max_batch_ms'] = max(self.stats['max_batch_ms'], elapsed_ms)
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
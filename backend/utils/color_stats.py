@@ -0,0 +1,85 @@
+import numpy as np
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# Lado maior da grade de amostragem (~200x150 pixels para uma foto 4:3)
+SAMPLE_GRID = 200
+
+def sample_pixels(rgb, grid=SAMPLE_GRID):
+    """Amostra uma grade regular de pixels (N, 3) com passo igual nos dois eixos
+
+    O passo é calculado pelo maior lado, então imagens retrato, paisagem e
+    quadradas rendem quantidades de amostras comparáveis.
+    """
+    height, width = rgb.shape[:2]
+    step = max(1, math.ceil(max(height, width) / grid))
+    return rgb[::step, ::step, :3].reshape(-1, 3)
+
+def compute_color_stats(rgb, grid=SAMPLE_GRID):
+    """Médias RGB, saturação e valor (HSV) e calor de uma imagem RGB uint8
+
+    Saturação e valor seguem a mesma definição de `colorsys.rgb_to_hsv`
+    (s = (max - min) / max, v = max), calculadas de forma vetorizada sobre
+    toda a grade amostrada.
+    """
+    pixels = sample_pixels(rgb, grid).astype(np.float32)
+
+    avg_red, avg_green, avg_blue = (float(v) for v in pixels.mean(axis=0))
+
+    maxc = pixels.max(axis=1)
+    minc = pixels.min(axis=1)
+    saturation = np.divide(maxc - minc, maxc, out=np.zeros_like(maxc), where=maxc > 0)
+
+    return {
+        'avg_red': avg_red,
+        'avg_green': avg_green,
+        'avg_blue': avg_blue,
+        'saturation': float(saturation.mean()),
+        'value': float(maxc.mean() / 255.0),
+        'warmth': (avg_red - avg_blue) / 255.0,
+        'samples': int(pixels.shape[0])
+    }
+
+def extract_palette(rgb, colors=8, grid=SAMPLE_GRID):
+    """Paleta dominante por median cut (mesma ideia do ColorThief)
+
+    Divide repetidamente a caixa de cores mais populosa e mais extensa pela
+    mediana do canal de maior amplitude. Retorna as cores ordenadas pela
+    proporção de pixels que cada uma representa.
+    """
+    pixels = sample_pixels(rgb, grid)
+    total = pixels.shape[0]
+    if total == 0:
+        return []
+
+    boxes = [pixels]
+    while len(boxes) < colors:
+        # Caixa com maior (amplitude x população) que ainda pode ser dividida
+        scores = [
+            (int(np.ptp(box, axis=0).max()) * len(box), index)
+            for index, box in enumerate(boxes) if len(box) > 1
+        ]
+        if not scores:
+            break
+        score, index = max(scores)
+        if score == 0:
+            break
+
+        box = boxes.pop(index)
+        channel = int(np.ptp(box, axis=0).argmax())
+        order = np.argsort(box[:, channel], kind='stable')
+        median = len(box) // 2
+        boxes.append(box[order[:median]])
+        boxes.append(box[order[median:]])
+
+    palette = []
+    for box in sorted(boxes, key=len, reverse=True):
+        color = [int(round(c)) for c in box.mean(axis=0)]
+        palette.append({
+            'rgb': color,
+            'hex': '#{:02x}{:02x}{:02x}'.format(*color),
+            'proportion': round(len(box) / total, 4)
+        })
+    return palette
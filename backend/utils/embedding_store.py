@@ -0,0 +1,136 @@
+from collections import OrderedDict
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingStore:
+    """Embeddings de imagem endereçados pelo hash do conteúdo.
+
+    Guarda, para cada imagem, os vetores agregados dos modelos (CLS do ViT e
+    do codificador de visão do BLIP) em float16, num LRU em memória e,
+    opcionalmente, em disco (um `.npz` por hash). A saída completa do
+    codificador do BLIP fica num LRU menor, só em memória, para que uma nova
+    legenda da mesma imagem comece direto pela decodificação.
+    """
+
+    def __init__(self, max_entries=1024, max_encoder_entries=32, disk_dir=None):
+        self.max_entries = max_entries
+        self.max_encoder_entries = max_encoder_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._encoder_outputs = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'stores': 0,
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'encoder_hits': 0,
+            'encoder_misses': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def put(self, key, name, vector):
+        """Armazena o embedding agregado `name` ('classification' ou 'caption') de uma imagem"""
+        vector = np.asarray(vector, dtype=np.float16).reshape(-1)
+        with self._lock:
+            entry = dict(self._entries.get(key) or {})
+            entry[name] = vector
+            self._put_memory(key, entry)
+            self.stats['stores'] += 1
+        self._write_disk(key, entry)
+
+    def get(self, key, name=None):
+        """Embeddings de uma imagem ({nome: vetor float16}) ou só o vetor `name`; None se ausente"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (name is None or name in entry):
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry if name is None else entry[name]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None or (name is not None and name not in entry):
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            self._put_memory(key, entry)
+        return entry if name is None else entry[name]
+
+    def put_encoder_output(self, key, hidden_states):
+        """Saída completa do codificador de visão (tensor ou array de uma imagem)"""
+        if self.max_encoder_entries <= 0:
+            return
+        with self._lock:
+            self._encoder_outputs[key] = hidden_states
+            self._encoder_outputs.move_to_end(key)
+            while len(self._encoder_outputs) > self.max_encoder_entries:
+                self._encoder_outputs.popitem(last=False)
+
+    def get_encoder_output(self, key):
+        with self._lock:
+            hidden_states = self._encoder_outputs.get(key)
+            if hidden_states is None:
+                self.stats['encoder_misses'] += 1
+                return None
+            self._encoder_outputs.move_to_end(key)
+            self.stats['encoder_hits'] += 1
+            return hidden_states
+
+    def get_stats(self):
+        """Contadores para /api/models"""
+        with self._lock:
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'encoder_entries': len(self._encoder_outputs),
+                'max_encoder_entries': self.max_encoder_entries,
+                'disk_enabled': bool(self.disk_dir)
+            }
+
+    def _put_memory(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+
+        try:
+            with np.load(self._disk_path(key)) as data:
+                return {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao ler embeddings em disco: {e}")
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            # Preserva vetores gravados antes (ex.: ViT numa requisição, BLIP em outra)
+            stored = self._read_disk(key) or {}
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **{**stored, **entry})
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Erro ao gravar embeddings em disco: {e}")
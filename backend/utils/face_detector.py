@@ -0,0 +1,200 @@
+import cv2
+import numpy as np
+import logging
+import os
+import threading
+from .metrics import track
+
+logger = logging.getLogger(__name__)
+
+# Arquivos do detector res10 (SSD + ResNet-10) das amostras do OpenCV
+DNN_CONFIG_FILE = 'deploy.prototxt'
+DNN_WEIGHTS_FILE = 'res10_300x300_ssd_iter_140000.caffemodel'
+
+class FaceDetector:
+    """Base dos detectores de face: resolução de trabalho e conversão das caixas
+
+    A imagem é reduzida até que a menor face procurada (`min_face_size`
+    pixels ou `min_face_ratio` do lado menor da imagem original, o que for
+    maior) fique do tamanho da janela do detector; faces menores que isso
+    são ignoradas. As caixas voltam às coordenadas da imagem original.
+    """
+
+    name = None
+
+    # Lado (pixels) da menor face que o detector encontra na imagem de trabalho
+    WINDOW = 24
+
+    # Detecta várias imagens em uma única inferência
+    supports_batching = False
+
+    def __init__(self, min_face_size=24, min_face_ratio=0.03):
+        self.min_face_size = min_face_size
+        self.min_face_ratio = min_face_ratio
+
+    def working_scale(self, width, height, scale_to_original=1.0):
+        """Fator (<= 1) aplicado à imagem recebida antes da detecção"""
+        min_face = max(self.min_face_size, self.min_face_ratio * min(width, height) * scale_to_original)
+        return min(1.0, self.WINDOW * scale_to_original / min_face)
+
+    def detect(self, pil_image, gray=None, rgb=None, scale_to_original=1.0):
+        """[{x, y, width, height, confidence}] nas coordenadas da imagem original"""
+        raise NotImplementedError
+
+    def detect_batch(self, items):
+        """Detecção para vários itens (pil_image, gray, rgb, scale_to_original)"""
+        return [self.detect(*item) for item in items]
+
+    def _working_image(self, pixels, scale_to_original):
+        height, width = pixels.shape[:2]
+        factor = self.working_scale(width, height, scale_to_original)
+        if factor >= 1.0:
+            return pixels, 1.0
+        size = (max(1, round(width * factor)), max(1, round(height * factor)))
+        return cv2.resize(pixels, size, interpolation=cv2.INTER_AREA), factor
+
+    def _face(self, x, y, w, h, to_original, confidence):
+        return {
+            'x': int(round(x * to_original)),
+            'y': int(round(y * to_original)),
+            'width': int(round(w * to_original)),
+            'height': int(round(h * to_original)),
+            'confidence': round(float(confidence), 3)
+        }
+
+class HaarFaceDetector(FaceDetector):
+    """Cascata Haar do OpenCV sobre o plano em tons de cinza
+
+    A confiança vem da concordância das janelas agrupadas em cada face
+    (vizinhos / (vizinhos + min_neighbors)), não de uma probabilidade.
+    """
+
+    name = 'haar'
+    WINDOW = 24
+
+    def __init__(self, scale_factor=1.1, min_neighbors=4, **kwargs):
+        super().__init__(**kwargs)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        if self.cascade.empty():
+            raise RuntimeError('Cascata haarcascade_frontalface_default.xml não encontrada')
+
+    def detect(self, pil_image, gray=None, rgb=None, scale_to_original=1.0):
+        if gray is None:
+            gray = cv2.cvtColor(np.array(pil_image.convert('RGB')), cv2.COLOR_RGB2GRAY)
+
+        with track('face_detect'):
+            small, factor = self._working_image(gray, scale_to_original)
+            faces, neighbors = self.cascade.detectMultiScale2(
+                small,
+                scaleFactor=self.scale_factor,
+                minNeighbors=self.min_neighbors,
+                minSize=(self.WINDOW, self.WINDOW)
+            )
+
+        to_original = scale_to_original / factor
+        return [
+            self._face(x, y, w, h, to_original, n / (n + self.min_neighbors))
+            for (x, y, w, h), n in zip(faces, np.ravel(neighbors))
+        ]
+
+class DnnFaceDetector(FaceDetector):
+    """Detector SSD res10 do módulo dnn do OpenCV (pesos em disco), com score real
+
+    A rede é convolucional, então a imagem de trabalho entra no tamanho
+    escolhido pelo tamanho mínimo de face (limitado a `max_input_size`).
+    No modo em lote as imagens são centralizadas numa tela comum preenchida
+    com a média da rede e passam por um único forward.
+    """
+
+    name = 'dnn'
+    WINDOW = 32
+    supports_batching = True
+
+    # Média BGR do treinamento do res10
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(self, model_dir, confidence_threshold=0.5, max_input_size=1024, **kwargs):
+        super().__init__(**kwargs)
+        self.confidence_threshold = confidence_threshold
+        self.max_input_size = max_input_size
+        self.net = cv2.dnn.readNetFromCaffe(
+            os.path.join(model_dir, DNN_CONFIG_FILE),
+            os.path.join(model_dir, DNN_WEIGHTS_FILE)
+        )
+        # cv2.dnn.Net não aceita forwards concorrentes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available(model_dir):
+        return all(os.path.exists(os.path.join(model_dir, name)) for name in (DNN_CONFIG_FILE, DNN_WEIGHTS_FILE))
+
+    def working_scale(self, width, height, scale_to_original=1.0):
+        factor = super().working_scale(width, height, scale_to_original)
+        return min(factor, self.max_input_size / max(width, height))
+
+    def detect(self, pil_image, gray=None, rgb=None, scale_to_original=1.0):
+        return self.detect_batch([(pil_image, gray, rgb, scale_to_original)])[0]
+
+    def detect_batch(self, items):
+        if not items:
+            return []
+
+        working = []
+        for pil_image, _, rgb, scale_to_original in items:
+            if rgb is None:
+                rgb = np.array(pil_image.convert('RGB'))
+            small, factor = self._working_image(rgb, scale_to_original)
+            working.append((cv2.cvtColor(small, cv2.COLOR_RGB2BGR), factor, scale_to_original))
+
+        # Tela comum: cada imagem no canto superior esquerdo, o resto com a média
+        canvas_height = max(image.shape[0] for image, _, _ in working)
+        canvas_width = max(image.shape[1] for image, _, _ in working)
+        canvases = []
+        for image, _, _ in working:
+            if image.shape[:2] == (canvas_height, canvas_width):
+                canvases.append(image)
+                continue
+            canvas = np.empty((canvas_height, canvas_width, 3), dtype=np.uint8)
+            canvas[:] = np.array(self.MEAN, dtype=np.uint8)
+            canvas[:image.shape[0], :image.shape[1]] = image
+            canvases.append(canvas)
+
+        blob = cv2.dnn.blobFromImages(canvases, 1.0, (canvas_width, canvas_height), self.MEAN, swapRB=False, crop=False)
+        with track('face_detect', batch_size=len(items)), self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()
+
+        results = [[] for _ in items]
+        for batch_id, _, confidence, x1, y1, x2, y2 in detections.reshape(-1, 7):
+            if confidence < self.confidence_threshold:
+                continue
+            image, factor, scale_to_original = working[int(batch_id)]
+            height, width = image.shape[:2]
+
+            # Coordenadas normalizadas pela tela, recortadas à área da imagem
+            left = min(max(x1 * canvas_width, 0), width)
+            top = min(max(y1 * canvas_height, 0), height)
+            right = min(max(x2 * canvas_width, 0), width)
+            bottom = min(max(y2 * canvas_height, 0), height)
+            if right <= left or bottom <= top:
+                continue
+            results[int(batch_id)].append(
+                self._face(left, top, right - left, bottom - top, scale_to_original / factor, confidence)
+            )
+        return results
+
+def create_face_detector(name='haar', model_dir=None, scale_factor=1.1, min_neighbors=4,
+                         confidence_threshold=0.5, **kwargs):
+    """Detector configurado; 'dnn' sem os pesos em `model_dir` cai para a cascata Haar"""
+    name = (name or 'haar').lower()
+    if name == 'dnn':
+        if model_dir and DnnFaceDetector.available(model_dir):
+            detector = DnnFaceDetector(model_dir, confidence_threshold=confidence_threshold, **kwargs)
+            logger.info(f"🙂 Detector de faces: OpenCV DNN res10 ({model_dir})")
+            return detector
+        logger.warning(f"⚠️ Pesos do detector DNN não encontrados em {model_dir}; usando a cascata Haar")
+    elif name != 'haar':
+        raise ValueError(f"Detector de faces não suportado: {name} (opções: haar, dnn)")
+    return HaarFaceDetector(scale_factor=scale_factor, min_neighbors=min_neighbors, **kwargs)
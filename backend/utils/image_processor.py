@@ -3,24 +3,36 @@ import numpy as np
 from PIL import Image
 import io
 import logging
+from .preprocessing import ImageTooLargeError, decode_image
+from .color_stats import extract_palette
+from .face_detector import HaarFaceDetector
+from .metrics import track
 
 logger = logging.getLogger(__name__)
 
 class ImageProcessor:
-    def __init__(self):
-        # Carregar classificador de faces do OpenCV
-        try:
-            self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        except Exception as e:
-            logger.error(f"Erro ao carregar classificador de faces: {e}")
-            self.face_cascade = None
+    def __init__(self, face_detector=None):
+        # Detector de faces (cascata Haar do OpenCV por padrão)
+        if face_detector is None:
+            try:
+                face_detector = HaarFaceDetector()
+            except Exception as e:
+                logger.error(f"Erro ao carregar classificador de faces: {e}")
+        self.face_detector = face_detector
     
     def load_image_from_file(self, file):
         """Carrega imagem de um arquivo upload"""
         try:
             # Ler bytes do arquivo
-            image_bytes = file.read()
+            return self.load_image_from_bytes(file.read())
             
+        except Exception as e:
+            logger.error(f"Erro ao carregar imagem: {e}")
+            return None
+    
+    def load_image_from_bytes(self, image_bytes):
+        """Carrega imagem a partir dos bytes já lidos do upload"""
+        try:
             # Converter para PIL Image
             image = Image.open(io.BytesIO(image_bytes))
             
@@ -34,45 +46,73 @@ class ImageProcessor:
             logger.error(f"Erro ao carregar imagem: {e}")
             return None
     
-    def detect_faces(self, pil_image):
-        """Detecta faces na imagem"""
+    def preprocess_bytes(self, source, max_dim=None, max_pixels=None):
+        """Decodifica uma única vez (reduzindo cedo até max_dim) para reuso entre etapas
+
+        `source` são os bytes ou um stream binário do upload. Imagens acima de
+        `max_pixels` levantam ImageTooLargeError antes da decodificação.
+        """
         try:
-            if self.face_cascade is None:
-                return {'count': 0, 'error': 'Classificador não disponível'}
-            
-            # Converter PIL para OpenCV
-            opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
+            with track('decode'):
+                return decode_image(source, max_dim, max_pixels)
             
-            # Detectar faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-            
-            face_data = []
-            for (x, y, w, h) in faces:
-                face_data.append({
-                    'x': int(x),
-                    'y': int(y),
-                    'width': int(w),
-                    'height': int(h),
-                    'confidence': 0.85
-                })
+        except ImageTooLargeError:
+            raise
+        except Exception as e:
+            logger.error(f"Erro ao carregar imagem: {e}")
+            return None
+    
+    def detect_faces(self, pil_image, gray=None, scale=1.0, rgb=None):
+        """Detecta faces na imagem
+
+        `gray`/`rgb` reaproveitam os buffers já calculados (a cascata Haar usa
+        o cinza, o detector DNN o RGB) e `scale` converte as coordenadas para
+        a resolução original quando a imagem de trabalho foi reduzida.
+        """
+        try:
+            if self.face_detector is None:
+                return {'count': 0, 'error': 'Classificador não disponível'}
             
-            return {
-                'count': len(faces),
-                'faces': face_data,
-                'success': True
-            }
+            return self._face_result(self.face_detector.detect(pil_image, gray, rgb, scale))
             
         except Exception as e:
             logger.error(f"Erro na detecção de faces: {e}")
             return {'count': 0, 'error': str(e)}
     
-    def analyze_quality(self, pil_image):
-        """Analisa qualidade técnica da imagem"""
+    def detect_faces_batch(self, items):
+        """Detecta faces em vários itens (pil_image, gray, rgb, scale) de uma vez
+
+        Com o detector DNN todas as imagens passam por um único forward.
+        """
+        try:
+            if self.face_detector is None:
+                return [{'count': 0, 'error': 'Classificador não disponível'} for _ in items]
+            
+            return [self._face_result(faces) for faces in self.face_detector.detect_batch(items)]
+            
+        except Exception as e:
+            logger.error(f"Erro na detecção de faces em lote: {e}")
+            return [{'count': 0, 'error': str(e)} for _ in items]
+    
+    def _face_result(self, faces):
+        return {
+            'count': len(faces),
+            'faces': faces,
+            'detector': self.face_detector.name,
+            'success': True
+        }
+    
+    def analyze_quality(self, pil_image, gray=None, original_size=None):
+        """Analisa qualidade técnica da imagem
+
+        `original_size` mantém a resolução reportada igual à do upload quando
+        as métricas são calculadas sobre uma imagem de trabalho reduzida.
+        """
         try:
             # Converter para OpenCV
-            opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
+            if gray is None:
+                gray = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2GRAY)
+            width, height = original_size or pil_image.size
             
             # Calcular nitidez
             sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
@@ -96,14 +136,33 @@ class ImageProcessor:
                 'contrast': float(contrast),
                 'noise_level': float(noise_level),
                 'quality_score': quality_score,
-                'resolution': f"{pil_image.width}x{pil_image.height}",
-                'aspect_ratio': round(pil_image.width / pil_image.height, 2)
+                'resolution': f"{width}x{height}",
+                'aspect_ratio': round(width / height, 2)
             }
             
         except Exception as e:
             logger.error(f"Erro na análise de qualidade: {e}")
             return {'error': str(e)}
     
+    def extract_palette(self, pil_image, rgb=None, colors=8):
+        """Extrai a paleta de cores dominantes (substitui o ColorThief do frontend)"""
+        try:
+            if rgb is None:
+                rgb = np.asarray(pil_image.convert('RGB'))
+            
+            palette = extract_palette(rgb, colors)
+            if not palette:
+                return {'error': 'Imagem vazia'}
+            
+            return {
+                'dominant': palette[0],
+                'colors': palette
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro na extração de paleta: {e}")
+            return {'error': str(e)}
+    
     def _calculate_quality_score(self, sharpness, brightness, contrast, noise):
         """Calcula score de qualidade (0-100)"""
         # Normalizar métricas
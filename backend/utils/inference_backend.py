@@ -0,0 +1,118 @@
+import torch
+from transformers.modeling_outputs import ImageClassifierOutput
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Precisões numéricas e modos de grafo suportados
+PRECISIONS = ('fp32', 'int8', 'bf16')
+GRAPH_MODES = ('eager', 'compile', 'torchscript')
+
+class InferenceConfig:
+    """Backend de inferência escolhido por configuração
+
+    - precision: 'fp32' (padrão), 'int8' (quantização dinâmica das camadas
+      Linear) ou 'bf16' (apenas se a CPU suportar)
+    - graph: 'eager' (padrão), 'compile' (torch.compile) ou 'torchscript'
+      (grafo rastreado; apenas para o classificador)
+    """
+
+    def __init__(self, precision='fp32', graph='eager'):
+        precision = (precision or 'fp32').lower()
+        graph = (graph or 'eager').lower()
+        if precision not in PRECISIONS:
+            raise ValueError(f"Precisão não suportada: {precision} (opções: {', '.join(PRECISIONS)})")
+        if graph not in GRAPH_MODES:
+            raise ValueError(f"Modo de grafo não suportado: {graph} (opções: {', '.join(GRAPH_MODES)})")
+        self.precision = precision
+        self.graph = graph
+
+    @property
+    def name(self):
+        return self.precision if self.graph == 'eager' else f"{self.precision}+{self.graph}"
+
+    def to_dict(self):
+        return {'precision': self.precision, 'graph': self.graph}
+
+def bf16_supported():
+    """Indica se a CPU tem instruções bf16 nativas (AVX512-BF16 / AMX)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+class _LogitsOnly(torch.nn.Module):
+    """Adaptador para rastrear o ViT com uma saída tensor simples"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
+class TracedClassifier(torch.nn.Module):
+    """Classificador TorchScript com a mesma interface do ViTForImageClassification"""
+
+    def __init__(self, traced, config):
+        super().__init__()
+        self.traced = traced
+        self.config = config
+
+    def forward(self, pixel_values, **kwargs):
+        return ImageClassifierOutput(logits=self.traced(pixel_values))
+
+def model_dtype(model):
+    """Tipo de ponto flutuante esperado na entrada do modelo"""
+    for parameter in model.parameters():
+        if parameter.is_floating_point():
+            return parameter.dtype
+    return torch.float32
+
+def apply_precision(model, task, config, device='cpu'):
+    """Aplica a precisão configurada (int8 dinâmico ou bf16) a um modelo carregado
+
+    Combinações sem suporte caem para fp32 com um aviso.
+    """
+    model = model.eval()
+
+    if config.precision == 'int8':
+        if device != 'cpu':
+            logger.warning("⚠️ Quantização int8 dinâmica só é suportada em CPU; usando fp32")
+        else:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            logger.info(f"⚙️ {task}: camadas Linear quantizadas para int8")
+    elif config.precision == 'bf16':
+        if device == 'cpu' and not bf16_supported():
+            logger.warning("⚠️ CPU sem suporte nativo a bf16; usando fp32")
+        else:
+            model = model.to(torch.bfloat16)
+            logger.info(f"⚙️ {task}: pesos convertidos para bf16")
+
+    return model
+
+def apply_graph(model, task, config, device='cpu'):
+    """Aplica o modo de grafo configurado (torch.compile ou TorchScript)
+
+    Deve ser chamado depois de `apply_precision`; combinações sem suporte
+    continuam em modo eager com um aviso.
+    """
+    if config.graph == 'compile':
+        if task == 'caption':
+            # generate() é um laço Python; compila-se só o codificador de visão
+            model.vision_model = torch.compile(model.vision_model)
+        else:
+            model = torch.compile(model)
+        logger.info(f"⚙️ {task}: torch.compile ativado")
+    elif config.graph == 'torchscript':
+        if task != 'classification':
+            logger.warning(f"⚠️ TorchScript não suportado para {task}; usando modo eager")
+        else:
+            size = model.config.image_size
+            example = torch.zeros(1, 3, size, size, dtype=model_dtype(model), device=device)
+            with torch.no_grad():
+                traced = torch.jit.trace(_LogitsOnly(model), example, check_trace=False)
+            model = TracedClassifier(torch.jit.freeze(traced.eval()), model.config)
+            logger.info(f"⚙️ {task}: grafo TorchScript rastreado")
+
+    return model
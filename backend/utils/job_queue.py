@@ -0,0 +1,350 @@
+from contextlib import closing
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Fila de jobs no limite (o cliente deve tentar novamente mais tarde)"""
+
+_identity = None
+
+def _process_identity():
+    """(pid, início do processo): o pid sozinho se repete após reiniciar (ex.: pid 1 no contêiner)"""
+    global _identity
+    if _identity is None or _identity[0] != os.getpid():
+        _identity = (os.getpid(), psutil.Process().create_time())
+    return _identity
+
+def _process_alive(pid, started):
+    try:
+        return abs(psutil.Process(pid).create_time() - started) < 0.01
+    except psutil.Error:
+        return False
+
+class JobStore:
+    """Jobs de análise em SQLite: sobrevivem a reinicializações e são
+    compartilhados pelos processos (workers do gunicorn) na mesma máquina."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            filename TEXT,
+            stages TEXT,
+            payload BLOB,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker_pid INTEGER,
+            worker_started REAL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            # Bancos criados antes da coluna worker_started
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'worker_started' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN worker_started REAL')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def create(self, filename, stages, payload, result=None, max_pending=None):
+        """Novo job na fila (ou já concluído, quando o resultado veio do cache)
+
+        Com `max_pending`, a contagem da fila e a inserção acontecem na mesma
+        transação; acima do limite levanta QueueFullError.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn:
+            if result is not None:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, filename, stages, result, created_at, started_at, finished_at) "
+                    "VALUES (?, 'done', ?, ?, ?, ?, ?, ?)",
+                    (job_id, filename, stages, json.dumps(result), now, now, now)
+                )
+                return job_id
+            
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if max_pending is not None:
+                    queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                    if queued >= max_pending:
+                        raise QueueFullError(f"Fila de jobs cheia ({max_pending} pendentes)")
+                conn.execute(
+                    "INSERT INTO jobs (id, status, filename, stages, payload, created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                    (job_id, filename, stages, payload, now)
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return job_id
+
+    def claim(self):
+        """Marca o job mais antigo da fila como em execução por este processo; None se vazia"""
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    "SELECT id, filename, stages, payload FROM jobs WHERE status = 'queued' "
+                    "ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                pid, process_started = _process_identity()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker_pid = ?, worker_started = ?, "
+                    "started_at = ? WHERE id = ?",
+                    (pid, process_started, time.time(), row[0])
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return {'id': row[0], 'filename': row[1], 'stages': row[2], 'payload': row[3]}
+
+    def finish(self, job_id, result=None, error=None):
+        """Grava o resultado (ou o erro) e descarta a imagem armazenada"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, finished_at = ? WHERE id = ?",
+                ('failed' if error is not None else 'done',
+                 json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, status, filename, stages, result, error, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = {
+                'job_id': row[0],
+                'status': row[1],
+                'filename': row[2],
+                'stages': row[3].split(',') if row[3] else None,
+                'attempts': row[6],
+                'created_at': row[7],
+                'started_at': row[8],
+                'finished_at': row[9]
+            }
+            if row[1] == 'queued':
+                job['position'] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (row[7],)
+                ).fetchone()[0]
+            if row[4] is not None:
+                job['result'] = json.loads(row[4])
+            if row[5] is not None:
+                job['error'] = row[5]
+            return job
+
+    def count(self, status):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def recover(self, max_attempts):
+        """Devolve à fila os jobs 'running' de processos que não existem mais
+
+        O processo é identificado pelo pid e pelo horário de início: após uma
+        reinicialização, um processo novo com o mesmo pid não mantém os jobs.
+
+        Jobs que já falharam `max_attempts` vezes (ex.: imagem que derruba o
+        worker) são marcados como 'failed'. Retorna quantos voltaram à fila.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running = conn.execute(
+                    "SELECT id, worker_pid, worker_started, attempts FROM jobs WHERE status = 'running'"
+                ).fetchall()
+                requeued = 0
+                for job_id, pid, started, attempts in running:
+                    if pid is not None and started is not None and _process_alive(pid, started):
+                        continue
+                    if attempts >= max_attempts:
+                        conn.execute(
+                            "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, finished_at = ? WHERE id = ?",
+                            ('Processamento interrompido repetidamente', time.time(), job_id)
+                        )
+                    else:
+                        conn.execute(
+                            "UPDATE jobs SET status = 'queued', worker_pid = NULL, worker_started = NULL WHERE id = ?",
+                            (job_id,)
+                        )
+                        requeued += 1
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return requeued
+
+    def purge(self, retention_seconds):
+        """Remove jobs concluídos há mais que o período de retenção"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - retention_seconds,)
+            )
+            return cursor.rowcount
+
+class JobQueue:
+    """Pool limitado de threads que processa os jobs do JobStore.
+
+    `submit` só grava o job e retorna o id; as threads de trabalho pegam os
+    jobs mais antigos (de qualquer processo) e gravam o resultado. Com mais
+    de `max_pending` jobs na fila, `submit` levanta QueueFullError.
+    """
+
+    # Intervalo máximo entre consultas à fila (jobs enviados por outros processos)
+    POLL_SECONDS = 1.0
+
+    # Intervalo entre limpezas de jobs antigos e recuperação de jobs órfãos
+    MAINTENANCE_SECONDS = 60
+
+    def __init__(self, store, process_fn, workers=2, max_pending=64, retention_seconds=86400, max_attempts=3):
+        self.store = store
+        self.process_fn = process_fn
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0
+        }
+
+    def start(self):
+        """Inicia as threads de trabalho neste processo (após o fork, no gunicorn)"""
+        with self._lock:
+            if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+                return
+            self._pid = os.getpid()
+            self._wakeup = threading.Condition()
+            self._threads = [
+                threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(target=self._maintenance_loop, name='job-maintenance', daemon=True))
+
+        self._maintenance()
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"🧵 Fila de jobs: {self.workers} threads, até {self.max_pending} jobs pendentes")
+
+    def submit(self, payload, filename, stages, result=None):
+        """Grava um job e retorna o id; com `result`, o job já nasce concluído (cache)"""
+        self.start()
+        try:
+            job_id = self.store.create(filename, stages, payload, result, self.max_pending)
+        except QueueFullError:
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise
+        with self._lock:
+            self.stats['submitted'] += 1
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            'queued': self.store.count('queued'),
+            'running': self.store.count('running'),
+            'workers': self.workers,
+            'max_pending': self.max_pending
+        }
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = self.store.claim()
+            except Exception as e:
+                logger.error(f"Erro ao buscar job: {e}")
+                job = None
+
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.POLL_SECONDS)
+                continue
+
+            try:
+                result = self.process_fn(job['payload'], job['stages'])
+            except Exception as e:
+                logger.error(f"Erro no job {job['id']}: {e}")
+                self._finish(job['id'], error=str(e))
+            else:
+                self._finish(job['id'], result=result)
+
+    def _finish(self, job_id, result=None, error=None):
+        """Grava o desfecho do job; uma falha do banco é registrada sem derrubar a thread de trabalho
+
+        Se o resultado não puder ser gravado, o job é marcado com erro; se nem
+        isso for possível, ele fica como 'running' até a recuperação.
+        """
+        try:
+            self.store.finish(job_id, result=result, error=error)
+        except Exception as e:
+            logger.error(f"Erro ao gravar o job {job_id}: {e}")
+            if error is not None:
+                return
+            error = f'Erro ao gravar o resultado: {e}'
+            try:
+                self.store.finish(job_id, error=error)
+            except Exception as e:
+                logger.error(f"Erro ao gravar a falha do job {job_id}: {e}")
+                return
+
+        with self._lock:
+            self.stats['failed' if error is not None else 'completed'] += 1
+
+    def _maintenance(self):
+        try:
+            requeued = self.store.recover(self.max_attempts)
+            if requeued:
+                logger.info(f"♻️ {requeued} jobs interrompidos voltaram à fila")
+            if self.retention_seconds > 0:
+                self.store.purge(self.retention_seconds)
+        except Exception as e:
+            logger.error(f"Erro na manutenção da fila de jobs: {e}")
+
+    def _maintenance_loop(self):
+        while True:
+            time.sleep(self.MAINTENANCE_SECONDS)
+            self._maintenance()
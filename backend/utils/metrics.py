@@ -0,0 +1,271 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import bisect
+import math
+import os
+import threading
+import time
+
+import psutil
+
+# Limites (segundos) dos histogramas de latência: de 1 ms a 60 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Limites dos histogramas de tamanho de lote
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+class _Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: rótulos esperados {self.labels}, recebidos {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+
+class Counter(_Metric):
+    """Contador monotônico por combinação de rótulos"""
+
+    TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+class Histogram(_Metric):
+    """Histograma cumulativo (buckets + soma + contagem) por combinação de rótulos"""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, dict(state, counts=list(state['counts']))) for key, state in self._values.items())
+        lines = self.header()
+        label_names = self.labels + ('le',)
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state['counts']):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(label_names, key + (_format_value(bound),))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state['count']}")
+        return lines
+
+class Gauge(_Metric):
+    """Valor instantâneo lido no momento da coleta
+
+    `collect` retorna um número ou {tupla de rótulos: número}.
+    """
+
+    TYPE = 'gauge'
+
+    def __init__(self, name, documentation, collect, labels=()):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def render(self):
+        try:
+            values = self.collect()
+        except Exception:
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+            if value is not None
+        ]
+
+class MetricsRegistry:
+    """Métricas do processo, expostas no formato de texto do Prometheus"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica já registrada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, collect, labels=()):
+        return self._register(Gauge(name, documentation, collect, labels))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'analyzer_stage_duration_seconds', 'Latência de cada etapa do caminho de análise', ('stage',)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'analyzer_stage_errors_total', 'Etapas que terminaram com erro', ('stage',)
+)
+STAGE_BATCH_SIZE = REGISTRY.histogram(
+    'analyzer_stage_batch_size', 'Imagens por chamada das etapas em lote (forward passes)', ('stage',),
+    buckets=BATCH_SIZE_BUCKETS
+)
+REQUESTS = REGISTRY.counter(
+    'analyzer_http_requests_total', 'Requisições HTTP atendidas', ('endpoint', 'method', 'status')
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'analyzer_http_request_duration_seconds', 'Latência das requisições HTTP', ('endpoint',)
+)
+
+_process = psutil.Process()
+_process_pid = os.getpid()
+
+def _process_memory():
+    global _process, _process_pid
+    if _process_pid != os.getpid():
+        _process, _process_pid = psutil.Process(), os.getpid()
+    return _process.memory_info().rss
+
+REGISTRY.gauge('analyzer_process_resident_memory_bytes', 'Memória residente (RSS) do processo', _process_memory)
+
+class RequestProfile:
+    """Tempo acumulado por etapa de uma única requisição (parâmetro `profile`)
+
+    Etapas em lote (ViT, BLIP) compartilhadas com outras requisições entram
+    com o tempo do lote inteiro e o maior tamanho de lote observado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._started = time.perf_counter()
+
+    def add(self, stage, seconds, batch_size=None):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {'ms': 0.0, 'calls': 0})
+            entry['ms'] += seconds * 1000
+            entry['calls'] += 1
+            if batch_size is not None:
+                entry['batch_size'] = max(entry.get('batch_size', 0), batch_size)
+
+    def report(self):
+        with self._lock:
+            stages = {
+                stage: {**entry, 'ms': round(entry['ms'], 2)}
+                for stage, entry in self._stages.items()
+            }
+        return {
+            'stages': stages,
+            'total_ms': round((time.perf_counter() - self._started) * 1000, 2),
+            'rss_mb': round(_process_memory() / 1024 / 1024, 1)
+        }
+
+# Perfis ativos no contexto atual (vários quando um lote atende várias requisições)
+_active_profiles = ContextVar('active_profiles', default=())
+
+def current_profiles():
+    """Perfis ativos no contexto atual (para repassar a outra thread)"""
+    return _active_profiles.get()
+
+@contextmanager
+def profiling(profiles):
+    """Ativa `profiles` no contexto atual: as etapas medidas também entram neles"""
+    token = _active_profiles.set(tuple(profiles))
+    try:
+        yield
+    finally:
+        _active_profiles.reset(token)
+
+@contextmanager
+def profile_request(enabled=True):
+    """Perfil da requisição atual (None quando desativado)"""
+    if not enabled:
+        yield None
+        return
+    profile = RequestProfile()
+    with profiling(current_profiles() + (profile,)):
+        yield profile
+
+@contextmanager
+def track(stage, batch_size=None):
+    """Mede uma etapa: histograma de latência, erros e perfis ativos"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if batch_size is not None:
+            STAGE_BATCH_SIZE.observe(batch_size, stage=stage)
+        for profile in _active_profiles.get():
+            profile.add(stage, elapsed, batch_size)
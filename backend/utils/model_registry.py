@@ -0,0 +1,246 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """Registro de modelos carregados sob demanda.
+
+    Cada modelo é carregado no primeiro uso (vários em paralelo quando mais de
+    um é necessário), respeita um orçamento de RAM descarregando os menos
+    usados recentemente e é descarregado após ficar ocioso além do TTL.
+    """
+
+    # Intervalo mínimo entre novas tentativas após uma falha de carregamento
+    LOAD_RETRY_SECONDS = 60
+
+    def __init__(self, memory_budget_mb=0, idle_ttl_seconds=0):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.idle_ttl = idle_ttl_seconds
+        self._loaders = {}
+        self._entries = {}
+        self._load_locks = {}
+        self._failures = {}
+        self._lock = threading.RLock()
+        self._reaper = None
+        self.stats = {
+            'loads': 0,
+            'load_errors': 0,
+            'evictions': 0
+        }
+
+    def register(self, name, loader):
+        """Registra um loader: função sem argumentos que retorna (modelo, processador, bytes)"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def put(self, name, model, processor, nbytes=0):
+        """Registra um modelo já instanciado (ex.: benchmarks, testes)"""
+        with self._lock:
+            self._load_locks.setdefault(name, threading.Lock())
+            self._entries[name] = self._new_entry(model, processor, nbytes, 0.0)
+
+    def is_registered(self, name):
+        return name in self._loaders or name in self._entries
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._entries
+
+    def get(self, name):
+        """Retorna (modelo, processador), carregando o modelo se necessário"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry['last_used'] = time.time()
+                entry['uses'] += 1
+                return entry['model'], entry['processor']
+
+        if name not in self._loaders:
+            raise KeyError(f"Modelo não registrado: {name}")
+
+        entry = self._load(name)
+        with self._lock:
+            entry['last_used'] = time.time()
+            entry['uses'] += 1
+        return entry['model'], entry['processor']
+
+    def ensure(self, names):
+        """Garante que os modelos estejam carregados, carregando os ausentes em paralelo
+
+        Retorna {nome: erro} para os que falharam (vazio se todos carregaram).
+        O orçamento de memória nunca descarrega um modelo do próprio grupo.
+        """
+        keep = frozenset(names)
+        missing = [name for name in names if not self.is_loaded(name)]
+        errors = {}
+        if not missing:
+            return errors
+
+        if len(missing) == 1:
+            try:
+                self._load(missing[0], keep)
+            except Exception as e:
+                errors[missing[0]] = str(e)
+            return errors
+
+        with ThreadPoolExecutor(max_workers=len(missing), thread_name_prefix='model-load') as pool:
+            futures = {name: pool.submit(self._load, name, keep) for name in missing}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[name] = str(e)
+        return errors
+
+    def after_fork(self):
+        """Recria as travas e a thread de descarga no processo filho
+
+        Os modelos carregados antes do fork continuam compartilhados com o
+        processo pai (copy-on-write) enquanto não forem descarregados.
+        """
+        self._lock = threading.RLock()
+        self._load_locks = {name: threading.Lock() for name in self._load_locks}
+        self._reaper = None
+        if self._entries:
+            self._ensure_reaper()
+
+    def evict(self, name, reason='manual'):
+        """Descarrega um modelo (as requisições em andamento mantêm sua referência)"""
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return False
+            self.stats['evictions'] += 1
+        logger.info(f"🧹 Modelo descarregado ({reason}): {name}")
+        return True
+
+    def evict_idle(self):
+        """Descarrega modelos ociosos há mais que o TTL"""
+        if self.idle_ttl <= 0:
+            return []
+
+        now = time.time()
+        with self._lock:
+            idle = [
+                name for name, entry in self._entries.items()
+                if now - entry['last_used'] > self.idle_ttl
+            ]
+        for name in idle:
+            self.evict(name, reason='ocioso')
+        return idle
+
+    def get_info(self):
+        """Residência, tempos de carga e uso de memória para /api/models"""
+        now = time.time()
+        with self._lock:
+            resident = {
+                name: {
+                    'memory_mb': round(entry['bytes'] / (1024 * 1024), 1),
+                    'load_seconds': round(entry['load_seconds'], 2),
+                    'loaded_at': entry['loaded_at'],
+                    'idle_seconds': round(now - entry['last_used'], 1),
+                    'uses': entry['uses']
+                }
+                for name, entry in self._entries.items()
+            }
+            return {
+                'registered': sorted(set(self._loaders) | set(self._entries)),
+                'resident': resident,
+                'resident_memory_mb': round(self._resident_bytes() / (1024 * 1024), 1),
+                'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 1) if self.memory_budget else None,
+                'idle_ttl_seconds': self.idle_ttl or None,
+                **self.stats
+            }
+
+    def _new_entry(self, model, processor, nbytes, load_seconds):
+        now = time.time()
+        return {
+            'model': model,
+            'processor': processor,
+            'bytes': nbytes,
+            'load_seconds': load_seconds,
+            'loaded_at': now,
+            'last_used': now,
+            'uses': 0
+        }
+
+    def _resident_bytes(self):
+        return sum(entry['bytes'] for entry in self._entries.values())
+
+    def _load(self, name, keep=None):
+        """Carrega um modelo; `keep` são os modelos que o orçamento não pode descarregar"""
+        with self._load_locks[name]:
+            # Outra thread pode ter carregado enquanto esperávamos
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    return entry
+
+                # Evita repetir um carregamento que acabou de falhar a cada requisição
+                failure = self._failures.get(name)
+                if failure is not None and time.time() - failure[0] < self.LOAD_RETRY_SECONDS:
+                    raise RuntimeError(f"Carregamento de {name} falhou recentemente: {failure[1]}")
+
+            logger.info(f"📥 Carregando modelo sob demanda: {name}")
+            start = time.perf_counter()
+            try:
+                model, processor, nbytes = self._loaders[name]()
+            except Exception as e:
+                with self._lock:
+                    self.stats['load_errors'] += 1
+                    self._failures[name] = (time.time(), str(e))
+                logger.error(f"❌ Erro ao carregar modelo {name}: {e}")
+                raise
+            load_seconds = time.perf_counter() - start
+
+            with self._lock:
+                entry = self._new_entry(model, processor, nbytes, load_seconds)
+                self._entries[name] = entry
+                self._failures.pop(name, None)
+                self.stats['loads'] += 1
+            logger.info(f"✅ Modelo {name} carregado em {load_seconds:.1f}s ({nbytes / (1024 * 1024):.0f}MB)")
+
+            self._enforce_budget(keep | {name} if keep else {name})
+            self._ensure_reaper()
+            return entry
+
+    def _enforce_budget(self, keep):
+        """Descarrega os modelos menos usados recentemente (fora de `keep`) até caber no orçamento"""
+        if not self.memory_budget:
+            return
+
+        while True:
+            with self._lock:
+                if self._resident_bytes() <= self.memory_budget:
+                    return
+                candidates = sorted(
+                    (entry['last_used'], name)
+                    for name, entry in self._entries.items() if name not in keep
+                )
+                if not candidates:
+                    logger.warning(f"⚠️ Modelos {', '.join(sorted(keep))} excedem sozinhos o orçamento de memória")
+                    return
+                name = candidates[0][1]
+            self.evict(name, reason='orçamento de memória')
+
+    def _ensure_reaper(self):
+        if self.idle_ttl <= 0:
+            return
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reaper_loop, name='model-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reaper_loop(self):
+        interval = max(1.0, min(self.idle_ttl / 2, 60.0))
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Erro ao descarregar modelos ociosos: {e}")
@@ -0,0 +1,209 @@
+import numpy as np
+import onnxruntime as ort
+from transformers import BlipConfig, BlipProcessor, ViTConfig, ViTImageProcessor
+import logging
+import os
+from .ai_models import AIModelManager
+from .metrics import track
+
+logger = logging.getLogger(__name__)
+
+# Arquivos gerados por `python -m tools.export_onnx`
+CLASSIFIER_FILE = os.path.join('classification', 'model.onnx')
+VISION_ENCODER_FILE = os.path.join('caption', 'vision_encoder.onnx')
+TEXT_DECODER_FILE = os.path.join('caption', 'text_decoder.onnx')
+
+class OnnxClassifier:
+    """Sessão ONNX do ViT com a configuração (id2label) do modelo original"""
+
+    def __init__(self, session, config):
+        self.session = session
+        self.config = config
+        self.output_names = {output.name for output in session.get_outputs()}
+
+class OnnxCaptioner:
+    """Sessões ONNX do codificador de visão e do decodificador de texto do BLIP
+
+    `past_names`/`present_names` são as entradas e saídas do cache de
+    chaves/valores do decodificador (vazias em exportações antigas, sem cache).
+    """
+
+    def __init__(self, vision_session, decoder_session, config):
+        self.vision_session = vision_session
+        self.decoder_session = decoder_session
+        self.config = config
+        self.past_names = [i.name for i in decoder_session.get_inputs() if i.name.startswith('past_')]
+        self.present_names = [name.replace('past_', 'present_', 1) for name in self.past_names]
+
+class OnnxModelManager(AIModelManager):
+    """AIModelManager que executa ViT e BLIP no onnxruntime
+
+    As respostas têm o mesmo formato do backend torch; a legenda usa a mesma
+    decodificação gulosa do `generate` do BLIP (sem beam search), com cache
+    de chaves/valores: cada token custa um passo do decodificador sobre um
+    único token, e não sobre o prefixo inteiro.
+    """
+
+    def __init__(self, onnx_dir, intra_op_threads=0, inter_op_threads=1, **kwargs):
+        self.onnx_dir = onnx_dir
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        super().__init__(**kwargs)
+        self.device = 'cpu'
+        self.registry.register('classification', self._load_classification_model)
+        self.registry.register('caption', self._load_caption_model)
+        logger.info(f"🧩 Backend ONNX Runtime {ort.__version__}: {onnx_dir}")
+
+    def _session(self, relative_path):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        return ort.InferenceSession(
+            os.path.join(self.onnx_dir, relative_path),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+
+    def _file_bytes(self, *relative_paths):
+        return sum(os.path.getsize(os.path.join(self.onnx_dir, path)) for path in relative_paths)
+
+    def _load_classification_model(self):
+        logger.info("📊 Carregando classificador ONNX...")
+        model_dir = os.path.join(self.onnx_dir, 'classification')
+        processor = ViTImageProcessor.from_pretrained(model_dir)
+        model = OnnxClassifier(self._session(CLASSIFIER_FILE), ViTConfig.from_pretrained(model_dir))
+        self.sentiment_rules.precompute(model.config.id2label)
+        return model, processor, self._file_bytes(CLASSIFIER_FILE)
+
+    def _load_caption_model(self):
+        logger.info("📝 Carregando BLIP ONNX...")
+        model_dir = os.path.join(self.onnx_dir, 'caption')
+        processor = BlipProcessor.from_pretrained(model_dir)
+        model = OnnxCaptioner(
+            self._session(VISION_ENCODER_FILE),
+            self._session(TEXT_DECODER_FILE),
+            BlipConfig.from_pretrained(model_dir)
+        )
+        return model, processor, self._file_bytes(VISION_ENCODER_FILE, TEXT_DECODER_FILE)
+
+    # Tipo esperado de `model` em register_model, por tarefa
+    MODEL_TYPES = {'classification': OnnxClassifier, 'caption': OnnxCaptioner}
+
+    def register_model(self, task, model, processor, nbytes=0):
+        """Registra sessões já criadas (OnnxClassifier ou OnnxCaptioner) fora de onnx_dir
+
+        `nbytes` (tamanho dos arquivos .onnx) entra no orçamento de memória do registro.
+        """
+        expected = self.MODEL_TYPES.get(task)
+        if expected is None:
+            raise ValueError(f"Tarefa desconhecida: {task}")
+        if not isinstance(model, expected):
+            raise TypeError(f"O backend ONNX espera {expected.__name__} para '{task}'")
+        if task == 'classification':
+            self.sentiment_rules.precompute(model.config.id2label)
+        self.registry.put(task, model, processor, nbytes)
+
+    def _classify_batch(self, images, embedding_keys=None):
+        """Forward pass do ViT exportado para um lote de imagens (top-5 por imagem)
+
+        Exportações com a saída 'pooled' também alimentam o EmbeddingStore.
+        """
+        model, processor = self._get_model('classification')
+        output_names = ['logits']
+        if self._wants_embeddings(embedding_keys) and 'pooled' in model.output_names:
+            output_names.append('pooled')
+
+        with track('vit_preprocess'):
+            pixel_values = processor(images, return_tensors="np")['pixel_values'].astype(np.float32)
+        with track('vit_forward', batch_size=len(images)):
+            outputs = model.session.run(output_names, {'pixel_values': pixel_values})
+        logits = outputs[0]
+        if len(outputs) > 1:
+            self._store_embeddings('classification', embedding_keys, outputs[1])
+
+        # Softmax estável
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        predictions = np.exp(logits)
+        predictions /= predictions.sum(axis=-1, keepdims=True)
+
+        k = min(5, predictions.shape[-1])
+        top_indices = np.argsort(-predictions, axis=-1, kind='stable')[:, :k]
+        top_confidences = np.take_along_axis(predictions, top_indices, axis=-1)
+        return self._format_classifications(
+            top_confidences.astype(float).tolist(), top_indices.tolist(), model.config.id2label
+        )
+
+    def _encode_caption_images(self, model, processor, images):
+        """Codificador de visão exportado: uma saída (tokens x dim) independente por imagem"""
+        with track('blip_preprocess'):
+            pixel_values = processor(images, return_tensors="np")['pixel_values'].astype(np.float32)
+        with track('blip_encode', batch_size=len(images)):
+            image_embeds = model.vision_session.run(['image_embeds'], {'pixel_values': pixel_values})[0]
+        return [hidden_states.copy() for hidden_states in image_embeds]
+
+    def _caption_batch(self, items):
+        """Decodificação gulosa do BLIP exportado para um lote de (imagem, max_length, embedding_key)"""
+        model, processor = self._get_model('caption')
+        encoder_outputs = self._caption_encoder_outputs(model, processor, items)
+        text_config = model.config.text_config
+        bos_id = text_config.bos_token_id
+        eos_id = text_config.sep_token_id
+        pad_id = text_config.pad_token_id
+
+        groups = {}
+        for index, (image, max_length, _) in enumerate(items):
+            groups.setdefault(max_length, []).append(index)
+
+        captions = [None] * len(items)
+        for max_length, indices in groups.items():
+            # O codificador de visão rodou uma vez (ou veio do cache); o decodificador roda a cada token
+            image_embeds = np.stack([encoder_outputs[i] for i in indices])
+
+            batch_size = image_embeds.shape[0]
+            input_ids = np.full((batch_size, 1), bos_id, dtype=np.int64)
+            finished = np.zeros(batch_size, dtype=bool)
+            past = self._empty_decoder_cache(model, batch_size)
+            with track('blip_generate', batch_size=batch_size):
+                while input_ids.shape[1] < max_length and not finished.all():
+                    logits, past = self._decoder_step(model, input_ids, image_embeds, past)
+                    next_tokens = logits[:, -1, :].argmax(axis=-1)
+                    next_tokens = np.where(finished, pad_id, next_tokens)
+                    input_ids = np.concatenate([input_ids, next_tokens[:, None]], axis=1)
+                    finished |= next_tokens == eos_id
+
+            decoded = processor.batch_decode(input_ids, skip_special_tokens=True)
+            for i, caption in zip(indices, decoded):
+                captions[i] = caption
+
+        return captions
+
+    def _empty_decoder_cache(self, model, batch_size):
+        """Cache de chaves/valores vazio (comprimento 0) para o primeiro passo, ou None sem cache"""
+        if not model.past_names:
+            return None
+        text_config = model.config.text_config
+        num_heads = text_config.num_attention_heads
+        shape = (batch_size, num_heads, 0, text_config.hidden_size // num_heads)
+        return {name: np.zeros(shape, dtype=np.float32) for name in model.past_names}
+
+    def _decoder_step(self, model, input_ids, image_embeds, past):
+        """Um passo do decodificador: (logits, cache atualizado)
+
+        Com cache, só o último token entra no decodificador; exportações
+        antigas (sem cache) recalculam o prefixo inteiro a cada passo.
+        """
+        feeds = {
+            'attention_mask': np.ones_like(input_ids),
+            'encoder_hidden_states': image_embeds
+        }
+        if past is None:
+            return model.decoder_session.run(['logits'], {'input_ids': input_ids, **feeds})[0], None
+
+        outputs = model.decoder_session.run(['logits', *model.present_names], {
+            'input_ids': input_ids[:, -1:],
+            **feeds,
+            **past
+        })
+        return outputs[0], dict(zip(model.past_names, outputs[1:]))
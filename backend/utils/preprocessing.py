@@ -0,0 +1,174 @@
+import cv2
+import numpy as np
+from PIL import Image
+import io
+import logging
+import math
+import threading
+from .vector_index import perceptual_hash
+
+logger = logging.getLogger(__name__)
+
+# Bytes por pixel alocados pelo caminho antigo, em que cada etapa convertia a
+# imagem em resolução total por conta própria (usado para estimar a economia)
+LEGACY_BYTES_PER_PIXEL = {
+    'decode': 3,              # PIL RGB
+    'faces': 3 + 3 + 1,       # np.array + BGR + cinza
+    'quality': 3 + 3 + 1 + 8 + 8 + 1,  # np.array + BGR + cinza + float64 x2 + blur
+    'color_sentiment': 3,     # np.array
+    'brightness_sentiment': 1 + 1,  # convert('L') + np.array
+    'model_inputs': 3 + 3     # to_numpy nos processadores do ViT e do BLIP
+}
+
+class ImageTooLargeError(ValueError):
+    """Dimensões acima do limite, detectadas só pelo cabeçalho (antes de decodificar)"""
+
+def source_size(source):
+    """(bytes, bytes em memória) de um upload: bytes ou stream (em disco ou não)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source), len(source)
+    position = source.tell()
+    size = source.seek(0, io.SEEK_END)
+    source.seek(position)
+    # SpooledTemporaryFile indica se já foi para o disco; BytesIO está sempre em memória
+    in_memory = not getattr(source, '_rolled', not isinstance(source, io.BytesIO))
+    return size, size if in_memory else 0
+
+class PreprocessedImage:
+    """Imagem decodificada uma única vez, com buffers compartilhados entre as etapas.
+
+    Guarda a imagem de trabalho (possivelmente reduzida já na decodificação),
+    o ndarray RGB, o plano em tons de cinza e os redimensionamentos para os
+    modelos, todos criados sob demanda e reaproveitados por todas as etapas.
+    """
+
+    def __init__(self, image, original_size, decode_scale=1.0, upload_bytes=0, upload_in_memory_bytes=0):
+        self.image = image
+        self.original_size = original_size
+        self.decode_scale = decode_scale
+        self.upload_bytes = upload_bytes
+        self.upload_in_memory_bytes = upload_in_memory_bytes
+        self._rgb = None
+        self._gray = None
+        self._phash = None
+        self._resized = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def scale_to_original(self):
+        """Fator para converter coordenadas da imagem de trabalho para a original"""
+        return self.original_size[0] / self.image.width
+
+    @property
+    def rgb(self):
+        """ndarray RGB (H, W, 3) uint8 da imagem de trabalho"""
+        with self._lock:
+            if self._rgb is None:
+                self._rgb = np.asarray(self.image)
+            return self._rgb
+
+    @property
+    def gray(self):
+        """Plano em tons de cinza (H, W) uint8, calculado uma única vez"""
+        rgb = self.rgb
+        with self._lock:
+            if self._gray is None:
+                self._gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+            return self._gray
+
+    @property
+    def phash(self):
+        """pHash de 64 bits do plano de cinza (índice de similaridade)"""
+        gray = self.gray
+        with self._lock:
+            if self._phash is None:
+                self._phash = perceptual_hash(gray)
+            return self._phash
+
+    def resized(self, size, resample=Image.Resampling.BICUBIC):
+        """Cópia redimensionada para a entrada de um modelo (ex.: 224x224 do ViT)"""
+        key = (size, resample)
+        with self._lock:
+            if key not in self._resized:
+                self._resized[key] = self.image.resize(size, resample)
+            return self._resized[key]
+
+    def get_report(self):
+        """Dimensões e memória dos buffers versus o caminho antigo em resolução total
+
+        O pico estimado inclui o upload quando ele está em memória (uploads
+        grandes ficam num arquivo temporário e são lidos em stream).
+        """
+        original_pixels = self.original_size[0] * self.original_size[1]
+        legacy_bytes = original_pixels * sum(LEGACY_BYTES_PER_PIXEL.values())
+
+        with self._lock:
+            buffers = [self.image.width * self.image.height * 3]
+            if self._rgb is not None:
+                buffers.append(self._rgb.nbytes)
+            if self._gray is not None:
+                buffers.append(self._gray.nbytes)
+            buffers.extend(img.width * img.height * 3 for img in self._resized.values())
+
+        # A qualidade ainda aloca duas cópias float64 do plano de cinza
+        working_pixels = self.image.width * self.image.height
+        current_bytes = sum(buffers) + working_pixels * 16 + self.upload_in_memory_bytes
+
+        return {
+            'original_size': f"{self.original_size[0]}x{self.original_size[1]}",
+            'working_size': f"{self.image.width}x{self.image.height}",
+            'decode_scale': round(self.decode_scale, 3),
+            'upload_bytes': self.upload_bytes,
+            'upload_in_memory_bytes': self.upload_in_memory_bytes,
+            'buffers_bytes': sum(buffers),
+            'estimated_peak_bytes': current_bytes,
+            'legacy_peak_bytes': legacy_bytes,
+            'peak_bytes_saved': max(0, legacy_bytes - current_bytes)
+        }
+
+def decode_image(source, max_dim=None, max_pixels=None):
+    """Decodifica bytes ou um stream binário em um PreprocessedImage, reduzindo cedo quando possível
+
+    Streams (ex.: upload em arquivo temporário) são lidos direto, sem cópia
+    para a memória. Acima de `max_pixels`, ImageTooLargeError é levantado
+    após ler só o cabeçalho. Para JPEG usa o modo draft (decodificação DCT
+    em 1/2, 1/4 ou 1/8 da resolução); demais formatos são reduzidos logo
+    após decodificar.
+    """
+    upload_bytes, upload_in_memory_bytes = source_size(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    else:
+        source.seek(0)
+
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError:
+        # Acima de 2x Image.MAX_IMAGE_PIXELS o próprio PIL recusa o cabeçalho
+        raise ImageTooLargeError(f"Imagem muito grande (máximo de {max_pixels or Image.MAX_IMAGE_PIXELS} pixels)")
+    original_size = image.size
+    if max_pixels and original_size[0] * original_size[1] > max_pixels:
+        raise ImageTooLargeError(
+            f"Imagem muito grande: {original_size[0]}x{original_size[1]} (máximo de {max_pixels} pixels)"
+        )
+
+    if max_dim and max(original_size) > max_dim:
+        if image.format == 'JPEG':
+            # draft escolhe a maior redução que ainda mantém o lado maior >= max_dim
+            ratio = max_dim / max(original_size)
+            image.draft('RGB', (math.ceil(original_size[0] * ratio), math.ceil(original_size[1] * ratio)))
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if max(image.size) > max_dim:
+            image.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    image.load()
+    return PreprocessedImage(
+        image, original_size, image.width / original_size[0], upload_bytes, upload_in_memory_bytes
+    )
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bytes lidos por vez ao calcular o hash de um stream
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_image_bytes(image_bytes):
+    """Hash SHA-256 do conteúdo enviado (chave endereçada por conteúdo)"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def hash_image_source(source):
+    """Hash SHA-256 de bytes ou de um stream binário (lido em blocos, do início)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hash_image_bytes(source)
+    digest = hashlib.sha256()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+class ResultCache:
+    """Cache de resultados de análise endereçado pelo hash da imagem.
+
+    Mantém um LRU limitado em memória e, opcionalmente, uma camada em disco
+    (um arquivo JSON por chave) que sobrevive a reinicializações.
+    """
+
+    # A camada em disco é podada a cada N gravações (evita varrer o diretório sempre)
+    DISK_PRUNE_INTERVAL = 50
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, disk_dir=None, max_disk_entries=5000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or bool(self.disk_dir)
+
+    def get(self, key):
+        """Retorna o resultado em cache ou None"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if not self._expired(stored_at, now):
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return result
+                del self._entries[key]
+
+        result = self._read_disk(key, now)
+        with self._lock:
+            if result is not None:
+                self.stats['disk_hits'] += 1
+                self._put_memory(key, result, now)
+            else:
+                self.stats['misses'] += 1
+        return result
+
+    def set(self, key, result):
+        """Armazena um resultado nas camadas configuradas"""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, result, now)
+            self.stats['stores'] += 1
+        self._write_disk(key, result, now)
+
+    def get_stats(self):
+        """Contadores de acerto/erro para /api/health"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+            hits = self.stats['hits'] + self.stats['disk_hits']
+            return {
+                **self.stats,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'disk_enabled': bool(self.disk_dir)
+            }
+
+    def _expired(self, stored_at, now):
+        return self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds
+
+    def _put_memory(self, key, result, now):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (now, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            if self._expired(os.path.getmtime(path), now):
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao ler cache em disco: {e}")
+            return None
+
+    def _write_disk(self, key, result, now):
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_writes += 1
+                should_prune = self._disk_writes % self.DISK_PRUNE_INTERVAL == 0
+            if should_prune:
+                self._prune_disk()
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache em disco: {e}")
+
+    def _prune_disk(self):
+        """Remove os arquivos mais antigos quando a camada em disco excede o limite"""
+        entries = [
+            entry for entry in os.scandir(self.disk_dir)
+            if entry.is_file() and entry.name.endswith('.json')
+        ]
+        excess = len(entries) - self.max_disk_entries
+        if excess <= 0:
+            return
+
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,150 @@
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Categorias de classe do ViT, em ordem de prioridade: (categoria, palavras-chave)
+CLASS_KEYWORDS = (
+    ('very_positive', (
+        'golden retriever', 'labrador', 'dog', 'puppy',
+        'flower', 'garden', 'beach', 'sunset', 'sunrise',
+        'baby', 'child', 'wedding', 'celebration', 'party',
+        'cake', 'ice cream', 'birthday',
+        'butterfly', 'bird', 'rainbow'
+    )),
+    ('positive', (
+        'food', 'fruit', 'nature', 'tree', 'park',
+        'sport', 'football', 'basketball', 'tennis',
+        'music', 'guitar', 'piano',
+        'vacation', 'travel', 'adventure'
+    )),
+    # Pessoas ativas: o contexto vem da descrição
+    ('active', (
+        'sweatshirt', 'hoodie', 'jersey', 'sportswear',
+        'running', 'exercise', 'fitness', 'yoga',
+        'dance', 'celebration', 'victory', 'polo shirt'
+    )),
+    ('negative', (
+        'storm', 'rain', 'dark', 'shadow',
+        'weapon', 'fire', 'smoke', 'accident',
+        'hospital', 'medicine', 'bandage',
+        'funeral', 'cemetery', 'prison'
+    )),
+    ('neutral', (
+        'building', 'street', 'car', 'computer',
+        'document', 'book', 'tool', 'furniture',
+        'desk', 'chair', 'table'
+    ))
+)
+
+# Score e nota de cada categoria ('active' depende da descrição)
+CLASS_RULES = {
+    'very_positive': (0.7, "Objeto muito positivo: {keyword}"),
+    'positive': (0.4, "Objeto positivo: {keyword}"),
+    'negative': (-0.4, "Objeto negativo: {keyword}"),
+    'neutral': (0.1, "Objeto neutro: {keyword}")
+}
+ACTIVE_WITH_JOY = (0.5, "Atividade positiva com {keyword}")
+ACTIVE_CASUAL = (0.1, "Roupa casual/esportiva: {keyword}")
+
+# Indicadores de postura na legenda do BLIP
+JOY_INDICATORS = (
+    'arms up', 'fists raised', 'celebrating', 'cheering',
+    'jumping', 'dancing', 'smiling', 'laughing',
+    'victory', 'success', 'happy', 'excited',
+    'thumbs up', 'waving', 'pointing up', 'hands up'
+)
+SAD_INDICATORS = (
+    'crying', 'sad', 'depressed', 'down', 'head down',
+    'covering face', 'tears', 'grief', 'mourning'
+)
+JOY_BOOST = 0.8
+SAD_BOOST = -0.6
+
+def _alternation(indicators):
+    # Mais longos primeiro: 'head down' antes de 'down'
+    return '|'.join(re.escape(indicator) for indicator in sorted(indicators, key=len, reverse=True))
+
+class SentimentRules:
+    """Regras de sentimento por classe do ViT e por postura na legenda
+
+    A categoria de cada rótulo do `id2label` do classificador é calculada
+    uma vez (no carregamento do modelo), então cada requisição faz uma
+    consulta ao dicionário e uma única passada de regex sobre a legenda.
+    """
+
+    def __init__(self):
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._indicators = re.compile(
+            f"(?P<joy>{_alternation(JOY_INDICATORS)})|(?P<sad>{_alternation(SAD_INDICATORS)})"
+        )
+
+    def precompute(self, id2label):
+        """Tabela rótulo -> (categoria, palavra-chave) para todas as classes do modelo"""
+        table = {}
+        for label in id2label.values():
+            name = label.lower()
+            table[name] = self._match_class(name)
+        with self._lock:
+            self._labels.update(table)
+        matched = sum(1 for rule in table.values() if rule is not None)
+        logger.info(f"🎭 Regras de sentimento: {matched}/{len(table)} classes com categoria")
+
+    def class_rule(self, class_name):
+        """(categoria, palavra-chave) da classe ou None; classes fora da tabela são calculadas e guardadas"""
+        rule = self._labels.get(class_name, False)
+        if rule is False:
+            rule = self._match_class(class_name)
+            with self._lock:
+                self._labels[class_name] = rule
+        return rule
+
+    def description_indicators(self, description):
+        """(primeiro indicador de alegria, primeiro de tristeza) na legenda, ou None"""
+        joy = sad = None
+        for match in self._indicators.finditer(description):
+            if joy is None and match.group('joy'):
+                joy = match.group('joy')
+            elif sad is None and match.group('sad'):
+                sad = match.group('sad')
+            if joy is not None and sad is not None:
+                break
+        return joy, sad
+
+    def score(self, class_name, description):
+        """(boost da classificação, boost da descrição, notas) para uma classe e uma legenda"""
+        notes = []
+        description_notes = []
+        description_boost = 0.0
+
+        joy, sad = self.description_indicators(description)
+        if joy is not None:
+            description_boost += JOY_BOOST
+            description_notes.append(f"Postura positiva detectada: {joy}")
+        if sad is not None:
+            description_boost += SAD_BOOST
+            description_notes.append(f"Postura negativa detectada: {sad}")
+
+        classification_boost = 0.0
+        rule = self.class_rule(class_name)
+        if rule is not None:
+            category, keyword = rule
+            if category == 'active':
+                boost, note = ACTIVE_WITH_JOY if description_boost > 0 else ACTIVE_CASUAL
+            else:
+                boost, note = CLASS_RULES[category]
+            classification_boost += boost
+            notes.append(note.format(keyword=keyword))
+
+        notes.extend(description_notes)
+        return classification_boost, description_boost, notes
+
+    @staticmethod
+    def _match_class(class_name):
+        for category, keywords in CLASS_KEYWORDS:
+            for keyword in keywords:
+                if keyword in class_name:
+                    return category, keyword
+        return None
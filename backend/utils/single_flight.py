@@ -0,0 +1,56 @@
+from concurrent.futures import Future
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Coalesce chamadas concorrentes com a mesma chave em uma única execução.
+
+    A primeira chamada para uma chave (a líder) executa `fn`; as que chegam
+    com a mesma chave enquanto ela não terminou aguardam e recebem o mesmo
+    resultado (ou a mesma exceção). Ao terminar, a chave é liberada: chamadas
+    posteriores executam de novo (o cache de resultados cobre esse caso).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {
+            'executed': 0,
+            'coalesced': 0
+        }
+
+    def do(self, key, fn):
+        """(resultado, compartilhado): `compartilhado` indica que outra chamada executou `fn`"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.stats['executed'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def get_stats(self):
+        """Chaves em execução e contagem de chamadas executadas/coalescidas"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                **self.stats
+            }
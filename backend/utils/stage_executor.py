@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import logging
+import time
+from .metrics import STAGE_ERRORS, track
+
+logger = logging.getLogger(__name__)
+
+class StageExecutor:
+    """Pool de threads compartilhado para as etapas de análise.
+
+    As etapas do OpenCV (faces, qualidade) liberam o GIL e não dependem das
+    saídas dos modelos, então podem rodar no pool enquanto a inferência do
+    torch acontece na thread da requisição.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage')
+
+    def after_fork(self):
+        """Novo pool no processo filho (threads não sobrevivem ao fork)"""
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stage')
+
+    def start(self, on_complete=None):
+        """Inicia a execução das etapas de uma requisição
+
+        `on_complete(nome, resultado, ms)` é chamado assim que cada etapa
+        termina, na thread em que ela rodou.
+        """
+        return StageRun(self._pool, on_complete)
+
+class StageRun:
+    """Etapas de uma única requisição, com tempo medido por etapa"""
+
+    def __init__(self, pool, on_complete=None):
+        self._pool = pool
+        self.on_complete = on_complete
+        self._futures = {}
+        self._results = {}
+        self.timings = {}
+        self._started = time.perf_counter()
+
+    def submit(self, name, fn, fallback):
+        """Agenda uma etapa no pool (em paralelo com a thread atual)
+
+        A etapa roda numa cópia do contexto atual, para entrar no perfil da requisição.
+        """
+        context = contextvars.copy_context()
+        self._futures[name] = self._pool.submit(context.run, self._timed, name, fn, fallback)
+
+    def run(self, name, fn, fallback):
+        """Executa uma etapa na thread atual"""
+        self._results[name] = self._timed(name, fn, fallback)
+        return self._results[name]
+
+    def result(self, name):
+        """Resultado de uma etapa, aguardando se ela estiver no pool"""
+        if name not in self._results:
+            self._results[name] = self._futures.pop(name).result()
+        return self._results[name]
+
+    def results(self):
+        """Aguarda todas as etapas e retorna {nome: resultado}"""
+        for name in list(self._futures):
+            self.result(name)
+        return self._results
+
+    def get_timings(self):
+        """Tempo de cada etapa e tempo total (ms)"""
+        return {
+            **{name: round(ms, 2) for name, ms in self.timings.items()},
+            'total': round((time.perf_counter() - self._started) * 1000, 2)
+        }
+
+    def _timed(self, name, fn, fallback):
+        start = time.perf_counter()
+        try:
+            with track(name):
+                result = fn()
+            # Etapas que tratam a própria exceção devolvem um dicionário com 'error'
+            if isinstance(result, dict) and 'error' in result:
+                STAGE_ERRORS.inc(stage=name)
+        except Exception as e:
+            logger.error(f"Erro na etapa {name}: {e}")
+            result = fallback
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000
+        
+        if self.on_complete is not None:
+            try:
+                self.on_complete(name, result, self.timings[name])
+            except Exception as e:
+                logger.error(f"Erro ao notificar a etapa {name}: {e}")
+        return result
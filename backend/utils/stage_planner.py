@@ -0,0 +1,67 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Etapas disponíveis, na ordem em que aparecem na resposta
+STAGES = ('classification', 'description', 'faces', 'quality', 'sentiment', 'palette')
+
+# Modelos que cada etapa precisa invocar (o sentimento usa classificação + legenda)
+STAGE_MODELS = {
+    'classification': ('classification',),
+    'description': ('caption',),
+    'faces': (),
+    'quality': (),
+    'sentiment': ('classification', 'caption'),
+    'palette': ()
+}
+
+class StagePlan:
+    """Conjunto mínimo de etapas e modelos para uma requisição"""
+
+    def __init__(self, stages):
+        self.stages = tuple(stage for stage in STAGES if stage in stages)
+        self.models = tuple(sorted({
+            model for stage in self.stages for model in STAGE_MODELS[stage]
+        }))
+
+    @property
+    def is_full(self):
+        return len(self.stages) == len(STAGES)
+
+    @property
+    def key(self):
+        """Identificador estável do plano (usado nas chaves de cache)"""
+        return 'all' if self.is_full else '+'.join(self.stages)
+
+    def includes(self, stage):
+        return stage in self.stages
+
+    def to_dict(self):
+        return {'stages': list(self.stages), 'models': list(self.models)}
+
+def parse_stages(value):
+    """Converte 'faces,quality' (ou uma lista) em nomes de etapas validados
+
+    Levanta ValueError para etapas desconhecidas; vazio significa todas.
+    """
+    if not value:
+        return list(STAGES)
+
+    if isinstance(value, str):
+        value = [value]
+
+    stages = []
+    for item in value:
+        for stage in item.split(','):
+            stage = stage.strip().lower()
+            if not stage:
+                continue
+            if stage not in STAGE_MODELS:
+                raise ValueError(f"Etapa desconhecida: {stage}")
+            stages.append(stage)
+
+    return stages or list(STAGES)
+
+def plan_stages(value=None):
+    """Monta o StagePlan a partir do parâmetro `stages` da requisição"""
+    return StagePlan(parse_stages(value))
@@ -0,0 +1,313 @@
+from contextlib import contextmanager
+from PIL import Image
+import numpy as np
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: servidor de desenvolvimento, um único processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Lado da imagem reduzida e do bloco de baixas frequências do pHash (64 bits)
+PHASH_SIZE = 32
+PHASH_BITS_SIDE = 8
+
+def _dct_matrix(n):
+    """Matriz da DCT-II ortonormal n x n"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+def perceptual_hash(gray):
+    """pHash de 64 bits (DCT) de um plano em tons de cinza (H, W) uint8
+
+    Resistente a recompressão e redimensionamento: cópias reduzidas ou
+    reencodadas da mesma imagem ficam a poucos bits de distância.
+    """
+    small = Image.fromarray(gray).resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.float64)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:PHASH_BITS_SIDE, :PHASH_BITS_SIDE].reshape(-1)
+
+    # O termo DC (brilho médio) fica fora da mediana
+    bits = coefficients > np.median(coefficients[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+class VectorIndex:
+    """Índice em disco dos embeddings do ViT e do pHash de cada imagem analisada.
+
+    Os vetores (normalizados, float16) ficam num arquivo mapeado em memória
+    que cresce por duplicação; `meta.jsonl` guarda uma linha por imagem
+    (hash do conteúdo + pHash) e é a fonte de verdade. Vários processos
+    (workers do gunicorn) podem compartilhar o diretório: as gravações são
+    serializadas por uma trava de arquivo e cada processo lê as linhas novas
+    dos outros antes de gravar ou buscar.
+    """
+
+    VECTORS_FILE = 'vectors.f16'
+    META_FILE = 'meta.jsonl'
+    CONFIG_FILE = 'config.json'
+    LOCK_FILE = '.lock'
+
+    INITIAL_CAPACITY = 1024
+
+    # Linhas processadas por vez na busca (limita a cópia float32 temporária)
+    SEARCH_CHUNK = 4096
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.dim = None
+        self._vectors = None
+        self._capacity = 0
+        self._keys = []
+        self._rows = {}
+        self._phashes = np.zeros(0, dtype=np.uint64)
+        self._has_vector = np.zeros(0, dtype=bool)
+        self._meta_offset = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, self._file_lock():
+            self._refresh(discard_partial=True)
+        if self._keys:
+            logger.info(f"🗂️ Índice de similaridade carregado: {len(self._keys)} imagens")
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def add(self, key, phash, vector=None):
+        """Indexa uma imagem (chave = hash do conteúdo)
+
+        Uma imagem já indexada só é atualizada para receber o embedding que
+        faltava (ex.: primeira análise sem a etapa de classificação).
+        """
+        vector = self._normalize(vector)
+        with self._lock, self._file_lock():
+            self._refresh()
+
+            row = self._rows.get(key)
+            if row is not None and (vector is None or self._has_vector[row]):
+                return False
+
+            if vector is not None and self.dim is None:
+                self._init_vectors(vector.shape[0])
+            if vector is not None and vector.shape[0] != self.dim:
+                logger.warning(f"⚠️ Embedding com dimensão {vector.shape[0]} (índice: {self.dim}); indexando só o pHash")
+                vector = None
+            if row is not None and vector is None:
+                return False
+
+            write_row = row if row is not None else len(self._keys)
+            if self.dim is not None:
+                self._grow(write_row + 1)
+                self._vectors[write_row] = vector if vector is not None else 0
+                self._vectors.flush()
+
+            # A linha de metadados vem por último: o vetor já está no disco
+            line = json.dumps({'key': key, 'phash': f"{phash:016x}", 'vector': vector is not None}) + '\n'
+            with open(self._path(self.META_FILE), 'ab') as f:
+                f.write(line.encode('utf-8'))
+            self._meta_offset += len(line.encode('utf-8'))
+
+            if row is not None:
+                self._has_vector[row] = True
+            else:
+                self._rows[key] = len(self._keys)
+                self._keys.append(key)
+                self._phashes = np.append(self._phashes, np.uint64(phash))
+                self._has_vector = np.append(self._has_vector, vector is not None)
+            return True
+
+    def similarities(self, keys, vector):
+        """{chave: cosseno} entre `vector` e as imagens indexadas com embedding"""
+        vector = self._normalize(vector)
+        with self._lock:
+            self._refresh()
+            if vector is None or self._vectors is None or vector.shape[0] != self.dim:
+                return {}
+            return {
+                key: float(np.asarray(self._vectors[self._rows[key]], dtype=np.float32) @ vector)
+                for key in keys
+                if key in self._rows and self._has_vector[self._rows[key]]
+            }
+
+    def near_duplicates(self, phash, max_distance, exclude=None):
+        """[(chave, distância de Hamming)] das imagens com pHash a até `max_distance` bits"""
+        with self._lock:
+            self._refresh()
+            if not self._keys:
+                return []
+            distances = np.bitwise_count(self._phashes ^ np.uint64(phash))
+            rows = np.flatnonzero(distances <= max_distance)
+            rows = rows[np.argsort(distances[rows], kind='stable')]
+            return [
+                (self._keys[row], int(distances[row]))
+                for row in rows if self._keys[row] != exclude
+            ]
+
+    def search(self, phash, vector=None, k=5, exclude=None):
+        """Vizinhos mais próximos: [{key, similarity, phash_distance}]
+
+        A similaridade é o cosseno entre embeddings do ViT quando os dois lados
+        têm vetor; caso contrário, 1 - distância de Hamming / 64 do pHash.
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            self._refresh()
+            count = len(self._keys)
+            if count == 0 or k <= 0:
+                return []
+
+            distances = np.bitwise_count(self._phashes ^ np.uint64(phash)).astype(np.float32)
+            similarity = 1.0 - distances / 64.0
+
+            if vector is not None and self._vectors is not None and vector.shape[0] == self.dim:
+                cosine = np.empty(count, dtype=np.float32)
+                for start in range(0, count, self.SEARCH_CHUNK):
+                    end = min(start + self.SEARCH_CHUNK, count)
+                    cosine[start:end] = np.asarray(self._vectors[start:end], dtype=np.float32) @ vector
+                similarity = np.where(self._has_vector, cosine, similarity)
+
+            if exclude in self._rows:
+                similarity[self._rows[exclude]] = -np.inf
+
+            k = min(k, count)
+            top = np.argpartition(-similarity, k - 1)[:k]
+            top = top[np.argsort(-similarity[top], kind='stable')]
+            return [
+                {
+                    'key': self._keys[row],
+                    'similarity': round(float(similarity[row]), 4),
+                    'phash_distance': int(distances[row])
+                }
+                for row in top if np.isfinite(similarity[row])
+            ]
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._keys),
+                'with_vectors': int(self._has_vector.sum()),
+                'dim': self.dim,
+                'capacity': self._capacity
+            }
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        """Trava exclusiva entre processos (sem efeito onde fcntl não existe)"""
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(self.LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _normalize(self, vector):
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        return vector / norm
+
+    def _init_vectors(self, dim):
+        self.dim = dim
+        with open(self._path(self.CONFIG_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'dim': dim}, f)
+        self._grow(max(self.INITIAL_CAPACITY, len(self._keys) + 1))
+
+    def _grow(self, rows):
+        """Aumenta por duplicação o arquivo de vetores para comportar `rows` linhas (sob a trava de arquivo)"""
+        if self._vectors is not None and rows <= self._capacity:
+            return
+
+        capacity = max(self._capacity, self.INITIAL_CAPACITY)
+        while capacity < rows:
+            capacity *= 2
+
+        path = self._path(self.VECTORS_FILE)
+        with open(path, 'ab') as f:
+            f.truncate(max(os.path.getsize(path), capacity * self.dim * 2))
+        self._open_vectors()
+
+    def _open_vectors(self):
+        """(Re)mapeia o arquivo de vetores com o tamanho atual em disco"""
+        path = self._path(self.VECTORS_FILE)
+        if not os.path.exists(path):
+            return
+        capacity = os.path.getsize(path) // (self.dim * 2)
+        if capacity == 0:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(path, dtype=np.float16, mode='r+', shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _refresh(self, discard_partial=False):
+        """Lê as linhas de metadados ainda não vistas (de execuções anteriores ou de outros processos)"""
+        if self.dim is None:
+            config_path = self._path(self.CONFIG_FILE)
+            if os.path.exists(config_path):
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    self.dim = json.load(f)['dim']
+
+        meta_path = self._path(self.META_FILE)
+        size = os.path.getsize(meta_path) if os.path.exists(meta_path) else 0
+        if size > self._meta_offset:
+            first_new_row = len(self._keys)
+            phashes, has_vector = [], []
+            with open(meta_path, 'rb') as f:
+                f.seek(self._meta_offset)
+                for line in f:
+                    # Linha ainda sem o '\n': gravação em andamento (ou interrompida)
+                    if not line.endswith(b'\n'):
+                        break
+                    self._meta_offset += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("⚠️ Linha inválida no índice de similaridade ignorada")
+                        continue
+
+                    row = self._rows.get(entry['key'])
+                    if row is not None:
+                        # Atualização posterior que acrescentou o embedding
+                        if entry['vector'] and row >= first_new_row:
+                            has_vector[row - first_new_row] = True
+                        elif entry['vector']:
+                            self._has_vector[row] = True
+                        continue
+                    self._rows[entry['key']] = len(self._keys)
+                    self._keys.append(entry['key'])
+                    phashes.append(int(entry['phash'], 16))
+                    has_vector.append(bool(entry['vector']))
+
+            if phashes:
+                self._phashes = np.concatenate([self._phashes, np.array(phashes, dtype=np.uint64)])
+                self._has_vector = np.concatenate([self._has_vector, np.array(has_vector, dtype=bool)])
+
+            # Só na abertura (sob a trava de arquivo) uma linha incompleta é descartada
+            if discard_partial and self._meta_offset < size:
+                with open(meta_path, 'r+b') as f:
+                    f.truncate(self._meta_offset)
+
+        if self.dim is not None and (self._vectors is None or len(self._keys) > self._capacity):
+            self._open_vectors()
@@ -0,0 +1,52 @@
+"""Ponto de entrada WSGI para produção (gunicorn).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Com `preload_app` (padrão em gunicorn.conf.py) este módulo é importado uma
+única vez no processo mestre: os pesos do ViT e do BLIP são carregados antes
+do fork e compartilhados pelos workers via copy-on-write, em vez de cada
+worker carregar a sua própria cópia. Cada worker chama `after_fork` para
+recriar threads e travas e dividir os núcleos da CPU entre os processos.
+"""
+import gc
+import logging
+import os
+
+from app import app, ai_manager, pipeline, job_queue, INFERENCE_BACKEND
+
+logger = logging.getLogger(__name__)
+
+# Carregar os modelos no mestre (antes do fork); false = cada worker carrega sob demanda
+WSGI_PRELOAD_MODELS = os.environ.get('WSGI_PRELOAD_MODELS', 'True').lower() == 'true'
+
+def preload_models():
+    """Carrega os modelos no processo mestre e congela os objetos para o fork
+
+    As sessões do onnxruntime não sobrevivem a um fork, então no backend
+    ONNX cada worker carrega os seus modelos no primeiro uso.
+    """
+    if not WSGI_PRELOAD_MODELS:
+        return
+    if INFERENCE_BACKEND == 'onnx':
+        logger.info("ℹ️ Backend ONNX: modelos carregados por worker, no primeiro uso")
+        return
+
+    logger.info("📥 Carregando modelos de IA antes do fork...")
+    try:
+        ai_manager.initialize_models(['classification', 'caption'])
+    except Exception as e:
+        logger.error(f"❌ Erro ao carregar modelos: {e}")
+
+    # Objetos já existentes saem do coletor: o GC dos workers não toca nas
+    # páginas herdadas (evita cópias por copy-on-write)
+    gc.freeze()
+
+def after_fork(workers):
+    """Executado em cada worker logo após o fork (hook post_fork do gunicorn)"""
+    threads = int(os.environ.get('TORCH_THREADS_PER_WORKER', 0)) or max(1, (os.cpu_count() or 1) // max(1, workers))
+    ai_manager.after_fork(threads)
+    pipeline.stage_executor.after_fork()
+    job_queue.start()
+    logger.info(f"👷 Worker {os.getpid()} pronto ({threads} threads do torch)")
+
+preload_models()
@@ -0,0 +1,35 @@
+// Reduz a imagem fora da thread principal (OffscreenCanvas) antes do envio ao backend.
+// Mensagem: { id, file, maxDim, quality } -> { id, blob, width, height } ou { id, error }.
+// `blob` é null quando a imagem já cabe em maxDim (o arquivo original é enviado).
+
+self.onmessage = async (event) => {
+    const { id, file, maxDim, quality } = event.data;
+
+    try {
+        const bitmap = await createImageBitmap(file);
+        const width = bitmap.width;
+        const height = bitmap.height;
+        const scale = Math.min(1, maxDim / Math.max(width, height));
+
+        if (scale >= 1) {
+            bitmap.close();
+            self.postMessage({ id, blob: null, width, height });
+            return;
+        }
+
+        const canvas = new OffscreenCanvas(Math.round(width * scale), Math.round(height * scale));
+        const ctx = canvas.getContext('2d');
+
+        // Fundo branco: o JPEG não tem transparência
+        ctx.fillStyle = '#fff';
+        ctx.fillRect(0, 0, canvas.width, canvas.height);
+        ctx.imageSmoothingQuality = 'high';
+        ctx.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+        bitmap.close();
+
+        const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality });
+        self.postMessage({ id, blob, width, height });
+    } catch (error) {
+        self.postMessage({ id, error: error.message || String(error) });
+    }
+};
@@ -6,6 +6,13 @@ class AIImageAnalyzer {
             cocoSsd: null
         };
         this.isLoading = false;
+
+        // Redução opcional no navegador (Web Worker + OffscreenCanvas) antes do envio
+        this.clientResize = { maxDim: 1024, quality: 0.9 };
+        this.resizeWorker = null;
+        this.resizeRequests = new Map();
+        this.resizeRequestId = 0;
+
         this.init();
     }
 
@@ -87,7 +94,7 @@ class AIImageAnalyzer {
 
         imgElement.onload = async () => {
             try {
-                await this.runAnalysis(imgElement, resultsDiv);
+                await this.runAnalysis(imgElement, resultsDiv, file);
             } catch (error) {
                 console.error('Erro na análise:', error);
                 this.showError('Erro ao analisar a imagem.', resultsDiv);
@@ -119,57 +126,88 @@ class AIImageAnalyzer {
         return card;
     }
 
-        async runAnalysis(imgElement, resultsDiv) {
-        const analyses = [];
+        async runAnalysis(imgElement, resultsDiv, file) {
+        // Cada seção é criada na ordem e preenchida assim que sua análise termina
+        resultsDiv.innerHTML = '';
+        const tasks = [];
+        const backend = this.requestBackendAnalysis(file);
 
         // Classificação Inteligente (combina todos os modelos)
         if (document.getElementById('smartClassification').checked) {
-            const smartClassification = await this.getSmartClassification(imgElement);
-            if (smartClassification.length > 0) {
-                analyses.push({
-                    title: '🧠 Classificação Inteligente',
-                    type: 'smart_classification',
-                    data: smartClassification
-                });
-            }
+            const section = this.createSection(resultsDiv, '🧠 Classificação Inteligente');
+            tasks.push(this.getSmartClassification(imgElement, backend).then(smartClassification => {
+                if (smartClassification.length > 0) {
+                    this.fillSection(section, 'smart_classification', smartClassification);
+                } else {
+                    section.remove();
+                }
+            }));
         }
 
         // Detecção de objetos com COCO-SSD
         if (document.getElementById('cocoSsd').checked && this.models.cocoSsd) {
-            const detections = await this.detectObjects(imgElement);
-            analyses.push({
-                title: '👁️ Detecção de Objetos',
-                type: 'detection',
-                data: detections
-            });
+            const section = this.createSection(resultsDiv, '👁️ Detecção de Objetos');
+            tasks.push(this.detectObjects(imgElement).then(detections => {
+                this.fillSection(section, 'detection', detections);
+            }));
         }
 
-        // Análise de cores
+        // Análise de cores (paleta calculada no backend, ColorThief como alternativa)
         if (document.getElementById('colorAnalysis').checked) {
-            const colorAnalysis = this.analyzeColors(imgElement);
-            analyses.push({
-                title: '🎨 Análise de Cores',
-                type: 'colors',
-                data: colorAnalysis
-            });
+            const section = this.createSection(resultsDiv, '🎨 Análise de Cores');
+            tasks.push(this.analyzeColors(imgElement, backend).then(colorAnalysis => {
+                this.fillSection(section, 'colors', colorAnalysis);
+            }));
         }
 
-        // Análise backend
+        // Análise backend (etapas exibidas conforme chegam pelo stream)
         if (document.getElementById('backendAI').checked) {
-            const backendAnalysis = await this.analyzeWithBackend(imgElement);
-            if (backendAnalysis) {
-                analyses.push({
-                    title: '🔬 Análise Avançada',
-                    type: 'advanced',
-                    data: backendAnalysis
-                });
-            }
+            const section = this.createSection(resultsDiv, '🔬 Análise Avançada');
+            backend.onProgress(partial => this.fillSection(section, 'advanced', partial, true));
+            tasks.push(backend.promise.then(backendAnalysis => {
+                if (backendAnalysis) {
+                    this.fillSection(section, 'advanced', backendAnalysis);
+                } else {
+                    section.remove();
+                }
+            }));
+        }
+
+        await Promise.all(tasks);
+    }
+
+    requestBackendAnalysis(file) {
+        // Uma única chamada ao backend por imagem, compartilhada pelas seções:
+        // só as etapas que as seções marcadas usam
+        const useBackend = document.getElementById('backendAI').checked;
+        const stages = new Set();
+        if (document.getElementById('smartClassification').checked) {
+            stages.add('classification');
+            stages.add('description');
+        }
+        if (document.getElementById('colorAnalysis').checked) {
+            stages.add('palette');
         }
+        if (!useBackend && stages.size === 0) {
+            return null;
+        }
+
+        const listeners = [];
+        const promise = this.analyzeWithBackend(
+            file,
+            useBackend ? null : [...stages],
+            partial => listeners.forEach(listener => listener(partial))
+        );
+        // Cada seção trata a falha ao aguardar a resposta
+        promise.catch(() => {});
 
-        this.displayResults(resultsDiv, analyses);
+        return {
+            promise,
+            onProgress: listener => listeners.push(listener)
+        };
     }
 
-    async getSmartClassification(imgElement) {
+    async getSmartClassification(imgElement, backend) {
         try {
             console.log('🧠 Iniciando classificação inteligente...');
             const results = [];
@@ -201,20 +239,11 @@ class AIImageAnalyzer {
             // Método 2: Backend ViT (para contexto e classificação refinada)
             try {
                 console.log('🔬 Consultando backend...');
-                const originalFile = document.getElementById('fileInput').files[0];
                 
-                if (originalFile) {
-                    const formData = new FormData();
-                    formData.append('image', originalFile);
-                    
-                    const response = await fetch(`${this.backendUrl}/api/analyze`, {
-                        method: 'POST',
-                        mode: 'cors',
-                        body: formData
-                    });
+                if (backend) {
+                    const backendData = await backend.promise;
                     
-                    if (response.ok) {
-                        const backendData = await response.json();
+                    if (backendData) {
                         
                         // Classificação do backend
                         if (backendData.classification && !backendData.classification.error) {
@@ -551,7 +580,16 @@ class AIImageAnalyzer {
         }
     }
 
-    analyzeColors(imgElement) {
+    async analyzeColors(imgElement, backend) {
+        try {
+            const backendPalette = backend ? this.paletteFromBackend((await backend.promise).palette) : null;
+            if (backendPalette) {
+                return backendPalette;
+            }
+        } catch (error) {
+            console.warn('⚠️ Paleta do backend indisponível, usando ColorThief:', error);
+        }
+
         try {
             const colorThief = new ColorThief();
             const dominantColor = colorThief.getColor(imgElement);
@@ -567,26 +605,38 @@ class AIImageAnalyzer {
         }
     }
 
-    async analyzeWithBackend(imgElement) {
+    paletteFromBackend(palette) {
+        if (!palette || palette.error || !palette.colors) {
+            return null;
+        }
+
+        return {
+            dominant: palette.dominant.rgb,
+            palette: palette.colors.map(color => color.rgb)
+        };
+    }
+
+    async analyzeWithBackend(file, stages = null, onProgress = null) {
         try {
             console.log('🔄 Iniciando análise com backend...');
+            console.log('📁 Arquivo original:', file.name, file.type, file.size);
             
-            // Obter a imagem original do input file ao invés de converter canvas
-            const fileInput = document.getElementById('fileInput');
-            const originalFile = fileInput.files[0];
-            
-            if (!originalFile) {
-                throw new Error('Arquivo original não encontrado');
-            }
-            
-            console.log('📁 Arquivo original:', originalFile.name, originalFile.type, originalFile.size);
+            const upload = await this.prepareUpload(file);
             
             const formData = new FormData();
-            formData.append('image', originalFile); 
+            formData.append('image', upload.blob, upload.name);
+            if (stages) {
+                formData.append('stages', stages.join(','));
+            }
+            if (upload.originalWidth) {
+                // A qualidade reporta a resolução do arquivo original, não a da cópia reduzida
+                formData.append('original_width', upload.originalWidth);
+                formData.append('original_height', upload.originalHeight);
+            }
             
-            console.log('📤 Enviando para:', `${this.backendUrl}/api/analyze`);
+            console.log('📤 Enviando para:', `${this.backendUrl}/api/analyze/stream`);
             
-            const response = await fetch(`${this.backendUrl}/api/analyze`, {
+            const response = await fetch(`${this.backendUrl}/api/analyze/stream`, {
                 method: 'POST',
                 mode: 'cors',
                 body: formData
@@ -594,51 +644,156 @@ class AIImageAnalyzer {
             
             console.log('📥 Resposta:', response.status, response.statusText);
             
-            if (response.ok) {
-                const data = await response.json();
-                console.log('✅ Dados recebidos:', data);
-                return data;
-            } else {
+            if (!response.ok) {
                 const errorText = await response.text();
                 console.error('❌ Erro HTTP:', response.status, errorText);
                 throw new Error(`HTTP ${response.status}: ${errorText}`);
             }
+            
+            // Um evento `stage` por etapa concluída e `done` com a resposta completa
+            const partial = {};
+            let data = null;
+            await this.readEventStream(response, (event, payload) => {
+                if (event === 'stage') {
+                    console.log(`📡 Etapa ${payload.stage}: ${payload.ms} ms`);
+                    partial[payload.stage] = payload.result;
+                    if (onProgress) onProgress({ ...partial });
+                } else if (event === 'done') {
+                    data = payload;
+                } else if (event === 'error') {
+                    console.error('❌ Erro HTTP:', payload.status, payload.error);
+                    throw new Error(`HTTP ${payload.status}: ${payload.error}`);
+                }
+            });
+            
+            console.log('✅ Dados recebidos:', data);
+            return data || partial;
         } catch (error) {
             console.error('❌ Erro na análise backend:', error);
             throw error;
         }
     }
 
-    displayResults(container, analyses) {
-        container.innerHTML = '';
+    async prepareUpload(file) {
+        // Arquivo original, ou uma cópia reduzida quando a opção está marcada
+        if (document.getElementById('clientResize').checked) {
+            try {
+                const resized = await this.resizeInWorker(file);
+                if (resized && resized.blob && resized.blob.size < file.size) {
+                    console.log(`📉 Reduzida no navegador: ${resized.width}x${resized.height}, ` +
+                        `${(file.size / 1024).toFixed(0)} KB -> ${(resized.blob.size / 1024).toFixed(0)} KB`);
+                    return {
+                        blob: resized.blob,
+                        name: file.name.replace(/\.[^.]+$/, '') + '.jpg',
+                        originalWidth: resized.width,
+                        originalHeight: resized.height
+                    };
+                }
+            } catch (error) {
+                console.warn('⚠️ Redução no navegador indisponível, enviando o original:', error);
+            }
+        }
+        return { blob: file, name: file.name };
+    }
+
+    resizeInWorker(file) {
+        if (typeof Worker === 'undefined' || typeof OffscreenCanvas === 'undefined') {
+            return Promise.resolve(null);
+        }
+
+        if (!this.resizeWorker) {
+            this.resizeWorker = new Worker('resize-worker.js');
+            this.resizeWorker.onmessage = (e) => {
+                const { id, error, ...result } = e.data;
+                const pending = this.resizeRequests.get(id);
+                if (!pending) return;
+                this.resizeRequests.delete(id);
+                if (error) {
+                    pending.reject(new Error(error));
+                } else {
+                    pending.resolve(result);
+                }
+            };
+            this.resizeWorker.onerror = (e) => {
+                // Worker indisponível (ex.: página aberta via file://): todos enviam o original
+                this.resizeRequests.forEach(pending => pending.reject(new Error(e.message)));
+                this.resizeRequests.clear();
+                this.resizeWorker = null;
+            };
+        }
+
+        return new Promise((resolve, reject) => {
+            const id = ++this.resizeRequestId;
+            this.resizeRequests.set(id, { resolve, reject });
+            this.resizeWorker.postMessage({
+                id,
+                file,
+                maxDim: this.clientResize.maxDim,
+                quality: this.clientResize.quality
+            });
+        });
+    }
+
+    async readEventStream(response, onEvent) {
+        // Leitor de Server-Sent Events sobre o corpo do fetch (EventSource não faz POST)
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
         
-        analyses.forEach(analysis => {
-            const section = document.createElement('div');
-            section.className = 'analysis-section';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
             
-            let content = `<h4>${analysis.title}</h4>`;
-            
-            switch (analysis.type) {
-                case 'smart_classification':
-                    content += this.renderSmartClassification(analysis.data);
-                    break;
-                case 'classification':
-                    content += this.renderClassification(analysis.data);
-                    break;
-                case 'detection':
-                    content += this.renderDetection(analysis.data);
-                    break;
-                case 'colors':
-                    content += this.renderColors(analysis.data);
-                    break;
-                case 'advanced':
-                    content += this.renderAdvanced(analysis.data);
-                    break;
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let event = 'message';
+                const lines = [];
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        lines.push(line.slice(5).trimStart());
+                    }
+                });
+                if (lines.length) onEvent(event, JSON.parse(lines.join('\n')));
             }
-            
-            section.innerHTML = content;
-            container.appendChild(section);
-        });
+        }
+    }
+
+    createSection(container, title) {
+        const section = document.createElement('div');
+        section.className = 'analysis-section';
+        section.innerHTML = `<h4>${title}</h4><div class="section-content"><div class="loading">🔄 Analisando...</div></div>`;
+        container.appendChild(section);
+        return section;
+    }
+
+    fillSection(section, type, data, pending = false) {
+        let content = this.renderAnalysis(type, data);
+        if (pending) {
+            content += '<div class="loading">🔄 Aguardando as demais etapas...</div>';
+        }
+        section.querySelector('.section-content').innerHTML = content;
+    }
+
+    renderAnalysis(type, data) {
+        switch (type) {
+            case 'smart_classification':
+                return this.renderSmartClassification(data);
+            case 'classification':
+                return this.renderClassification(data);
+            case 'detection':
+                return this.renderDetection(data);
+            case 'colors':
+                return this.renderColors(data);
+            case 'advanced':
+                return this.renderAdvanced(data);
+        }
+        return '';
     }
 
     renderClassification(data) {
@@ -699,6 +854,13 @@ class AIImageAnalyzer {
     renderAdvanced(data) {
         let html = '<div class="advanced-analysis">';
         
+        // Servidor sob carga: etapas simplificadas (o resultado completo não foi cacheado)
+        if (data.degraded && data.degraded.length) {
+            html += `<div class="analysis-item" style="color: #856404;">
+                ⚠️ Servidor sob carga: ${data.degraded.join(', ')} simplificado(s). Analise novamente mais tarde para o resultado completo.
+            </div>`;
+        }
+        
         // Descrição
         if (data.description) {
             html += `<div class="analysis-item">